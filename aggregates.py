@@ -0,0 +1,274 @@
+"""Server-side aggregation over the model classes
+
+AggregateQuery builds GROUP BY reports that always run as a single aggregate
+``select()`` on the database, instead of loading ORM objects and grouping them
+with Counter or defaultdict in Python::
+
+    report = (
+        AggregateQuery(Account.product_cd, Branch.name)
+        .join(Branch, Account.open_branch_id == Branch.branch_id)
+        .sum(Account.avail_balance, label="tot_balance")
+        .count(label="how_many")
+    )
+    report = report.having(report["how_many"] > 1).order_by(report["tot_balance"].desc())
+    rows = report.all(session)
+"""
+
+from copy import copy
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import pandas as pd
+from sqlalchemy import ColumnElement, Row, func, literal_column, null, select, union_all
+from sqlalchemy.orm import Session
+from sqlalchemy.sql.selectable import Select as SQLSelect
+
+_NATIVE_ROLLUP_DIALECTS = ("mysql", "mariadb", "postgresql", "oracle", "mssql")
+"""Dialects with a GROUP BY ROLLUP, others get a UNION ALL of the levels"""
+
+
+class AggregateQuery:
+    """A GROUP BY report over the model, compiled to one aggregate select
+
+    Every method returns a new query, the original is left unchanged.
+    """
+
+    def __init__(self, *keys: ColumnElement) -> None:
+        """Create a report grouped by keys
+
+        :param keys: Group by columns or expressions, none for a grand total
+        """
+        self._keys: Tuple[ColumnElement, ...] = keys
+        self._measures: Dict[str, ColumnElement] = {}
+        self._joins: List[Tuple[Any, Optional[ColumnElement], bool]] = []
+        self._where: List[ColumnElement] = []
+        self._having: List[ColumnElement] = []
+        self._order_by: List[ColumnElement] = []
+        self._rollup: bool = False
+
+    def _with(self, **changes: Any) -> "AggregateQuery":
+        query = copy(self)
+        for name, value in changes.items():
+            setattr(query, name, value)
+        return query
+
+    def __getitem__(self, label: str) -> ColumnElement:
+        """Aggregate expression of a measure, for use in having and order_by
+
+        :param label: Label of the measure
+        :return: Aggregate expression
+        """
+        return self._measures[label]
+
+    def measure(self, label: str, expression: ColumnElement) -> "AggregateQuery":
+        """Add an aggregate expression
+
+        :param label: Column label of the measure in the results
+        :param expression: Aggregate expression, e.g. func.max(Account.open_date)
+        :return: New query
+        """
+        if label in self._measures:
+            raise ValueError("Duplicate measure label %r" % label)
+        return self._with(_measures={**self._measures, label: expression})
+
+    def count(
+        self, column: Optional[ColumnElement] = None, label: str = "count"
+    ) -> "AggregateQuery":
+        """Count the rows, or the non-null values of a column, per group
+
+        :param column: Column to count, all rows if None
+        :param label: Column label in the results
+        :return: New query
+        """
+        return self.measure(
+            label, func.count(literal_column("*") if column is None else column)
+        )
+
+    def count_distinct(self, column: ColumnElement, label: str) -> "AggregateQuery":
+        """Count the distinct values of a column per group
+
+        :param column: Column to count
+        :param label: Column label in the results
+        :return: New query
+        """
+        return self.measure(label, func.count(column.distinct()))
+
+    def sum(self, column: ColumnElement, label: str) -> "AggregateQuery":
+        """Sum a column per group
+
+        :param column: Column to sum
+        :param label: Column label in the results
+        :return: New query
+        """
+        return self.measure(label, func.sum(column))
+
+    def avg(self, column: ColumnElement, label: str) -> "AggregateQuery":
+        """Average a column per group
+
+        :param column: Column to average
+        :param label: Column label in the results
+        :return: New query
+        """
+        return self.measure(label, func.avg(column))
+
+    def min(self, column: ColumnElement, label: str) -> "AggregateQuery":
+        """Minimum of a column per group
+
+        :param column: Column
+        :param label: Column label in the results
+        :return: New query
+        """
+        return self.measure(label, func.min(column))
+
+    def max(self, column: ColumnElement, label: str) -> "AggregateQuery":
+        """Maximum of a column per group
+
+        :param column: Column
+        :param label: Column label in the results
+        :return: New query
+        """
+        return self.measure(label, func.max(column))
+
+    def join(
+        self, target: Any, onclause: Optional[ColumnElement] = None, outer: bool = False
+    ) -> "AggregateQuery":
+        """Join another model class or table
+
+        :param target: Model class, alias or table to join
+        :param onclause: Join condition, inferred from the foreign keys if None
+        :param outer: Left outer join if True
+        :return: New query
+        """
+        return self._with(_joins=[*self._joins, (target, onclause, outer)])
+
+    def where(self, *criteria: ColumnElement) -> "AggregateQuery":
+        """Filter the rows before grouping
+
+        :param criteria: Filter expressions, combined with AND
+        :return: New query
+        """
+        return self._with(_where=[*self._where, *criteria])
+
+    def having(self, *criteria: ColumnElement) -> "AggregateQuery":
+        """Filter the groups, e.g. report["how_many"] > 1
+
+        :param criteria: Filter expressions on the measures, combined with AND
+        :return: New query
+        """
+        return self._with(_having=[*self._having, *criteria])
+
+    def order_by(self, *clauses: ColumnElement) -> "AggregateQuery":
+        """Order the groups
+
+        :param clauses: Keys or measures, optionally with asc() or desc()
+        :return: New query
+        """
+        return self._with(_order_by=[*self._order_by, *clauses])
+
+    def with_rollup(self) -> "AggregateQuery":
+        """Add the subtotal rows of every key prefix and the grand total row
+
+        The rolled up keys are None in the subtotal rows.
+
+        :return: New query
+        """
+        return self._with(_rollup=True)
+
+    def _select(self, columns: Sequence[ColumnElement]) -> SQLSelect:
+        """Select of the columns and measures, with the joins and filters
+
+        :param columns: Key columns of the select
+        :return: Select statement, without grouping
+        """
+        statement = select(
+            *columns,
+            *(expression.label(label) for label, expression in self._measures.items()),
+        )
+        for target, onclause, outer in self._joins:
+            statement = statement.join(target, onclause, isouter=outer)
+        return statement.where(*self._where) if self._where else statement
+
+    def _rollup_level(self, level: int) -> SQLSelect:
+        """Select of one rollup level, grouped on the first keys only
+
+        :param level: Number of keys grouped on, the others are NULL
+        :return: Select statement
+        """
+        keys = self._keys
+        statement = self._select(
+            [*keys[:level], *(null().label(_name(key)) for key in keys[level:])]
+        )
+        if level:
+            statement = statement.group_by(*keys[:level])
+        return statement.having(*self._having) if self._having else statement
+
+    def _label(self, clause: ColumnElement) -> str:
+        """Column name and direction of an order by clause on the rollup union
+
+        :param clause: Key or measure, optionally wrapped by asc() or desc()
+        :return: Order by text
+        """
+        modifier = getattr(clause, "modifier", None)
+        element = clause.element if modifier is not None else clause
+        direction = (
+            "DESC" if modifier is not None and modifier.__name__ == "desc_op" else "ASC"
+        )
+        for label, expression in self._measures.items():
+            if element is expression:
+                return "%s %s" % (label, direction)
+        return "%s %s" % (_name(element), direction)
+
+    def statement(self, dialect_name: Optional[str] = None) -> SQLSelect:
+        """Compile the report to a select statement
+
+        :param dialect_name: Dialect the statement runs on, only used for rollups
+        :return: Aggregate select statement
+        """
+        if not self._measures:
+            raise ValueError("An aggregate query needs at least one measure")
+        keys = self._keys
+        if self._rollup and dialect_name not in (None, *_NATIVE_ROLLUP_DIALECTS):
+            levels = union_all(
+                *(self._rollup_level(level) for level in range(len(keys), -1, -1))
+            ).subquery("levels")
+            return select(levels).order_by(
+                *(literal_column(self._label(clause)) for clause in self._order_by)
+            )
+
+        statement = self._select(keys)
+        if self._rollup:
+            statement = statement.group_by(func.rollup(*keys))
+        elif keys:
+            statement = statement.group_by(*keys)
+        if self._having:
+            statement = statement.having(*self._having)
+        return statement.order_by(*self._order_by)
+
+    def all(self, session: Session) -> Sequence[Row]:
+        """Run the report
+
+        :param session: Session to run on
+        :return: Result rows, the keys then the measures
+        """
+        dialect_name = session.get_bind().dialect.name
+        return session.execute(self.statement(dialect_name)).all()
+
+    def dataframe(self, session: Session) -> pd.DataFrame:
+        """Run the report into a DataFrame
+
+        :param session: Session to run on
+        :return: DataFrame with one column per key and measure
+        """
+        dialect_name = session.get_bind().dialect.name
+        return pd.read_sql_query(self.statement(dialect_name), con=session.connection())
+
+
+def _name(column: ColumnElement) -> str:
+    """Result column name of a key
+
+    :param column: Key column or labeled expression
+    :return: Column name
+    """
+    name = getattr(column, "key", None) or getattr(column, "name", None)
+    if name is None:
+        raise ValueError("Label the expression %s to use it as a rollup key" % column)
+    return name
@@ -0,0 +1,320 @@
+"""Vectorized analytics of the transaction history on NumPy arrays
+
+The columns of ``transaction`` and ``account`` are streamed from a server-side
+cursor into Arrow batches and then NumPy arrays, without building an ORM
+object per row. Group by, running balances, time buckets and credit/debit
+splits then run as vectorized NumPy operations::
+
+    transactions = load_transactions(engine)
+    balances = running_balances(transactions)
+    monthly = time_buckets(transactions, "M")
+
+Loading requires pyarrow.
+"""
+
+from dataclasses import dataclass, fields
+from typing import Final, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import ColumnElement, case, select
+
+from model import Account, Transaction, TransactionTypeEnum
+from streaming import DEFAULT_CHUNKSIZE, Connectable, stream_arrow
+from utils import arrow_select_schema
+
+CREDIT: Final[int] = 1
+"""Sign of a credit transaction"""
+
+DEBIT: Final[int] = -1
+"""Sign of a debit transaction"""
+
+BUCKET_UNITS: Final[Tuple[str, ...]] = ("D", "W", "M", "Y")
+"""Time bucket units, day, week, month and year"""
+
+
+@dataclass(frozen=True)
+class TransactionArrays:
+    """Columns of the transaction table, one array per column"""
+
+    txn_id: np.ndarray
+    """Transaction IDs, int64"""
+
+    account_id: np.ndarray
+    """Account of each transaction, int64"""
+
+    txn_date: np.ndarray
+    """Transaction datetimes, datetime64[us]"""
+
+    amount: np.ndarray
+    """Transaction amounts, always positive, float64"""
+
+    sign: np.ndarray
+    """CREDIT, DEBIT or 0 without a transaction type, int8"""
+
+    def __len__(self) -> int:
+        return len(self.txn_id)
+
+    @property
+    def nbytes(self) -> int:
+        """Memory used by the arrays"""
+        return sum(getattr(self, column.name).nbytes for column in fields(self))
+
+    @property
+    def signed_amount(self) -> np.ndarray:
+        """Amounts, positive for credits and negative for debits"""
+        return self.amount * self.sign
+
+
+@dataclass(frozen=True)
+class AccountArrays:
+    """Columns of the account table, one array per column"""
+
+    account_id: np.ndarray
+    """Account IDs, int64"""
+
+    cust_id: np.ndarray
+    """Customer of each account, int64"""
+
+    product_cd: np.ndarray
+    """Product code of each account, object"""
+
+    open_branch_id: np.ndarray
+    """Branch the account was opened at, -1 if none, int64"""
+
+    avail_balance: np.ndarray
+    """Available balance, NaN if none, float64"""
+
+    def __len__(self) -> int:
+        return len(self.account_id)
+
+
+def _sign() -> ColumnElement:
+    """Transaction type as a signed integer, computed by the database"""
+    return case(
+        (Transaction.txn_type_cd == TransactionTypeEnum.CDT, CREDIT),
+        (Transaction.txn_type_cd == TransactionTypeEnum.DBT, DEBIT),
+        else_=0,
+    )
+
+
+def _arrow_table(connectable: Connectable, statement, chunksize: int):
+    """Arrow table of a query, streamed batch by batch
+
+    Every batch gets the schema of the model columns, so a column that is NULL
+    throughout a batch keeps its type.
+
+    :param connectable: Engine, connection or session
+    :param statement: Select statement
+    :param chunksize: Rows per streamed batch
+    :return: pyarrow.Table, None if the result is empty
+    """
+    import pyarrow as pa
+
+    schema = arrow_select_schema(statement)
+    batches = list(
+        stream_arrow(connectable, statement, chunksize=chunksize, schema=schema)
+    )
+    return pa.Table.from_batches(batches) if batches else None
+
+
+def load_transactions(
+    connectable: Connectable,
+    *criteria: ColumnElement,
+    chunksize: int = DEFAULT_CHUNKSIZE,
+) -> TransactionArrays:
+    """Load the transaction columns into NumPy arrays
+
+    :param connectable: Engine, connection or session
+    :param criteria: Filters on the transaction table, e.g. a txn_date range
+    :param chunksize: Rows per streamed batch
+    :return: Arrays in txn_id order
+    """
+    statement = (
+        select(
+            Transaction.txn_id,
+            Transaction.account_id,
+            Transaction.txn_date,
+            Transaction.amount,
+            _sign().label("sign"),
+        )
+        .where(*criteria)
+        .order_by(Transaction.txn_id)
+    )
+    table = _arrow_table(connectable, statement, chunksize)
+    if table is None:
+        return TransactionArrays(
+            txn_id=np.empty(0, np.int64),
+            account_id=np.empty(0, np.int64),
+            txn_date=np.empty(0, "datetime64[us]"),
+            amount=np.empty(0, np.float64),
+            sign=np.empty(0, np.int8),
+        )
+    return TransactionArrays(
+        txn_id=table.column("txn_id").to_numpy().astype(np.int64, copy=False),
+        account_id=table.column("account_id").to_numpy().astype(np.int64, copy=False),
+        txn_date=table.column("txn_date").to_numpy().astype("datetime64[us]"),
+        amount=table.column("amount").to_numpy().astype(np.float64, copy=False),
+        sign=table.column("sign").to_numpy().astype(np.int8),
+    )
+
+
+def load_accounts(
+    connectable: Connectable,
+    *criteria: ColumnElement,
+    chunksize: int = DEFAULT_CHUNKSIZE,
+) -> AccountArrays:
+    """Load the account columns into NumPy arrays
+
+    :param connectable: Engine, connection or session
+    :param criteria: Filters on the account table
+    :param chunksize: Rows per streamed batch
+    :return: Arrays in account_id order
+    """
+    statement = (
+        select(
+            Account.account_id,
+            Account.cust_id,
+            Account.product_cd,
+            Account.open_branch_id,
+            Account.avail_balance,
+        )
+        .where(*criteria)
+        .order_by(Account.account_id)
+    )
+    table = _arrow_table(connectable, statement, chunksize)
+    if table is None:
+        return AccountArrays(
+            account_id=np.empty(0, np.int64),
+            cust_id=np.empty(0, np.int64),
+            product_cd=np.empty(0, object),
+            open_branch_id=np.empty(0, np.int64),
+            avail_balance=np.empty(0, np.float64),
+        )
+    return AccountArrays(
+        account_id=table.column("account_id").to_numpy().astype(np.int64, copy=False),
+        cust_id=table.column("cust_id").to_numpy().astype(np.int64, copy=False),
+        product_cd=table.column("product_cd").to_numpy(zero_copy_only=False),
+        open_branch_id=table.column("open_branch_id")
+        .fill_null(-1)
+        .to_numpy()
+        .astype(np.int64, copy=False),
+        avail_balance=table.column("avail_balance")
+        .to_numpy(zero_copy_only=False)
+        .astype(np.float64),
+    )
+
+
+def group_by(
+    keys: np.ndarray, values: Optional[np.ndarray] = None
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Sum and count values per key
+
+    :param keys: Group key of each row
+    :param values: Value of each row, only counted if None
+    :return: Sorted distinct keys, sum and count of each key
+    """
+    unique, inverse = np.unique(keys, return_inverse=True)
+    counts = np.bincount(inverse, minlength=len(unique))
+    sums = (
+        np.bincount(inverse, weights=values, minlength=len(unique))
+        if values is not None
+        else counts.astype(np.float64)
+    )
+    return unique, sums, counts
+
+
+def running_balances(
+    transactions: TransactionArrays, opening: Optional[np.ndarray] = None
+) -> np.ndarray:
+    """Balance of the account after each transaction
+
+    Transactions are applied per account in txn_date then txn_id order.
+
+    :param transactions: Transaction arrays
+    :param opening: Opening balance of each transaction's account, 0 if None
+    :return: Balance after each transaction, aligned with the arrays
+    """
+    order = np.lexsort(
+        (transactions.txn_id, transactions.txn_date, transactions.account_id)
+    )
+    accounts = transactions.account_id[order]
+    totals = np.cumsum(transactions.signed_amount[order])
+    starts = np.flatnonzero(np.r_[True, accounts[1:] != accounts[:-1]])
+    before = np.r_[0.0, totals][starts]
+    lengths = np.diff(np.r_[starts, len(order)])
+    balances = np.empty_like(totals)
+    balances[order] = totals - np.repeat(before, lengths)
+    return balances if opening is None else balances + opening
+
+
+def time_buckets(transactions: TransactionArrays, unit: str = "D") -> pd.DataFrame:
+    """Credit and debit totals per time bucket of txn_date
+
+    :param transactions: Transaction arrays
+    :param unit: Bucket unit, one of BUCKET_UNITS
+    :return: One row per bucket with the credit, debit and net totals and counts
+    """
+    if unit not in BUCKET_UNITS:
+        raise ValueError(
+            "Unknown bucket unit %r, expected one of %s" % (unit, BUCKET_UNITS)
+        )
+    if unit == "W":
+        # Weeks starting on Monday, 1970-01-01 was a Thursday
+        days = transactions.txn_date.astype("datetime64[D]").astype(np.int64)
+        buckets = ((days + 3) // 7 * 7 - 3).astype("datetime64[D]")
+    else:
+        buckets = transactions.txn_date.astype("datetime64[%s]" % unit)
+    frame = _split(buckets.astype("datetime64[s]"), transactions)
+    frame.index.name = "bucket"
+    return frame
+
+
+def credit_debit_split(
+    transactions: TransactionArrays, keys: Optional[np.ndarray] = None
+) -> pd.DataFrame:
+    """Credit and debit totals per key
+
+    :param transactions: Transaction arrays
+    :param keys: Group key of each transaction, the account if None
+    :return: One row per key with the credit, debit and net totals and counts
+    """
+    frame = _split(transactions.account_id if keys is None else keys, transactions)
+    frame.index.name = "account_id" if keys is None else "key"
+    return frame
+
+
+def _split(keys: np.ndarray, transactions: TransactionArrays) -> pd.DataFrame:
+    """Credit and debit totals and counts per key
+
+    :param keys: Group key of each transaction
+    :param transactions: Transaction arrays
+    :return: One row per key, sorted by key
+    """
+    unique, inverse = np.unique(keys, return_inverse=True)
+    size = len(unique)
+    credit = transactions.sign == CREDIT
+    debit = transactions.sign == DEBIT
+    frame = pd.DataFrame(
+        {
+            "credit_total": np.bincount(
+                inverse,
+                weights=np.where(credit, transactions.amount, 0.0),
+                minlength=size,
+            ),
+            "debit_total": np.bincount(
+                inverse,
+                weights=np.where(debit, transactions.amount, 0.0),
+                minlength=size,
+            ),
+            "credit_count": np.bincount(inverse, weights=credit, minlength=size).astype(
+                np.int64
+            ),
+            "debit_count": np.bincount(inverse, weights=debit, minlength=size).astype(
+                np.int64
+            ),
+        },
+        index=unique,
+    )
+    frame["net"] = frame["credit_total"] - frame["debit_total"]
+    return frame
@@ -0,0 +1,457 @@
+"""Hot and cold storage of the transactions by txn_date
+
+Transactions older than a horizon are moved from ``transaction`` to one
+archive table per month, ``transaction_archive_YYYYMM``, in batches each
+committed on its own, so an interrupted run is resumed by running it again::
+
+    create_archive(engine)
+    archive(engine, timedelta(days=365))
+
+route rewrites a select over Transaction to read the hot table, the archive
+tables or a UNION ALL of both, from the txn_date bounds of its WHERE clause::
+
+    with Session(engine) as session:
+        recent = session.scalars(
+            route(session, select(Transaction).where(Transaction.txn_date >= day))
+        ).all()
+
+The state table keeps two dates: the hot table holds every transaction from
+``hot_from`` on, and the archive tables hold only transactions before
+``archived_to``. They differ while a run is in progress, and the dates between
+them are read from both sides. Summaries refreshed by summaries.py keep the
+archived transactions, rebuild_summaries only sees the hot table.
+
+The Transaction entities, columns and relationship joins of the statement are
+rewritten, other entities are loaded as usual. Loads outside the statement are
+not routed: relationship loads such as ``Account.account_transactions`` and
+``Session.get(Transaction, ...)`` read the hot table alone, so they return
+only hot rows.
+"""
+
+import time
+from collections import defaultdict
+from dataclasses import dataclass, field
+from datetime import date, datetime, timedelta
+from typing import Dict, Final, List, Optional, Tuple, Union
+
+from sqlalchemy import (
+    BindParameter,
+    Column,
+    Connection,
+    DateTime,
+    Engine,
+    Index,
+    Integer,
+    MetaData,
+    String,
+    Table,
+    delete,
+    false,
+    insert,
+    inspect,
+    select,
+    union_all,
+    update,
+)
+from sqlalchemy.orm import QueryableAttribute, Session, aliased
+from sqlalchemy.sql import operators
+from sqlalchemy.sql import visitors
+from sqlalchemy.sql.elements import BinaryExpression, BooleanClauseList
+from sqlalchemy.sql.selectable import Select as SQLSelect
+from sqlalchemy.sql.selectable import TableClause
+
+from model import Transaction
+
+Executor = Union[Session, Connection]
+"""Where the archive state is read"""
+
+DEFAULT_BATCH_SIZE: Final[int] = 5_000
+"""Transactions moved per committed batch"""
+
+archive_metadata: Final[MetaData] = MetaData()
+"""Metadata of the archive tables, kept apart from the model tables"""
+
+archive_state: Final[Table] = Table(
+    "transaction_archive_state",
+    archive_metadata,
+    Column("id", Integer, primary_key=True),
+    Column("hot_from", DateTime, nullable=True),
+    Column("archived_to", DateTime, nullable=True),
+)
+"""Single row with the boundaries of the hot table and of the archive"""
+
+archive_months: Final[Table] = Table(
+    "transaction_archive_month",
+    archive_metadata,
+    Column("month", String(7), primary_key=True),
+    Column("table_name", String(64), nullable=False),
+    Column("rows", Integer, nullable=False),
+)
+"""Catalog of the monthly archive tables and their number of rows"""
+
+_STATE_ID: Final[int] = 1
+"""Primary key of the single state row"""
+
+_LOWER: Final[tuple] = (operators.ge, operators.gt)
+_UPPER: Final[tuple] = (operators.le, operators.lt)
+_REVERSED: Final[Dict] = {
+    operators.ge: operators.le,
+    operators.gt: operators.lt,
+    operators.le: operators.ge,
+    operators.lt: operators.gt,
+    operators.eq: operators.eq,
+}
+"""Comparison operators and their mirror, for ``value < column`` predicates"""
+
+
+@dataclass(frozen=True)
+class ArchiveState:
+    """Boundaries of the hot table and of the archive"""
+
+    hot_from: Optional[datetime]
+    """The hot table holds every transaction from this date on, all if None"""
+
+    archived_to: Optional[datetime]
+    """The archive holds only transactions before this date, none if None"""
+
+
+@dataclass
+class ArchiveStats:
+    """Outcome of an archive run"""
+
+    cutoff: datetime
+    """Transactions before this date were archived"""
+
+    rows: int = 0
+    """Number of transactions moved"""
+
+    batches: int = 0
+    """Number of committed batches"""
+
+    months: Dict[str, int] = field(default_factory=dict)
+    """Transactions moved per month, "YYYY-MM" """
+
+    seconds: float = 0.0
+    """Time spent archiving"""
+
+    complete: bool = False
+    """Whether every transaction before the cutoff was moved"""
+
+
+def _month(moment: Union[date, datetime]) -> str:
+    """Catalog key of the month of a date"""
+    return "%04d-%02d" % (moment.year, moment.month)
+
+
+def _month_start(month: str) -> datetime:
+    """First instant of a catalog month"""
+    year, number = map(int, month.split("-"))
+    return datetime(year, number, 1)
+
+
+def _next_month(month: str) -> datetime:
+    """First instant of the month after a catalog month"""
+    start = _month_start(month)
+    return datetime(start.year + start.month // 12, start.month % 12 + 1, 1)
+
+
+def archive_table(month: str) -> Table:
+    """Archive table of a month, defined on first use
+
+    The table has the columns of ``transaction`` without the foreign keys,
+    and an index on the account history.
+
+    :param month: Month, "YYYY-MM"
+    :return: Table
+    """
+    name = "transaction_archive_%s" % month.replace("-", "")
+    table = archive_metadata.tables.get(name)
+    if table is None:
+        table = Table(
+            name,
+            archive_metadata,
+            *(
+                Column(
+                    column.name,
+                    column.type,
+                    primary_key=column.primary_key,
+                    autoincrement=False,
+                    nullable=column.nullable,
+                )
+                for column in Transaction.__table__.columns
+            ),
+        )
+        Index("ix_%s_account_id_txn_date" % name, table.c.account_id, table.c.txn_date)
+    return table
+
+
+def create_archive(engine: Engine) -> None:
+    """Create the state and catalog tables if needed
+
+    The monthly tables are created when rows are first archived into them.
+
+    :param engine: Database engine
+    :return: None
+    """
+    archive_metadata.create_all(engine, tables=[archive_state, archive_months])
+
+
+def state(executor: Executor) -> ArchiveState:
+    """Boundaries of the hot table and of the archive
+
+    :param executor: Session or connection
+    :return: Archive state, nothing archived if there is no state row
+    """
+    row = executor.execute(
+        select(archive_state.c.hot_from, archive_state.c.archived_to).where(
+            archive_state.c.id == _STATE_ID
+        )
+    ).one_or_none()
+    return ArchiveState(None, None) if row is None else ArchiveState(*row)
+
+
+def _set_state(connection: Connection, **values) -> None:
+    """Update the state row, created on first use"""
+    updated = connection.execute(
+        update(archive_state).where(archive_state.c.id == _STATE_ID).values(values)
+    )
+    if updated.rowcount == 0:
+        connection.execute(insert(archive_state).values(id=_STATE_ID, **values))
+
+
+def _count_month(connection: Connection, month: str, table: Table, rows: int) -> None:
+    """Add archived rows to the catalog entry of a month"""
+    updated = connection.execute(
+        update(archive_months)
+        .where(archive_months.c.month == month)
+        .values(rows=archive_months.c.rows + rows)
+    )
+    if updated.rowcount == 0:
+        connection.execute(
+            insert(archive_months).values(month=month, table_name=table.name, rows=rows)
+        )
+
+
+def _move_batch(
+    connection: Connection, cutoff: datetime, batch_size: int
+) -> Dict[str, int]:
+    """Move the oldest transactions before the cutoff to their archive tables
+
+    :param connection: Connection within the batch transaction
+    :param cutoff: Transactions before this date are moved
+    :param batch_size: Maximum number of transactions moved
+    :return: Number of moved transactions per month, empty when done
+    """
+    hot = Transaction.__table__
+    rows = (
+        connection.execute(
+            select(hot)
+            .where(hot.c.txn_date < cutoff)
+            .order_by(hot.c.txn_id)
+            .limit(batch_size)
+        )
+        .mappings()
+        .all()
+    )
+    by_month: Dict[str, List[dict]] = defaultdict(list)
+    for row in rows:
+        by_month[_month(row["txn_date"])].append(dict(row))
+    for month, month_rows in sorted(by_month.items()):
+        table = archive_table(month)
+        table.create(connection, checkfirst=True)
+        connection.execute(insert(table), month_rows)
+        _count_month(connection, month, table, len(month_rows))
+    if rows:
+        connection.execute(
+            delete(hot).where(hot.c.txn_id.in_([row["txn_id"] for row in rows]))
+        )
+    return {month: len(month_rows) for month, month_rows in by_month.items()}
+
+
+def archive(
+    engine: Engine,
+    horizon: Union[timedelta, date, datetime],
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    max_batches: Optional[int] = None,
+) -> ArchiveStats:
+    """Move the transactions older than a horizon to the monthly archive tables
+
+    Each batch is committed on its own. A run stopped by max_batches or an
+    error is resumed by running it again with the same horizon.
+
+    :param engine: Database engine
+    :param horizon: Age of the archived transactions, or the cutoff date itself
+    :param batch_size: Transactions moved per committed batch
+    :param max_batches: Stop after this many batches, all if None
+    :return: Archive statistics
+    """
+    if isinstance(horizon, timedelta):
+        cutoff = datetime.combine(date.today(), datetime.min.time()) - horizon
+    elif isinstance(horizon, datetime):
+        cutoff = horizon
+    else:
+        cutoff = datetime.combine(horizon, datetime.min.time())
+    stats = ArchiveStats(cutoff)
+    start = time.perf_counter()
+    with engine.begin() as connection:
+        current = state(connection)
+        if current.archived_to is None or current.archived_to < cutoff:
+            # Readers look at both sides of the dates being moved
+            _set_state(connection, archived_to=cutoff)
+    while max_batches is None or stats.batches < max_batches:
+        with engine.begin() as connection:
+            moved = _move_batch(connection, cutoff, batch_size)
+            if not moved:
+                if current.hot_from is None or current.hot_from < cutoff:
+                    _set_state(connection, hot_from=cutoff)
+                stats.complete = True
+                break
+        stats.batches += 1
+        for month, rows in moved.items():
+            stats.rows += rows
+            stats.months[month] = stats.months.get(month, 0) + rows
+    stats.seconds = time.perf_counter() - start
+    return stats
+
+
+def _of_table(element, table: Table) -> bool:
+    """Whether an element is a table, or one of its columns, ignoring annotations"""
+    owner = (
+        element if isinstance(element, TableClause) else getattr(element, "table", None)
+    )
+    return isinstance(owner, TableClause) and owner._deannotate() is table
+
+
+def _as_datetime(value) -> Optional[datetime]:
+    """Datetime of a date or datetime bound, None for other values"""
+    if isinstance(value, datetime):
+        return value
+    if isinstance(value, date):
+        return datetime.combine(value, datetime.min.time())
+    return None
+
+
+def date_bounds(statement: SQLSelect) -> Tuple[Optional[datetime], Optional[datetime]]:
+    """Range of txn_date a select is restricted to by its WHERE clause
+
+    Only comparisons and BETWEEN of Transaction.txn_date with bound values,
+    combined with AND at the top level, are taken into account.
+
+    :param statement: Select over Transaction
+    :return: Lowest and highest txn_date, both inclusive, None if unbounded
+    """
+    txn_date = Transaction.__table__.c.txn_date
+    low: Optional[datetime] = None
+    high: Optional[datetime] = None
+    criteria = [] if statement.whereclause is None else [statement.whereclause]
+    while criteria:
+        criterion = criteria.pop()
+        if (
+            isinstance(criterion, BooleanClauseList)
+            and criterion.operator is operators.and_
+        ):
+            criteria.extend(criterion.clauses)
+            continue
+        if not isinstance(criterion, BinaryExpression):
+            continue
+        column, other, operator = criterion.left, criterion.right, criterion.operator
+        if not _of_table(column, txn_date.table):
+            column, other = other, column
+            operator = _REVERSED.get(operator)
+        if not _of_table(column, txn_date.table) or column.name != txn_date.name:
+            continue
+        if operator is operators.between_op:
+            lower, upper = (
+                _as_datetime(clause.effective_value) for clause in other.clauses
+            )
+        elif isinstance(other, BindParameter):
+            value = _as_datetime(other.effective_value)
+            lower = value if operator in _LOWER or operator is operators.eq else None
+            upper = value if operator in _UPPER or operator is operators.eq else None
+        else:
+            continue
+        if lower is not None and (low is None or lower > low):
+            low = lower
+        if upper is not None and (high is None or upper < high):
+            high = upper
+    return low, high
+
+
+def _archive_tables(
+    executor: Executor, low: Optional[datetime], high: Optional[datetime]
+) -> List[Table]:
+    """Archive tables of the months overlapping a txn_date range"""
+    tables = []
+    for month, table_name in executor.execute(
+        select(archive_months.c.month, archive_months.c.table_name).order_by(
+            archive_months.c.month
+        )
+    ):
+        if (low is None or _next_month(month) > low) and (
+            high is None or _month_start(month) <= high
+        ):
+            tables.append(archive_table(month))
+    return tables
+
+
+def route(executor: Executor, statement: SQLSelect) -> SQLSelect:
+    """Rewrite a select over Transaction to read the hot or archived rows
+
+    The hot table alone is read when the txn_date bounds of the statement are
+    all on or after hot_from, the archive tables alone when they are all before
+    archived_to, else a UNION ALL of both restricted to the same bounds.
+
+    :param executor: Session or connection, to read the archive state
+    :param statement: Select involving Transaction, filtered on txn_date
+    :return: Select over the hot table, the archive tables or both
+    """
+    current = state(executor)
+    if current.archived_to is None:
+        return statement
+    low, high = date_bounds(statement)
+    hot_only = (
+        current.hot_from is not None and low is not None and low >= current.hot_from
+    )
+    if hot_only:
+        return statement
+    tables = _archive_tables(executor, low, high)
+    archive_only = (
+        current.hot_from is not None and high is not None and high < current.hot_from
+    )
+    hot = Transaction.__table__
+    if not archive_only:
+        tables.insert(0, hot)
+    if not tables or tables == [hot]:
+        return statement
+    # The union takes its columns from its first select, one of the hot table
+    # lets the Transaction mapping and its relationships adapt to the source
+    parts = [] if tables[0] is hot else [select(hot).where(false())]
+    for table in tables:
+        part = select(table)
+        if low is not None:
+            part = part.where(table.c.txn_date >= low)
+        if high is not None:
+            part = part.where(table.c.txn_date <= high)
+        parts.append(part)
+    source = union_all(*parts).subquery("transaction_all")
+    mapper = inspect(Transaction)
+    routed = aliased(Transaction, source)
+
+    def replace(element):
+        if isinstance(element, QueryableAttribute):
+            # Relationships from and to Transaction, e.g. in join()
+            if element.parent is mapper:
+                return getattr(routed, element.key)
+            if getattr(element.property, "mapper", None) is mapper:
+                return element.of_type(routed)
+            return None
+        if not _of_table(element, hot):
+            return None
+        if not isinstance(element, TableClause):
+            return source.c[element.name]
+        if element._annotations.get("parententity") is mapper:
+            # Transaction entity, loaded from the rows of the source
+            return inspect(routed).__clause_element__()
+        return source
+
+    return visitors.replacement_traverse(statement, {}, replace)
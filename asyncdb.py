@@ -0,0 +1,159 @@
+"""Asynchronous engines and sessions for the bank database
+
+The asyncio counterpart of db.py, one AsyncEngine per database URL for the
+life of the process. gather runs independent ``select()`` statements
+concurrently, each on its own session and connection, instead of one after
+the other::
+
+    factory = async_session_factory()
+    accounts, officers = await gather(
+        factory,
+        select(Account).where(Account.cust_id == 1),
+        select(Officer).where(Officer.cust_id == 1),
+    )
+
+Requires an asyncio driver: aiosqlite for SQLite, aiomysql for MySQL, both
+installed by ``poetry install --extras async``.
+"""
+
+import asyncio
+import threading
+from typing import Dict, Final, List, Optional, Sequence, Union
+
+from sqlalchemy import URL, Row, make_url
+from sqlalchemy.ext.asyncio import (
+    AsyncEngine,
+    AsyncSession,
+    async_sessionmaker,
+    create_async_engine,
+)
+from sqlalchemy.pool import StaticPool
+from sqlalchemy.sql import Executable
+
+from db import PoolSettings, url_from_env
+
+ASYNC_DRIVERS: Final[Dict[str, str]] = {
+    "sqlite": "sqlite+aiosqlite",
+    "mysql": "mysql+aiomysql",
+}
+"""Asyncio driver name of each backend"""
+
+_async_engines: Dict[str, AsyncEngine] = {}
+"""Process-wide async engines, keyed by their rendered URL"""
+
+_async_engines_lock: Final[threading.Lock] = threading.Lock()
+
+
+def async_url(url: Union[URL, str]) -> URL:
+    """Same database URL with the asyncio driver of its backend
+
+    :param url: Database URL, e.g. of a sync engine
+    :return: Database URL of the asyncio driver
+    """
+    url = make_url(url)
+    backend = url.get_backend_name()
+    if backend not in ASYNC_DRIVERS:
+        raise ValueError("No asyncio driver known for the %s backend" % backend)
+    return url.set(drivername=ASYNC_DRIVERS[backend])
+
+
+def get_async_engine(
+    url: Optional[Union[URL, str]] = None,
+    settings: Optional[PoolSettings] = None,
+    **kwargs,
+) -> AsyncEngine:
+    """Get the process-wide async engine of a database, creating it on first use
+
+    Sync driver names are swapped for the asyncio driver of the backend. The
+    settings and keyword arguments only apply when the engine is created.
+
+    :param url: Database URL, defaults to the ``DB_*`` environment variables
+    :param settings: Pool settings, defaults to the ``DB_POOL_*`` environment variables
+    :param kwargs: Extra keyword arguments for ``create_async_engine``
+    :return: Shared async engine
+    """
+    url = async_url(url_from_env() if url is None else url)
+    key = url.render_as_string(hide_password=False)
+    with _async_engines_lock:
+        engine = _async_engines.get(key)
+        if engine is None:
+            if url.get_backend_name() == "sqlite" and url.database in (
+                None,
+                "",
+                ":memory:",
+            ):
+                # A single shared connection, else every checkout is a new empty database
+                engine = create_async_engine(url, poolclass=StaticPool, **kwargs)
+            else:
+                settings = settings if settings is not None else PoolSettings.from_env()
+                engine = create_async_engine(
+                    url,
+                    pool_size=settings.pool_size,
+                    max_overflow=settings.max_overflow,
+                    pool_timeout=settings.pool_timeout,
+                    pool_pre_ping=settings.pool_pre_ping,
+                    pool_recycle=settings.pool_recycle,
+                    **kwargs,
+                )
+            _async_engines[key] = engine
+    return engine
+
+
+def async_session_factory(
+    engine: Optional[AsyncEngine] = None,
+) -> async_sessionmaker[AsyncSession]:
+    """Factory of async sessions on an engine
+
+    Objects are not expired on commit, as an expired attribute cannot be lazy
+    loaded under asyncio.
+
+    :param engine: Async engine, the engine of the ``DB_*`` variables if None
+    :return: Session factory
+    """
+    return async_sessionmaker(
+        engine if engine is not None else get_async_engine(), expire_on_commit=False
+    )
+
+
+async def gather(
+    factory: async_sessionmaker[AsyncSession],
+    *statements: Executable,
+    limit: Optional[int] = None,
+) -> List[Sequence[Row]]:
+    """Run independent statements concurrently, each on its own session
+
+    :param factory: Session factory
+    :param statements: Select statements
+    :param limit: Maximum number of statements running at once, unbounded if None
+    :return: Rows of each statement, in the order of the statements
+    """
+    semaphore = asyncio.Semaphore(limit) if limit is not None else None
+
+    async def run(statement: Executable) -> Sequence[Row]:
+        async with factory() as session:
+            return (await session.execute(statement)).all()
+
+    async def bounded(statement: Executable) -> Sequence[Row]:
+        async with semaphore:
+            return await run(statement)
+
+    return list(
+        await asyncio.gather(
+            *(
+                run(statement) if semaphore is None else bounded(statement)
+                for statement in statements
+            )
+        )
+    )
+
+
+async def dispose_async_engines() -> None:
+    """Close all pooled connections and forget every shared async engine
+
+    :return: None
+    """
+    with _async_engines_lock:
+        engines = list(_async_engines.values())
+        _async_engines.clear()
+    for engine in engines:
+        await engine.dispose()
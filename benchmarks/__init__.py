@@ -0,0 +1 @@
+"""Benchmarks of the notebook queries and the performance helpers"""
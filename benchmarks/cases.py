@@ -0,0 +1,532 @@
+"""Notebook queries as named benchmark cases
+
+Each case answers one notebook question in several ways, called variants:
+"raw" reads the raw SQL with pandas, "select" executes the ORM ``select()``,
+"python" walks ORM objects and aggregates them in Python, as the notebooks do,
+"aggregate" runs the same report through aggregates.AggregateQuery and
+"numpy" loads the columns into arrays and aggregates them with analytics. A
+variant returns the number of rows it pulled from the database, for the
+"python" variants the number of ORM objects loaded.
+
+The raw SQL is written to run on both MySQL and SQLite.
+"""
+
+from collections import Counter, defaultdict
+from dataclasses import dataclass
+from datetime import date, datetime, time, timedelta
+from typing import Callable, Dict, Final, List, Mapping, Optional, Sized
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import Table, and_, bindparam, event, func, literal, select, text
+from sqlalchemy.orm import Session, aliased
+from sqlalchemy.sql.selectable import Select as SQLSelect
+
+from aggregates import AggregateQuery
+from analytics import AccountArrays, group_by, load_accounts
+from model import (
+    Account,
+    AccountStatusEnum,
+    Branch,
+    Business,
+    Customer,
+    CustomerTypeEnum,
+    Employee,
+    Individual,
+    Product,
+    Transaction,
+)
+
+Variant = Callable[[Session], int]
+"""A way to answer a case, returning the number of rows pulled from the database"""
+
+
+@dataclass(frozen=True)
+class QueryCase:
+    """A notebook question and the variants answering it"""
+
+    name: str
+    """Unique name of the case, prefixed by its chapter"""
+
+    variants: Mapping[str, Variant]
+    """Variants keyed by name"""
+
+
+Params = Callable[[Session], Mapping[str, object]]
+"""Bound parameters of a variant, looked up from the database of the session"""
+
+
+def raw(sql: str, params: Optional[Params] = None) -> Variant:
+    """Variant reading raw SQL into a DataFrame, as the notebooks do
+
+    :param sql: Raw SQL query, with :name placeholders if params is given
+    :param params: Bound parameters of the query, if any
+    :return: Variant
+    """
+
+    def run(session: Session) -> int:
+        if params is None:
+            return len(pd.read_sql_query(sql, con=session.connection()))
+        return len(
+            pd.read_sql_query(
+                text(sql), con=session.connection(), params=dict(params(session))
+            )
+        )
+
+    return run
+
+
+def orm(statement: SQLSelect, params: Optional[Params] = None) -> Variant:
+    """Variant executing an ORM select statement
+
+    :param statement: Select statement
+    :param params: Bound parameters of the statement, if any
+    :return: Variant
+    """
+
+    def run(session: Session) -> int:
+        bound = params(session) if params is not None else {}
+        return len(session.execute(statement, bound).all())
+
+    return run
+
+
+def python(walk: Callable[[Session], object]) -> Variant:
+    """Variant walking ORM objects in Python, counting the objects loaded
+
+    :param walk: Function loading and aggregating ORM objects
+    :return: Variant
+    """
+
+    def run(session: Session) -> int:
+        loaded = 0
+
+        def count(session: Session, instance: object) -> None:
+            nonlocal loaded
+            loaded += 1
+
+        event.listen(session, "loaded_as_persistent", count)
+        try:
+            walk(session)
+        finally:
+            event.remove(session, "loaded_as_persistent", count)
+        return loaded
+
+    return run
+
+
+def aggregate(query: AggregateQuery) -> Variant:
+    """Variant running a server-side aggregate report
+
+    :param query: Aggregate report
+    :return: Variant
+    """
+
+    def run(session: Session) -> int:
+        return len(query.all(session))
+
+    return run
+
+
+def vectorized(load: Callable[[Session], Sized]) -> Variant:
+    """Variant loading column arrays and aggregating them with NumPy
+
+    :param load: Function loading and aggregating column arrays
+    :return: Variant
+    """
+
+    def run(session: Session) -> int:
+        return len(load(session))
+
+    return run
+
+
+def _accounts_per_customer_numpy(session: Session) -> AccountArrays:
+    accounts = load_accounts(session)
+    group_by(accounts.cust_id)
+    return accounts
+
+
+def _product_branch_balances_numpy(session: Session) -> AccountArrays:
+    accounts = load_accounts(session)
+    branch_ids, branch_names = map(
+        np.array, zip(*session.execute(select(Branch.branch_id, Branch.name)).all())
+    )
+    order = np.argsort(branch_ids)
+    names = branch_names[order][
+        np.searchsorted(branch_ids[order], accounts.open_branch_id)
+    ]
+    # GROUP BY product_cd, branch name HAVING COUNT(*) > 1 ORDER BY the sum
+    keys = np.char.add(np.char.add(accounts.product_cd.astype(str), "|"), names)
+    unique, sums, counts = group_by(keys, accounts.avail_balance)
+    kept = counts > 1
+    unique[kept][np.argsort(-sums[kept], kind="stable")]
+    return accounts
+
+
+def _accounts_per_customer_python(session: Session) -> None:
+    accounts = session.query(Account).all()
+    Counter(acct.cust_id for acct in accounts)
+
+
+def _multi_account_customers_python(session: Session) -> None:
+    accounts = session.query(Account).all()
+    sorted(
+        (
+            (cust_id, count)
+            for cust_id, count in Counter(acct.cust_id for acct in accounts).items()
+            if count > 1
+        ),
+        key=lambda tup: tup[0],
+    )
+
+
+def _active_product_balances_python(session: Session) -> None:
+    accounts = session.query(Account).all()
+    balances: Dict[str, float] = defaultdict(float)
+    for acct in accounts:
+        if acct.status == AccountStatusEnum.ACTIVE:
+            balances[acct.product_cd] += acct.avail_balance
+    {key: value for key, value in balances.items() if value >= 10_000}
+
+
+def _product_branch_balances_python(session: Session) -> None:
+    accounts = session.query(Account).all()
+    balances: Dict[tuple, float] = defaultdict(float)
+    counts: Counter = Counter()
+    for acct in accounts:
+        key = acct.product_cd, acct.account_open_branch.name
+        balances[key] += acct.avail_balance
+        counts[key] += 1
+    sorted(
+        (
+            (product_cd, name, balance)
+            for (product_cd, name), balance in balances.items()
+            if counts[(product_cd, name)] > 1
+        ),
+        key=lambda tup: tup[-1],
+        reverse=True,
+    )
+
+
+def _individual_account_products_python(session: Session) -> None:
+    for account in session.scalars(select(Account)):
+        customer = account.account_customer
+        if customer.cust_type_cd != CustomerTypeEnum.I:
+            continue
+        account.account_product.name
+
+
+def _cross_department_superiors_python(session: Session) -> None:
+    for employee in session.scalars(select(Employee)):
+        superior = employee.superior_emp
+        if superior is None or superior.dept_id == employee.dept_id:
+            continue
+
+
+_busiest_days: Dict[str, date] = {}
+"""Day with the most transactions of each benchmarked database, keyed by URL"""
+
+
+def busiest_txn_day(session: Session) -> date:
+    """Day with the most transactions, looked up once per database
+
+    The warm-up run of a variant looks the day up, the timed runs reuse it.
+
+    :param session: Session on the benchmarked database
+    :return: Earliest of the days with the most transactions
+    """
+    url = session.get_bind().url.render_as_string(hide_password=True)
+    if url not in _busiest_days:
+        day = func.date(Transaction.txn_date)
+        value = session.execute(
+            select(day).group_by(day).order_by(func.count().desc(), day).limit(1)
+        ).scalar()
+        _busiest_days[url] = (
+            value if isinstance(value, date) else date.fromisoformat(str(value)[:10])
+        )
+    return _busiest_days[url]
+
+
+def _busiest_day_bounds(session: Session) -> Dict[str, datetime]:
+    day = datetime.combine(busiest_txn_day(session), time())
+    return {"day_start": day, "day_end": day + timedelta(days=1)}
+
+
+def _busiest_day_strings(session: Session) -> Dict[str, str]:
+    day = busiest_txn_day(session)
+    return {
+        "day_start": day.isoformat(),
+        "day_end": (day + timedelta(days=1)).isoformat(),
+    }
+
+
+def _transactions_on_date_python(session: Session) -> None:
+    day = busiest_txn_day(session)
+    [
+        acct.account_id
+        for acct in session.query(Account)
+        if any(trans.txn_date.date() == day for trans in acct.account_transactions)
+    ]
+
+
+_superior = aliased(Employee, name="e_s")
+
+_multi_account_customers = AggregateQuery(Account.cust_id).count(
+    Account.cust_id, "n_acct"
+)
+_multi_account_customers = _multi_account_customers.having(
+    _multi_account_customers["n_acct"] > 1
+)
+
+_active_product_balances = (
+    AggregateQuery(Account.product_cd)
+    .sum(Account.avail_balance, "prod_balance")
+    .where(Account.status == AccountStatusEnum.ACTIVE)
+)
+_active_product_balances = _active_product_balances.having(
+    _active_product_balances["prod_balance"] >= 10_000
+)
+
+_product_branch_balances = (
+    AggregateQuery(Account.product_cd, Branch.name)
+    .join(Branch, Account.open_branch_id == Branch.branch_id)
+    .sum(Account.avail_balance, "tot_balance")
+    .count(label="how_many")
+)
+_product_branch_balances = _product_branch_balances.having(
+    _product_branch_balances["how_many"] > 1
+).order_by(_product_branch_balances["tot_balance"].desc())
+
+_individual: Final[Table] = Individual.__table__
+"""individual table, as joined by the book query"""
+
+_business: Final[Table] = Business.__table__
+"""business table, as joined by the book query"""
+
+CASES: Final[List[QueryCase]] = [
+    QueryCase(
+        name="ch03_distinct_customers",
+        variants={
+            "raw": raw("SELECT DISTINCT cust_id FROM account"),
+            "select": orm(select(Account.cust_id).distinct()),
+        },
+    ),
+    QueryCase(
+        name="ch04_employee_start_range",
+        variants={
+            "raw": raw(
+                """
+                SELECT e.emp_id, e.start_date
+                FROM employee e
+                WHERE e.start_date BETWEEN '2001-01-01' AND '2003-01-01'
+                """
+            ),
+            "select": orm(
+                select(Employee.emp_id, Employee.start_date).where(
+                    Employee.start_date.between(date(2001, 1, 1), date(2003, 1, 1))
+                )
+            ),
+        },
+    ),
+    QueryCase(
+        name="ch05_individual_account_products",
+        variants={
+            "raw": raw(
+                """
+                SELECT a.account_id, c.fed_id, p.name
+                FROM account a
+                JOIN customer c ON a.cust_id = c.cust_id
+                JOIN product p ON p.product_cd = a.product_cd
+                WHERE c.cust_type_cd = 'I'
+                """
+            ),
+            "select": orm(
+                select(Account.account_id, Customer.fed_id, Product.name)
+                .join(Customer, Account.cust_id == Customer.cust_id)
+                .join(Product, Account.product_cd == Product.product_cd)
+                .where(Customer.cust_type_cd == CustomerTypeEnum.I)
+            ),
+            "python": python(_individual_account_products_python),
+        },
+    ),
+    QueryCase(
+        name="ch05_cross_department_superiors",
+        variants={
+            "raw": raw(
+                """
+                SELECT e.fname, e.lname
+                FROM employee e
+                JOIN employee e_s ON e.superior_emp_id = e_s.emp_id
+                WHERE e.dept_id != e_s.dept_id
+                """
+            ),
+            "select": orm(
+                select(Employee.fname, Employee.lname)
+                .join(_superior, Employee.superior_emp_id == _superior.emp_id)
+                .where(Employee.dept_id != _superior.dept_id)
+            ),
+            "python": python(_cross_department_superiors_python),
+        },
+    ),
+    QueryCase(
+        name="ch08_accounts_per_customer",
+        variants={
+            "raw": raw(
+                """
+                SELECT a.cust_id, COUNT(a.cust_id) n_acct
+                FROM account a
+                GROUP BY a.cust_id
+                """
+            ),
+            "select": orm(
+                select(Account.cust_id, func.count(Account.cust_id)).group_by(
+                    Account.cust_id
+                )
+            ),
+            "python": python(_accounts_per_customer_python),
+            "aggregate": aggregate(
+                AggregateQuery(Account.cust_id).count(Account.cust_id, "n_acct")
+            ),
+            "numpy": vectorized(_accounts_per_customer_numpy),
+        },
+    ),
+    QueryCase(
+        name="ch08_multi_account_customers",
+        variants={
+            "raw": raw(
+                """
+                SELECT a.cust_id, COUNT(a.cust_id) n_acct
+                FROM account a
+                GROUP BY a.cust_id
+                HAVING COUNT(a.cust_id) > 1
+                """
+            ),
+            "select": orm(
+                select(Account.cust_id, func.count(Account.cust_id))
+                .group_by(Account.cust_id)
+                .having(func.count(Account.cust_id) > 1)
+            ),
+            "python": python(_multi_account_customers_python),
+            "aggregate": aggregate(_multi_account_customers),
+        },
+    ),
+    QueryCase(
+        name="ch08_active_product_balances",
+        variants={
+            "raw": raw(
+                """
+                SELECT a.product_cd, SUM(a.avail_balance) prod_balance
+                FROM account a
+                WHERE a.status = 'ACTIVE'
+                GROUP BY a.product_cd
+                HAVING SUM(a.avail_balance) >= 10000
+                """
+            ),
+            "select": orm(
+                select(Account.product_cd, func.sum(Account.avail_balance))
+                .where(Account.status == AccountStatusEnum.ACTIVE)
+                .group_by(Account.product_cd)
+                .having(func.sum(Account.avail_balance) >= 10_000)
+            ),
+            "python": python(_active_product_balances_python),
+            "aggregate": aggregate(_active_product_balances),
+        },
+    ),
+    QueryCase(
+        name="ch08_product_branch_balances",
+        variants={
+            "raw": raw(
+                """
+                SELECT a.product_cd, b.name branch_name,
+                    SUM(a.avail_balance) tot_balance
+                FROM account a
+                JOIN branch b ON a.open_branch_id = b.branch_id
+                GROUP BY a.product_cd, b.name
+                HAVING COUNT(*) > 1
+                ORDER BY tot_balance DESC
+                """
+            ),
+            "select": orm(
+                select(
+                    Account.product_cd,
+                    Branch.name,
+                    func.sum(Account.avail_balance).label("tot_balance"),
+                )
+                .join(Branch, Account.open_branch_id == Branch.branch_id)
+                .group_by(Account.product_cd, Branch.name)
+                .having(func.count(literal("*")) > 1)
+                .order_by(func.sum(Account.avail_balance).desc())
+            ),
+            "python": python(_product_branch_balances_python),
+            "aggregate": aggregate(_product_branch_balances),
+            "numpy": vectorized(_product_branch_balances_numpy),
+        },
+    ),
+    QueryCase(
+        name="ch09_transactions_on_date",
+        variants={
+            "raw": raw(
+                """
+                SELECT a.account_id, a.product_cd, a.cust_id, a.avail_balance
+                FROM account a
+                WHERE EXISTS (
+                    SELECT 1 FROM `transaction` t
+                    WHERE t.account_id = a.account_id
+                    AND t.txn_date >= :day_start AND t.txn_date < :day_end
+                )
+                """,
+                _busiest_day_strings,
+            ),
+            "select": orm(
+                select(
+                    Account.account_id,
+                    Account.product_cd,
+                    Account.cust_id,
+                    Account.avail_balance,
+                ).where(
+                    select(literal(1))
+                    .where(
+                        and_(
+                            Transaction.account_id == Account.account_id,
+                            Transaction.txn_date >= bindparam("day_start"),
+                            Transaction.txn_date < bindparam("day_end"),
+                        )
+                    )
+                    .exists()
+                ),
+                _busiest_day_bounds,
+            ),
+            "python": python(_transactions_on_date_python),
+        },
+    ),
+    QueryCase(
+        name="ch10_account_customer_names",
+        variants={
+            "raw": raw(
+                """
+                SELECT a.account_id, a.cust_id, i.fname, i.lname,
+                    bus.name business_name
+                FROM account a
+                LEFT OUTER JOIN individual i ON a.cust_id = i.cust_id
+                LEFT OUTER JOIN business bus ON a.cust_id = bus.cust_id
+                """
+            ),
+            "select": orm(
+                select(
+                    Account.account_id,
+                    Account.cust_id,
+                    _individual.c.fname,
+                    _individual.c.lname,
+                    _business.c.name,
+                )
+                .outerjoin(
+                    _individual,
+                    Account.cust_id == _individual.c.cust_id,
+                )
+                .outerjoin(_business, Account.cust_id == _business.c.cust_id)
+            ),
+        },
+    ),
+]
+"""All benchmark cases"""
@@ -0,0 +1,177 @@
+"""Benchmark of the fan-out reads of a customer request, sync versus asyncio
+
+A request reads a customer's accounts, officers and recent transactions. The
+sync path runs the reads one after the other on a Session, the async path runs
+them concurrently with asyncdb.gather on aiosqlite::
+
+    python -m benchmarks.concurrency --scale 1 --repeat 50 --latency-ms 1
+
+A local SQLite file has no network round trip, which is what concurrency
+hides. --latency-ms adds a simulated round trip to every statement, slept on
+the thread running the statement: the caller's thread for the sync path and
+the connection's worker thread for aiosqlite.
+"""
+
+import argparse
+import asyncio
+import statistics
+import time
+from typing import Final, List, Union
+
+from sqlalchemy import Engine, event, select
+from sqlalchemy.engine import AdaptedConnection
+from sqlalchemy.ext.asyncio import AsyncEngine, async_sessionmaker
+from sqlalchemy.orm import Session
+from sqlalchemy.sql import Executable
+
+from asyncdb import (
+    async_session_factory,
+    dispose_async_engines,
+    gather,
+    get_async_engine,
+)
+from model import Account, Customer, Officer, Transaction
+
+from .harness import percentile, prepare_sqlite
+
+RECENT_TRANSACTIONS: Final[int] = 20
+"""Number of transactions read per request"""
+
+
+def simulate_latency(engine: Union[Engine, AsyncEngine], seconds: float) -> None:
+    """Sleep before every statement of a SQLite engine, as a network round trip
+
+    :param engine: Sync or async SQLite engine
+    :param seconds: Simulated round trip
+    :return: None
+    """
+
+    def trace(statement: str) -> None:
+        time.sleep(seconds)
+
+    def connect(dbapi_connection, connection_record) -> None:
+        if isinstance(dbapi_connection, AdaptedConnection):
+            dbapi_connection.run_async(
+                lambda connection: connection.set_trace_callback(trace)
+            )
+        else:
+            dbapi_connection.set_trace_callback(trace)
+
+    sync_engine = engine.sync_engine if isinstance(engine, AsyncEngine) else engine
+    event.listen(sync_engine, "connect", connect)
+    sync_engine.pool.dispose()
+
+
+def request_statements(cust_id: int) -> List[Executable]:
+    """Independent reads of a customer request
+
+    :param cust_id: Customer ID
+    :return: Select statements
+    """
+    return [
+        select(Customer).where(Customer.cust_id == cust_id),
+        select(Account).where(Account.cust_id == cust_id),
+        select(Officer).where(Officer.cust_id == cust_id),
+        select(Transaction)
+        .join(Account, Transaction.account_id == Account.account_id)
+        .where(Account.cust_id == cust_id)
+        .order_by(Transaction.txn_date.desc())
+        .limit(RECENT_TRANSACTIONS),
+    ]
+
+
+def sync_request(engine: Engine, cust_id: int) -> int:
+    """Run the reads of a request one after the other
+
+    :param engine: Sync engine
+    :param cust_id: Customer ID
+    :return: Number of rows read
+    """
+    with Session(engine) as session:
+        return sum(
+            len(session.execute(statement).all())
+            for statement in request_statements(cust_id)
+        )
+
+
+async def async_request(factory: async_sessionmaker, cust_id: int) -> int:
+    """Run the reads of a request concurrently
+
+    :param factory: Async session factory
+    :param cust_id: Customer ID
+    :return: Number of rows read
+    """
+    return sum(
+        len(rows) for rows in await gather(factory, *request_statements(cust_id))
+    )
+
+
+async def _time_async(
+    factory: async_sessionmaker, customers: List[int], repeat: int
+) -> List[float]:
+    """Latencies of async requests, after one warm-up request"""
+    await async_request(factory, customers[0])
+    samples: List[float] = []
+    for index in range(repeat):
+        start = time.perf_counter()
+        await async_request(factory, customers[index % len(customers)])
+        samples.append((time.perf_counter() - start) * 1_000)
+    return samples
+
+
+def main() -> None:
+    """Run the benchmark from the command line"""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--scale", type=float, default=0.1, help="Scale factor")
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the data")
+    parser.add_argument("--repeat", type=int, default=50)
+    parser.add_argument(
+        "--data-dir", default=".benchmarks", help="Directory of the SQLite databases"
+    )
+    parser.add_argument(
+        "--latency-ms", type=float, default=0.0, help="Simulated round trip"
+    )
+    args = parser.parse_args()
+
+    engine = prepare_sqlite(args.data_dir, args.scale, args.seed)
+    if args.latency_ms:
+        simulate_latency(engine, args.latency_ms / 1_000)
+    with Session(engine) as session:
+        customers = list(
+            session.scalars(select(Account.cust_id).distinct().limit(args.repeat))
+        )
+
+    sync_request(engine, customers[0])
+    sync_samples: List[float] = []
+    for index in range(args.repeat):
+        start = time.perf_counter()
+        sync_request(engine, customers[index % len(customers)])
+        sync_samples.append((time.perf_counter() - start) * 1_000)
+
+    async def run_async() -> List[float]:
+        async_engine = get_async_engine(engine.url)
+        if args.latency_ms:
+            simulate_latency(async_engine, args.latency_ms / 1_000)
+        factory = async_session_factory(async_engine)
+        try:
+            return await _time_async(factory, customers, args.repeat)
+        finally:
+            await dispose_async_engines()
+
+    async_samples = asyncio.run(run_async())
+
+    print("%-6s %10s %10s %10s" % ("path", "p50_ms", "p95_ms", "mean_ms"))
+    for name, samples in (("sync", sync_samples), ("async", async_samples)):
+        print(
+            "%-6s %10.2f %10.2f %10.2f"
+            % (
+                name,
+                percentile(samples, 0.50),
+                percentile(samples, 0.95),
+                statistics.fmean(samples),
+            )
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,354 @@
+"""Benchmark harness running the query cases at several data scales
+
+Run the cases against SQLite databases generated at each scale factor, and
+optionally against a MySQL database, then store the results as JSON::
+
+    python -m benchmarks.harness --scale 0.1 --scale 1 --output results.json
+
+Compare two result files and list the regressions::
+
+    python -m benchmarks.harness --compare baseline.json results.json
+"""
+
+import argparse
+import json
+import platform
+import statistics
+import time
+import tracemalloc
+from dataclasses import asdict, dataclass
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Final, Iterable, List, Optional, Sequence, Tuple, Union
+
+from sqlalchemy import Engine
+from sqlalchemy.orm import Session
+
+from datagen import BankDataGenerator, ScaleSpec, write_database
+from db import get_engine, sqlite_engine
+from model import Base
+
+from .cases import CASES, QueryCase, Variant
+
+DEFAULT_REPEAT: Final[int] = 20
+"""Number of timed runs per variant"""
+
+DEFAULT_TOLERANCE: Final[float] = 0.2
+"""Relative slowdown of the median tolerated by compare"""
+
+
+@dataclass(frozen=True)
+class BenchmarkResult:
+    """Timings of a single variant on a single database"""
+
+    backend: str
+    """Dialect name of the database"""
+
+    scale: float
+    """Scale factor of the generated data"""
+
+    case: str
+    """Name of the case"""
+
+    variant: str
+    """Name of the variant"""
+
+    repeat: int
+    """Number of timed runs"""
+
+    rows: int
+    """Rows pulled from the database by one run"""
+
+    p50_ms: float
+    """Median latency"""
+
+    p95_ms: float
+    """95th percentile latency"""
+
+    p99_ms: float
+    """99th percentile latency"""
+
+    mean_ms: float
+    """Mean latency"""
+
+    peak_kib: float
+    """Peak Python memory allocated by one run"""
+
+    @property
+    def key(self) -> Tuple[str, float, str, str]:
+        """Key matching the same measurement across result files"""
+        return self.backend, self.scale, self.case, self.variant
+
+
+def percentile(samples: Sequence[float], fraction: float) -> float:
+    """Percentile of samples by linear interpolation
+
+    :param samples: Non-empty samples
+    :param fraction: Percentile between 0 and 1
+    :return: Interpolated percentile
+    """
+    ordered = sorted(samples)
+    position = (len(ordered) - 1) * fraction
+    lower = int(position)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+
+
+def prepare_sqlite(directory: Union[str, Path], scale: float, seed: int = 0) -> Engine:
+    """Engine of a SQLite database holding the generated data at a scale
+
+    The database file is generated once and reused by later runs.
+
+    :param directory: Directory of the database files
+    :param scale: Scale factor
+    :param seed: Seed of the generated data
+    :return: Engine of the database
+    """
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+    path = directory / ("bank_sf%s_seed%d.db" % (scale, seed))
+    if not path.exists():
+        partial = path.with_suffix(".partial")
+        partial.unlink(missing_ok=True)
+        engine = sqlite_engine(str(partial))
+        Base.metadata.create_all(engine)
+        write_database(
+            engine, BankDataGenerator(ScaleSpec.from_scale_factor(scale), seed)
+        )
+        engine.dispose()
+        partial.rename(path)
+    return sqlite_engine(str(path))
+
+
+def prepare_database(url: str, scale: float, seed: int = 0) -> Engine:
+    """Engine of a database reloaded with the generated data at a scale
+
+    All tables of the model are dropped and recreated.
+
+    :param url: Database URL, e.g. of a MySQL stand-in
+    :param scale: Scale factor
+    :param seed: Seed of the generated data
+    :return: Engine of the database
+    """
+    engine = get_engine(url)
+    Base.metadata.drop_all(engine)
+    Base.metadata.create_all(engine)
+    write_database(engine, BankDataGenerator(ScaleSpec.from_scale_factor(scale), seed))
+    return engine
+
+
+def time_variant(
+    engine: Engine, variant: Variant, repeat: int
+) -> Tuple[List[float], int]:
+    """Time the runs of a variant, each in a new session, after one warm-up run
+
+    :param engine: Database engine
+    :param variant: Variant to run
+    :param repeat: Number of timed runs
+    :return: Latencies in milliseconds, rows pulled by one run
+    """
+    with Session(engine) as session:
+        rows = variant(session)
+    samples: List[float] = []
+    for _ in range(repeat):
+        with Session(engine) as session:
+            start = time.perf_counter()
+            variant(session)
+            samples.append((time.perf_counter() - start) * 1_000)
+    return samples, rows
+
+
+def peak_memory(engine: Engine, variant: Variant) -> int:
+    """Peak Python memory allocated by one run of a variant
+
+    :param engine: Database engine
+    :param variant: Variant to run
+    :return: Peak allocation in bytes
+    """
+    tracemalloc.start()
+    try:
+        with Session(engine) as session:
+            variant(session)
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def run(
+    engines: Iterable[Tuple[float, Engine]],
+    cases: Iterable[QueryCase] = CASES,
+    repeat: int = DEFAULT_REPEAT,
+    only: Optional[Sequence[str]] = None,
+) -> List[BenchmarkResult]:
+    """Run every variant of the cases on every database
+
+    :param engines: Scale factor and engine of each database
+    :param cases: Cases to run
+    :param repeat: Number of timed runs per variant
+    :param only: Names of the cases to run, all if None
+    :return: One result per database, case and variant
+    """
+    cases = [case for case in cases if only is None or case.name in only]
+    results: List[BenchmarkResult] = []
+    for scale, engine in engines:
+        for case in cases:
+            for name, variant in case.variants.items():
+                samples, rows = time_variant(engine, variant, repeat)
+                results.append(
+                    BenchmarkResult(
+                        backend=engine.dialect.name,
+                        scale=scale,
+                        case=case.name,
+                        variant=name,
+                        repeat=repeat,
+                        rows=rows,
+                        p50_ms=percentile(samples, 0.50),
+                        p95_ms=percentile(samples, 0.95),
+                        p99_ms=percentile(samples, 0.99),
+                        mean_ms=statistics.fmean(samples),
+                        peak_kib=peak_memory(engine, variant) / 1024,
+                    )
+                )
+    return results
+
+
+def save(results: Iterable[BenchmarkResult], path: Union[str, Path]) -> None:
+    """Store results as JSON, with the environment they were measured in
+
+    :param results: Benchmark results
+    :param path: Output file
+    :return: None
+    """
+    document = {
+        "created": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "results": [asdict(result) for result in results],
+    }
+    Path(path).write_text(json.dumps(document, indent=2) + "\n")
+
+
+def load(path: Union[str, Path]) -> List[BenchmarkResult]:
+    """Read results stored by save
+
+    :param path: Result file
+    :return: Benchmark results
+    """
+    document = json.loads(Path(path).read_text())
+    return [BenchmarkResult(**result) for result in document["results"]]
+
+
+def compare(
+    baseline: Iterable[BenchmarkResult],
+    current: Iterable[BenchmarkResult],
+    tolerance: float = DEFAULT_TOLERANCE,
+) -> List[str]:
+    """Find the measurements whose median latency regressed
+
+    :param baseline: Reference results
+    :param current: New results
+    :param tolerance: Relative slowdown tolerated, 0.2 is 20%
+    :return: One description per regression
+    """
+    reference: Dict[tuple, BenchmarkResult] = {
+        result.key: result for result in baseline
+    }
+    regressions: List[str] = []
+    for result in current:
+        before = reference.get(result.key)
+        if before is None or before.p50_ms <= 0:
+            continue
+        ratio = result.p50_ms / before.p50_ms
+        if ratio > 1 + tolerance:
+            regressions.append(
+                "%s sf=%s %s[%s]: p50 %.2f ms -> %.2f ms (x%.2f)"
+                % (*result.key, before.p50_ms, result.p50_ms, ratio)
+            )
+    return regressions
+
+
+def format_table(results: Iterable[BenchmarkResult]) -> str:
+    """Format results as a fixed width text table
+
+    :param results: Benchmark results
+    :return: Table text
+    """
+    lines = [
+        "%-8s %6s %-34s %-10s %9s %10s %10s %10s %12s"
+        % (
+            "backend",
+            "scale",
+            "case",
+            "variant",
+            "rows",
+            "p50_ms",
+            "p95_ms",
+            "p99_ms",
+            "peak_kib",
+        )
+    ]
+    for result in results:
+        lines.append(
+            "%-8s %6s %-34s %-10s %9d %10.2f %10.2f %10.2f %12.1f"
+            % (
+                result.backend,
+                result.scale,
+                result.case,
+                result.variant,
+                result.rows,
+                result.p50_ms,
+                result.p95_ms,
+                result.p99_ms,
+                result.peak_kib,
+            )
+        )
+    return "\n".join(lines)
+
+
+def main() -> None:
+    """Run or compare benchmarks from the command line"""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--scale", type=float, action="append", help="Scale factor, repeatable"
+    )
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the data")
+    parser.add_argument("--repeat", type=int, default=DEFAULT_REPEAT)
+    parser.add_argument("--case", action="append", help="Case to run, repeatable")
+    parser.add_argument(
+        "--data-dir", default=".benchmarks", help="Directory of the SQLite databases"
+    )
+    parser.add_argument(
+        "--url",
+        action="append",
+        default=[],
+        help="Extra database to reload and benchmark, e.g. a MySQL stand-in",
+    )
+    parser.add_argument("--output", help="JSON file of the results")
+    parser.add_argument(
+        "--compare", nargs=2, metavar=("BASELINE", "CURRENT"), help="Compare results"
+    )
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE)
+    args = parser.parse_args()
+
+    if args.compare is not None:
+        regressions = compare(
+            load(args.compare[0]), load(args.compare[1]), args.tolerance
+        )
+        print("\n".join(regressions) if regressions else "No regressions")
+        raise SystemExit(1 if regressions else 0)
+
+    results: List[BenchmarkResult] = []
+    for scale in args.scale or [0.1]:
+        engine = prepare_sqlite(args.data_dir, scale, args.seed)
+        results += run([(scale, engine)], repeat=args.repeat, only=args.case)
+        for url in args.url:
+            # Reloaded per scale, so it is benchmarked before the next reload
+            engine = prepare_database(url, scale, args.seed)
+            results += run([(scale, engine)], repeat=args.repeat, only=args.case)
+    print(format_table(results))
+    if args.output is not None:
+        save(results, args.output)
+
+
+if __name__ == "__main__":
+    main()
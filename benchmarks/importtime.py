@@ -0,0 +1,122 @@
+"""Benchmark of the import time of the model package
+
+Runs each import in a fresh interpreter with ``-X importtime`` and reports the
+median total import time and the number of imported modules. Exits with
+status 1 when an import pulls in a module it must not, or when the lazy
+imports stop being cheaper than importing the mapped classes::
+
+    python -m benchmarks.importtime --repeat 5
+"""
+
+import argparse
+import re
+import statistics
+import subprocess
+import sys
+from typing import Dict, Final, List, Sequence, Tuple
+
+TARGETS: Final[Dict[str, str]] = {
+    "enums": "from model import TransactionTypeEnum",
+    "package": "import model",
+    "mapped": "from model import Account",
+    "configured": "import model; model.configure()",
+}
+"""Code of each measured import, keyed by name"""
+
+FORBIDDEN: Final[Dict[str, Tuple[str, ...]]] = {
+    "enums": ("sqlalchemy",),
+    "package": ("sqlalchemy",),
+}
+"""Packages an import must not load, keyed by target name"""
+
+MAX_LAZY_RATIO: Final[float] = 0.5
+"""Largest import time of the lazy targets relative to the mapped one"""
+
+_LINE: Final[re.Pattern] = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \| (\s*)(\S+)")
+"""Line of the -X importtime output: self, cumulative, nesting and module"""
+
+
+def measure(code: str) -> Tuple[float, List[str]]:
+    """Import time of some code in a fresh interpreter
+
+    :param code: Python code to run
+    :return: Total import time in milliseconds, imported modules
+    """
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    total = 0
+    modules: List[str] = []
+    for line in completed.stderr.splitlines():
+        match = _LINE.match(line)
+        if match is not None:
+            total += int(match.group(1))
+            modules.append(match.group(4))
+    return total / 1_000, modules
+
+
+def violations(
+    medians: Dict[str, float], modules: Dict[str, Sequence[str]]
+) -> List[str]:
+    """Regressions of the measured imports
+
+    :param medians: Median import time of each target in milliseconds
+    :param modules: Imported modules of each target
+    :return: Description of each regression, empty if none
+    """
+    found: List[str] = []
+    for name, packages in FORBIDDEN.items():
+        for package in packages:
+            loaded = [
+                module
+                for module in modules.get(name, ())
+                if module == package or module.startswith(package + ".")
+            ]
+            if loaded:
+                found.append("%s imports %s" % (name, loaded[0]))
+    mapped = medians.get("mapped")
+    if mapped:
+        for name in FORBIDDEN:
+            if name in medians and medians[name] > mapped * MAX_LAZY_RATIO:
+                found.append(
+                    "%s takes %.1f ms, more than %.0f%% of mapped %.1f ms"
+                    % (name, medians[name], MAX_LAZY_RATIO * 100, mapped)
+                )
+    return found
+
+
+def main() -> None:
+    """Run the benchmark from the command line"""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument(
+        "--target", action="append", choices=sorted(TARGETS), help="Default all"
+    )
+    args = parser.parse_args()
+
+    medians: Dict[str, float] = {}
+    modules: Dict[str, Sequence[str]] = {}
+    print("%-11s %9s %9s %8s" % ("target", "p50_ms", "min_ms", "modules"))
+    for name in args.target or TARGETS:
+        samples: List[float] = []
+        for _ in range(args.repeat):
+            milliseconds, modules[name] = measure(TARGETS[name])
+            samples.append(milliseconds)
+        medians[name] = statistics.median(samples)
+        print(
+            "%-11s %9.1f %9.1f %8d"
+            % (name, medians[name], min(samples), len(modules[name]))
+        )
+
+    found = violations(medians, modules)
+    for violation in found:
+        print("REGRESSION: %s" % violation)
+    if found:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,160 @@
+"""Benchmark of polymorphic customer loading against per-type queries
+
+Builds the display name of every customer three ways: one query per customer
+type stitched together in Python, the subclass columns lazily loaded row by
+row, and a single with_polymorphic select. Reports the latency and the number
+of statements of each, and exits with status 1 if their names differ::
+
+    python -m benchmarks.polymorphic --scale 1 --repeat 5
+"""
+
+import argparse
+import statistics
+import sys
+import time
+from typing import Callable, Dict, List, Tuple
+
+from sqlalchemy import Engine, event, select
+from sqlalchemy.orm import Session
+
+from model import Business, Customer, CustomerTypeEnum, Individual, PolymorphicCustomer
+
+from .harness import percentile, prepare_sqlite
+
+Names = List[Tuple[int, str]]
+"""Customer IDs with their display name, in ID order"""
+
+
+def per_type(session: Session) -> Names:
+    """Customers, individuals and businesses read apart and joined in Python
+
+    :param session: Open session
+    :return: Display names
+    """
+    individual = Individual.__table__
+    business = Business.__table__
+    customers = session.execute(
+        select(Customer.cust_id, Customer.cust_type_cd, Customer.fed_id)
+    ).all()
+    individuals = {
+        cust_id: "%s %s" % (fname, lname)
+        for cust_id, fname, lname in session.execute(
+            select(individual.c.cust_id, individual.c.fname, individual.c.lname)
+        )
+    }
+    businesses = dict(
+        session.execute(select(business.c.cust_id, business.c.name)).all()
+    )
+    names = {
+        CustomerTypeEnum.I: individuals,
+        CustomerTypeEnum.B: businesses,
+    }
+    return sorted(
+        (cust_id, names[cust_type_cd].get(cust_id, fed_id))
+        for cust_id, cust_type_cd, fed_id in customers
+    )
+
+
+def per_row(session: Session) -> Names:
+    """Customers loaded as their subclass, whose columns load on first access
+
+    :param session: Open session
+    :return: Display names
+    """
+    return sorted(
+        (customer.cust_id, customer.display_name)
+        for customer in session.scalars(select(Customer))
+    )
+
+
+def polymorphic(session: Session) -> Names:
+    """Customers and their subclass columns in a single statement
+
+    :param session: Open session
+    :return: Display names
+    """
+    return sorted(
+        (customer.cust_id, customer.display_name)
+        for customer in session.scalars(select(PolymorphicCustomer))
+    )
+
+
+PATHS: Dict[str, Callable[[Session], Names]] = {
+    "per_type": per_type,
+    "per_row": per_row,
+    "polymorphic": polymorphic,
+}
+"""Ways to load the display names, keyed by name"""
+
+
+def measure(
+    engine: Engine, load: Callable[[Session], Names], repeat: int
+) -> Tuple[List[float], int, Names]:
+    """Latencies and statement count of a way to load the names
+
+    :param engine: Database engine
+    :param load: Way to load the names
+    :param repeat: Number of timed runs
+    :return: Latencies in milliseconds, statements per run, names
+    """
+    statements = []
+
+    def count(*args) -> None:
+        statements.append(None)
+
+    samples: List[float] = []
+    names: Names = []
+    event.listen(engine, "before_cursor_execute", count)
+    try:
+        for _ in range(repeat):
+            statements.clear()
+            with Session(engine) as session:
+                start = time.perf_counter()
+                names = load(session)
+                samples.append((time.perf_counter() - start) * 1_000)
+    finally:
+        event.remove(engine, "before_cursor_execute", count)
+    return samples, len(statements), names
+
+
+def main() -> None:
+    """Run the benchmark from the command line"""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--scale", type=float, default=0.1, help="Scale factor")
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the data")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument(
+        "--data-dir", default=".benchmarks", help="Directory of the SQLite databases"
+    )
+    args = parser.parse_args()
+
+    engine = prepare_sqlite(args.data_dir, args.scale, args.seed)
+    print(
+        "%-12s %9s %10s %10s %11s"
+        % ("path", "customers", "p50_ms", "mean_ms", "statements")
+    )
+    expected = None
+    mismatches: List[str] = []
+    for name, load in PATHS.items():
+        samples, statements, names = measure(engine, load, args.repeat)
+        print(
+            "%-12s %9d %10.2f %10.2f %11d"
+            % (
+                name,
+                len(names),
+                percentile(samples, 0.50),
+                statistics.fmean(samples),
+                statements,
+            )
+        )
+        if expected is None:
+            expected = names
+        elif names != expected:
+            mismatches.append(name)
+    if mismatches:
+        print("MISMATCH: %s" % ", ".join(mismatches))
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,147 @@
+"""Benchmark of batched posting against per-row ORM adds
+
+Posts the same random transactions to copies of a generated SQLite database,
+once with posting.post and once adding and flushing one ORM object per
+transaction, and reports the throughput of each::
+
+    python -m benchmarks.posting --scale 1 --postings 20000 --batch-size 5000
+"""
+
+import argparse
+import random
+import shutil
+import tempfile
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Callable, Dict, List
+
+from sqlalchemy import Engine, select
+from sqlalchemy.orm import Session
+
+from db import sqlite_engine
+from model import Account, Transaction, TransactionTypeEnum
+from posting import DEFAULT_BATCH_SIZE, POSTABLE_STATUSES, Posting, post
+
+from .harness import prepare_sqlite
+
+
+def make_postings(engine: Engine, count: int, seed: int) -> List[Posting]:
+    """Random postings to the accounts accepting them
+
+    :param engine: Database engine
+    :param count: Number of postings
+    :param seed: Seed of the postings
+    :return: Postings
+    """
+    with engine.connect() as connection:
+        account_ids = [
+            account_id
+            for account_id, status in connection.execute(
+                select(Account.account_id, Account.status)
+            )
+            if status in POSTABLE_STATUSES
+        ]
+    rng = random.Random(seed)
+    start = datetime(2021, 1, 1)
+    return [
+        Posting(
+            rng.choice(account_ids),
+            rng.choice((TransactionTypeEnum.CDT, TransactionTypeEnum.DBT)),
+            round(rng.lognormvariate(4.5, 1.2), 2),
+            start + timedelta(seconds=index),
+        )
+        for index in range(count)
+    ]
+
+
+def post_orm(engine: Engine, postings: List[Posting], batch_size: int) -> int:
+    """Post with one ORM add and flush per transaction, one commit per batch
+
+    :param engine: Database engine
+    :param postings: Postings
+    :param batch_size: Postings per commit
+    :return: Number of posted transactions
+    """
+    posted = 0
+    with Session(engine) as session:
+        for index, posting in enumerate(postings, 1):
+            account = session.get(Account, posting.account_id)
+            if account is None or account.status not in POSTABLE_STATUSES:
+                continue
+            txn_type = TransactionTypeEnum(posting.txn_type_cd)
+            signed = (
+                posting.amount
+                if txn_type is TransactionTypeEnum.CDT
+                else -posting.amount
+            )
+            session.add(
+                Transaction(
+                    txn_date=posting.txn_date,
+                    account_id=posting.account_id,
+                    txn_type_cd=txn_type,
+                    amount=posting.amount,
+                    funds_avail_date=posting.txn_date,
+                )
+            )
+            account.avail_balance = (account.avail_balance or 0) + signed
+            account.pending_balance = (account.pending_balance or 0) + signed
+            account.last_activity_date = posting.txn_date.date()
+            session.flush()
+            posted += 1
+            if index % batch_size == 0:
+                session.commit()
+        session.commit()
+    return posted
+
+
+def post_batched(engine: Engine, postings: List[Posting], batch_size: int) -> int:
+    """Post with posting.post
+
+    :param engine: Database engine
+    :param postings: Postings
+    :param batch_size: Postings per transaction
+    :return: Number of posted transactions
+    """
+    return post(engine, postings, batch_size, now=datetime(2030, 1, 1)).posted
+
+
+PATHS: Dict[str, Callable[[Engine, List[Posting], int], int]] = {
+    "orm": post_orm,
+    "batched": post_batched,
+}
+"""Ways to post, keyed by name"""
+
+
+def main() -> None:
+    """Run the benchmark from the command line"""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--scale", type=float, default=0.1, help="Scale factor")
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the data")
+    parser.add_argument("--postings", type=int, default=20_000)
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+    parser.add_argument(
+        "--data-dir", default=".benchmarks", help="Directory of the SQLite databases"
+    )
+    args = parser.parse_args()
+
+    source = prepare_sqlite(args.data_dir, args.scale, args.seed)
+    postings = make_postings(source, args.postings, args.seed)
+    print("%-8s %9s %10s %12s" % ("path", "posted", "seconds", "rows_per_s"))
+    with tempfile.TemporaryDirectory() as directory:
+        for name, run in PATHS.items():
+            path = Path(directory) / ("%s.db" % name)
+            shutil.copyfile(source.url.database, path)
+            engine = sqlite_engine(str(path))
+            start = time.perf_counter()
+            posted = run(engine, postings, args.batch_size)
+            seconds = time.perf_counter() - start
+            engine.dispose()
+            print(
+                "%-8s %9d %10.3f %12.0f"
+                % (name, posted, seconds, posted / seconds if seconds else 0.0)
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+"""Benchmark of row views against ORM instances on full table reads
+
+Loads every row of a table as ORM instances and as rowviews views, and
+reports the latency and the Python memory held by the loaded rows::
+
+    python -m benchmarks.rowviews --scale 1 --repeat 5 --table transaction
+"""
+
+import argparse
+import gc
+import statistics
+import time
+import tracemalloc
+from typing import Callable, Dict, List, Sequence, Tuple, Type
+
+from sqlalchemy import Engine, select
+from sqlalchemy.orm import Session
+
+from model import Base
+from rowviews import fetch_views
+
+from .harness import percentile, prepare_sqlite
+
+
+def load_orm(engine: Engine, model: Type[Base]) -> Tuple[Session, Sequence]:
+    """All rows of a table as ORM instances
+
+    :param engine: Database engine
+    :param model: Model class
+    :return: Open session holding the instances, and the instances
+    """
+    session = Session(engine)
+    return session, session.scalars(select(model)).all()
+
+
+def load_views(engine: Engine, model: Type[Base]) -> Tuple[None, Sequence]:
+    """All rows of a table as row views
+
+    :param engine: Database engine
+    :param model: Model class
+    :return: No session, and the views
+    """
+    return None, fetch_views(engine, model)
+
+
+Loader = Callable[[Engine, Type[Base]], Tuple[object, Sequence]]
+"""A way to load all rows of a table, returning the session holding them"""
+
+PATHS: Dict[str, Loader] = {
+    "orm": load_orm,
+    "views": load_views,
+}
+"""Ways to load the rows, keyed by name"""
+
+
+def measure(
+    engine: Engine, model: Type[Base], load: Loader, repeat: int
+) -> Tuple[List[float], int, int]:
+    """Latencies and held memory of a way to load the rows
+
+    :param engine: Database engine
+    :param model: Model class
+    :param load: Way to load the rows
+    :param repeat: Number of timed runs
+    :return: Latencies in milliseconds, number of rows, bytes held by the rows
+    """
+    samples: List[float] = []
+    for _ in range(repeat):
+        gc.collect()
+        start = time.perf_counter()
+        session, rows = load(engine, model)
+        samples.append((time.perf_counter() - start) * 1_000)
+        if session is not None:
+            session.close()
+    gc.collect()
+    tracemalloc.start()
+    try:
+        session, rows = load(engine, model)
+        gc.collect()
+        held = tracemalloc.get_traced_memory()[0]
+    finally:
+        tracemalloc.stop()
+    if session is not None:
+        session.close()
+    return samples, len(rows), held
+
+
+def main() -> None:
+    """Run the benchmark from the command line"""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--scale", type=float, default=0.1, help="Scale factor")
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the data")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--table", default="transaction", help="Table to read")
+    parser.add_argument(
+        "--data-dir", default=".benchmarks", help="Directory of the SQLite databases"
+    )
+    args = parser.parse_args()
+
+    engine = prepare_sqlite(args.data_dir, args.scale, args.seed)
+    model = next(
+        mapper.class_
+        for mapper in Base.registry.mappers
+        if mapper.local_table.name == args.table
+    )
+
+    print(
+        "%-6s %9s %10s %10s %10s %12s"
+        % ("path", "rows", "p50_ms", "mean_ms", "held_kib", "bytes_per_row")
+    )
+    for name, load in PATHS.items():
+        samples, rows, held = measure(engine, model, load, args.repeat)
+        print(
+            "%-6s %9d %10.2f %10.2f %10.1f %12.1f"
+            % (
+                name,
+                rows,
+                percentile(samples, 0.50),
+                statistics.fmean(samples),
+                held / 1024,
+                held / rows if rows else 0.0,
+            )
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,475 @@
+"""Result cache for queries on slow-changing tables
+
+Branch lists, product catalogs and head counts are read over and over while
+their tables hardly ever change. ResultCache keeps the results of raw SQL
+strings and ``select()`` statements, keyed on the database, the compiled SQL and
+its bound parameters::
+
+    cache = ResultCache(ttl=600)
+    cache.watch(Session)
+    branches = cache.read_sql("SELECT * FROM branch", engine)
+    products = cache.execute(session, select(Product.product_cd, Product.name))
+
+Entries are evicted least recently used first, once the entry count or the
+memory budget is exceeded, and expire after their time to live. ORM flushes
+of watched sessions drop the entries reading the tables they write to, and
+until the end of their transaction these sessions read the written tables
+uncached. A result read while one of its tables was invalidated is not
+stored, as it may predate the write.
+"""
+
+import re
+import sys
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, replace
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    FrozenSet,
+    Final,
+    Iterable,
+    List,
+    Mapping,
+    Optional,
+    Tuple,
+    Union,
+)
+
+import pandas as pd
+from sqlalchemy import Connection, Engine, Row, Table, event, inspect, text
+from sqlalchemy.orm import Session, sessionmaker
+from sqlalchemy.sql import Executable
+from sqlalchemy.sql.visitors import iterate
+
+from model import Base
+
+DEFAULT_MAX_ENTRIES: Final[int] = 1024
+"""Maximum number of cached results"""
+
+DEFAULT_TTL: Final[float] = 300.0
+"""Seconds a result stays valid"""
+
+DEFAULT_MAX_BYTES: Final[int] = 64 * 1024 * 1024
+"""Memory budget of all cached results"""
+
+_PENDING_KEY: Final[str] = "result_cache_tables"
+"""Session.info key of the tables written by the current transaction"""
+
+Query = Union[str, Executable]
+"""Raw SQL text or a select statement"""
+
+Connectable = Union[Engine, Connection, Session]
+"""Where the query runs, a Session runs it in its current transaction"""
+
+
+@dataclass
+class CacheStats:
+    """Counters of a result cache"""
+
+    hits: int = 0
+    """Lookups answered from the cache"""
+
+    misses: int = 0
+    """Lookups that ran the query"""
+
+    evictions: int = 0
+    """Entries dropped for the entry count or memory budget"""
+
+    expirations: int = 0
+    """Entries dropped after their time to live"""
+
+    invalidations: int = 0
+    """Entries dropped because one of their tables was written to"""
+
+    bypasses: int = 0
+    """Queries run uncached in a session with uncommitted writes to their tables"""
+
+    @property
+    def hit_ratio(self) -> float:
+        """Share of the lookups answered from the cache"""
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+
+@dataclass(frozen=True)
+class _Entry:
+    """A cached result"""
+
+    value: Any
+    """DataFrame or list of rows"""
+
+    tables: FrozenSet[str]
+    """Tables the query reads"""
+
+    nbytes: int
+    """Estimated memory used by the value"""
+
+    expires: float
+    """Monotonic time after which the entry is stale"""
+
+
+def _connection_call(connectable: Connectable, run: Callable[[Connection], Any]):
+    """Call a function with a connection of the connectable
+
+    :param connectable: Engine, connection or session
+    :param run: Function of the connection
+    :return: Return value of the function
+    """
+    if isinstance(connectable, Engine):
+        with connectable.connect() as connection:
+            return run(connection)
+    if isinstance(connectable, Session):
+        return run(connectable.connection())
+    return run(connectable)
+
+
+def _engine(connectable: Connectable) -> Engine:
+    """Engine of an engine, connection or session"""
+    if isinstance(connectable, Session):
+        connectable = connectable.get_bind()
+    return connectable.engine if isinstance(connectable, Connection) else connectable
+
+
+def statement_tables(query: Query) -> FrozenSet[str]:
+    """Names of the model tables a query reads
+
+    Raw SQL is matched word by word against the table names of the model.
+
+    :param query: Raw SQL text or select statement
+    :return: Table names
+    """
+    if isinstance(query, str):
+        words = set(re.findall(r"\w+", query.lower()))
+        return frozenset(name for name in Base.metadata.tables if name in words)
+    return frozenset(
+        element.name for element in iterate(query) if isinstance(element, Table)
+    )
+
+
+def _nbytes(value: Any) -> int:
+    """Estimated memory used by a DataFrame or a list of rows"""
+    if isinstance(value, pd.DataFrame):
+        return int(value.memory_usage(deep=True).sum())
+    return sys.getsizeof(value) + sum(
+        sys.getsizeof(row) + sum(sys.getsizeof(item) for item in row) for row in value
+    )
+
+
+class ResultCache:
+    """LRU and TTL cache of query results, invalidated by table"""
+
+    def __init__(
+        self,
+        max_entries: int = DEFAULT_MAX_ENTRIES,
+        ttl: float = DEFAULT_TTL,
+        max_bytes: int = DEFAULT_MAX_BYTES,
+    ) -> None:
+        """Create an empty cache
+
+        :param max_entries: Maximum number of cached results
+        :param ttl: Seconds a result stays valid
+        :param max_bytes: Memory budget of all cached results
+        """
+        self.max_entries: Final[int] = max_entries
+        """Maximum number of cached results"""
+
+        self.ttl: Final[float] = ttl
+        """Seconds a result stays valid"""
+
+        self.max_bytes: Final[int] = max_bytes
+        """Memory budget of all cached results"""
+
+        self._entries: "OrderedDict[Tuple, _Entry]" = OrderedDict()
+        self._versions: Dict[str, int] = {}
+        self._nbytes: int = 0
+        self._stats: CacheStats = CacheStats()
+        self._lock: threading.Lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @property
+    def nbytes(self) -> int:
+        """Estimated memory used by the cached results"""
+        return self._nbytes
+
+    def stats(self) -> CacheStats:
+        """A consistent copy of the counters
+
+        :return: Copy of the counters
+        """
+        with self._lock:
+            return replace(self._stats)
+
+    def _key(
+        self,
+        engine: Engine,
+        query: Query,
+        params: Optional[Mapping[str, Any]],
+        kind: str,
+    ) -> Tuple:
+        """Cache key of a query on a database
+
+        :param engine: Engine the query runs on
+        :param query: Raw SQL text or select statement
+        :param params: Bound parameters of the query
+        :param kind: Shape of the result, "dataframe" or "rows"
+        :return: Key
+        """
+        if isinstance(query, str):
+            sql, bound = query, dict(params or {})
+        else:
+            compiled = query.compile(dialect=engine.dialect)
+            sql, bound = str(compiled), {**compiled.params, **(params or {})}
+        return (
+            kind,
+            engine.url.render_as_string(hide_password=True),
+            sql,
+            repr(sorted(bound.items())),
+        )
+
+    def _drop(self, key: Tuple, counter: str) -> None:
+        """Remove an entry, the lock being held
+
+        :param key: Key of the entry
+        :param counter: Name of the counter to increment
+        :return: None
+        """
+        entry = self._entries.pop(key)
+        self._nbytes -= entry.nbytes
+        setattr(self._stats, counter, getattr(self._stats, counter) + 1)
+
+    def _lookup(self, key: Tuple) -> Optional[_Entry]:
+        """Fresh entry of a key, counting the hit or miss
+
+        :param key: Cache key
+        :return: Entry, None on a miss
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry.expires <= time.monotonic():
+                self._drop(key, "expirations")
+                entry = None
+            if entry is None:
+                self._stats.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self._stats.hits += 1
+            return entry
+
+    def _version(self, tables: FrozenSet[str]) -> Tuple[int, ...]:
+        """Versions of tables, bumped by every invalidation of the table
+
+        :param tables: Table names
+        :return: Versions, in table name order
+        """
+        return tuple(self._versions.get(table, 0) for table in sorted(tables))
+
+    def _store(
+        self,
+        key: Tuple,
+        value: Any,
+        tables: FrozenSet[str],
+        version: Tuple[int, ...],
+    ) -> None:
+        """Cache a result, evicting the least recently used entries over budget
+
+        A result larger than the whole budget is not cached, nor a result read
+        while one of its tables was invalidated, which may predate the write.
+
+        :param key: Cache key
+        :param value: Result
+        :param tables: Tables the query reads
+        :param version: Versions of the tables before the query ran
+        :return: None
+        """
+        nbytes = _nbytes(value)
+        if nbytes > self.max_bytes:
+            return
+        with self._lock:
+            if self._version(tables) != version:
+                return
+            if key in self._entries:
+                self._drop(key, "evictions")
+            self._entries[key] = _Entry(
+                value, tables, nbytes, time.monotonic() + self.ttl
+            )
+            self._nbytes += nbytes
+            while (
+                len(self._entries) > self.max_entries or self._nbytes > self.max_bytes
+            ):
+                self._drop(next(iter(self._entries)), "evictions")
+
+    def _bypass(self, con: Connectable, tables: FrozenSet[str]) -> bool:
+        """Whether a query runs uncached, in a session that wrote to its tables
+
+        The session sees its own uncommitted writes, which must neither be
+        served to other sessions nor be hidden by committed cached results.
+
+        :param con: Engine, connection or session
+        :param tables: Tables the query reads
+        :return: True if the cache is bypassed
+        """
+        if not isinstance(con, Session) or not (
+            con.info.get(_PENDING_KEY, set()) & tables
+        ):
+            return False
+        with self._lock:
+            self._stats.bypasses += 1
+        return True
+
+    def read_sql(
+        self,
+        query: Query,
+        con: Connectable,
+        params: Optional[Mapping[str, Any]] = None,
+        tables: Optional[Iterable[str]] = None,
+    ) -> pd.DataFrame:
+        """Cached pd.read_sql_query
+
+        :param query: Raw SQL text or select statement
+        :param con: Engine, connection or session
+        :param params: Bound parameters of the query
+        :param tables: Tables the query reads, found from the query if None
+        :return: Copy of the cached DataFrame
+        """
+        tables = frozenset(tables) if tables is not None else statement_tables(query)
+        sql = text(query) if isinstance(query, str) else query
+        if self._bypass(con, tables):
+            return _connection_call(
+                con,
+                lambda connection: pd.read_sql_query(sql, connection, params=params),
+            )
+        key = self._key(_engine(con), query, params, "dataframe")
+        entry = self._lookup(key)
+        if entry is not None:
+            return entry.value.copy()
+        version = self._version(tables)
+        frame = _connection_call(
+            con, lambda connection: pd.read_sql_query(sql, connection, params=params)
+        )
+        self._store(key, frame, tables, version)
+        return frame.copy()
+
+    def execute(
+        self,
+        con: Connectable,
+        query: Query,
+        params: Optional[Mapping[str, Any]] = None,
+        tables: Optional[Iterable[str]] = None,
+    ) -> List[Row]:
+        """Cached execution of a query returning its rows
+
+        Queries always run on the Core connection, a select of a model class
+        returns the rows of its columns rather than ORM objects.
+
+        :param con: Engine, connection or session
+        :param query: Raw SQL text or select statement
+        :param params: Bound parameters of the query
+        :param tables: Tables the query reads, found from the query if None
+        :return: Result rows
+        """
+        tables = frozenset(tables) if tables is not None else statement_tables(query)
+        statement = text(query) if isinstance(query, str) else query
+        if self._bypass(con, tables):
+            return _connection_call(
+                con,
+                lambda connection: connection.execute(statement, params or {}).all(),
+            )
+        key = self._key(_engine(con), query, params, "rows")
+        entry = self._lookup(key)
+        if entry is not None:
+            return list(entry.value)
+        version = self._version(tables)
+        rows = _connection_call(
+            con, lambda connection: connection.execute(statement, params or {}).all()
+        )
+        self._store(key, rows, tables, version)
+        return list(rows)
+
+    def invalidate(self, *tables: str) -> int:
+        """Bump the version of tables and drop the entries reading any of them
+
+        :param tables: Table names
+        :return: Number of entries dropped
+        """
+        written = set(tables)
+        with self._lock:
+            for table in written:
+                self._versions[table] = self._versions.get(table, 0) + 1
+            keys = [
+                key for key, entry in self._entries.items() if entry.tables & written
+            ]
+            for key in keys:
+                self._drop(key, "invalidations")
+        return len(keys)
+
+    def clear(self) -> None:
+        """Drop every entry, the counters are kept
+
+        :return: None
+        """
+        with self._lock:
+            self._entries.clear()
+            self._nbytes = 0
+
+    def _after_flush(self, session: Session, flush_context) -> None:
+        written = {
+            table.name
+            for instance in (*session.new, *session.dirty, *session.deleted)
+            for table in inspect(instance).mapper.tables
+        }
+        self._written(session, written)
+
+    def _do_orm_execute(self, orm_execute_state) -> None:
+        if (
+            orm_execute_state.is_insert
+            or orm_execute_state.is_update
+            or (orm_execute_state.is_delete)
+        ):
+            self._written(
+                orm_execute_state.session,
+                statement_tables(orm_execute_state.statement),
+            )
+
+    def _written(self, session: Session, tables: Iterable[str]) -> None:
+        """Invalidate tables now and again when the transaction ends
+
+        Entries cached from the uncommitted data of the transaction are dropped
+        by the second invalidation.
+
+        :param session: Session writing to the tables
+        :param tables: Table names
+        :return: None
+        """
+        tables = set(tables)
+        session.info.setdefault(_PENDING_KEY, set()).update(tables)
+        self.invalidate(*tables)
+
+    def _end_transaction(self, session: Session) -> None:
+        self.invalidate(*session.info.pop(_PENDING_KEY, ()))
+
+    def watch(self, target: Union[Session, sessionmaker, type]) -> None:
+        """Invalidate the cache on the writes of sessions
+
+        :param target: Session, sessionmaker, or Session class for all sessions
+        :return: None
+        """
+        event.listen(target, "after_flush", self._after_flush)
+        event.listen(target, "do_orm_execute", self._do_orm_execute)
+        event.listen(target, "after_commit", self._end_transaction)
+        event.listen(target, "after_rollback", self._end_transaction)
+
+    def unwatch(self, target: Union[Session, sessionmaker, type]) -> None:
+        """Stop invalidating the cache on the writes of sessions
+
+        :param target: Target previously passed to watch
+        :return: None
+        """
+        event.remove(target, "after_flush", self._after_flush)
+        event.remove(target, "do_orm_execute", self._do_orm_execute)
+        event.remove(target, "after_commit", self._end_transaction)
+        event.remove(target, "after_rollback", self._end_transaction)
@@ -0,0 +1,564 @@
+"""Deterministic synthetic bank data at a configurable scale
+
+Every table is produced as a lazy stream of rows. Rows are generated in chunks
+from a random generator seeded by the seed, the table and the chunk number, so
+the output only depends on the seed and the scale, and memory use stays flat
+however many rows are generated.
+"""
+
+import argparse
+import csv
+import random
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta
+from pathlib import Path
+from typing import Callable, Dict, Final, Iterator, List, Tuple, Union
+
+from sqlalchemy import Engine
+
+from loader import DEFAULT_BATCH_SIZE, Row, TableLoadStats, batched, bulk_load
+from model import Base
+from model.enums import AccountStatusEnum, CustomerTypeEnum, TransactionTypeEnum
+from utils import arrow_schema, plain_value
+
+CHUNK_SIZE: Final[int] = 10_000
+"""Number of rows generated from a single seeded random generator"""
+
+DEPARTMENTS: Final[Tuple[str, ...]] = ("Operations", "Loans", "Administration")
+"""Department names of the example data"""
+
+PRODUCT_TYPES: Final[Tuple[Tuple[str, str], ...]] = (
+    ("ACCOUNT", "Customer Accounts"),
+    ("LOAN", "Individual and Business Loans"),
+    ("INSURANCE", "Insurance Offerings"),
+)
+"""Product type codes and names of the example data"""
+
+PRODUCTS: Final[Tuple[Tuple[str, str, str], ...]] = (
+    ("CHK", "checking account", "ACCOUNT"),
+    ("SAV", "savings account", "ACCOUNT"),
+    ("MM", "money market account", "ACCOUNT"),
+    ("CD", "certificate of deposit", "ACCOUNT"),
+    ("MRT", "home mortgage", "LOAN"),
+    ("AUT", "auto loan", "LOAN"),
+    ("BUS", "business line of credit", "LOAN"),
+    ("SBL", "small business loan", "LOAN"),
+)
+"""Product codes, names and type codes of the example data"""
+
+INDIVIDUAL_PRODUCTS: Final[Tuple[str, ...]] = ("CHK", "SAV", "MM", "CD", "MRT", "AUT")
+"""Products offered to individual customers"""
+
+BUSINESS_PRODUCTS: Final[Tuple[str, ...]] = ("CHK", "BUS", "SBL")
+"""Products offered to business customers"""
+
+FIRST_NAMES: Final[Tuple[str, ...]] = (
+    "James", "Susan", "Frank", "John", "Charles", "Margaret", "Louis", "Richard",
+    "Michael", "Robert", "Helen", "Chris", "Sarah", "Jane", "Paula", "Thomas",
+    "Samantha", "Cindy", "Theresa", "Beth", "Rick", "Paul", "Carl", "Stanley",
+)  # fmt: skip
+"""First names drawn for people"""
+
+LAST_NAMES: Final[Tuple[str, ...]] = (
+    "Hadley", "Tingley", "Tucker", "Hayward", "Frasier", "Young", "Blake",
+    "Farley", "Smith", "Barker", "Tyler", "Hawthorne", "Gooding", "Fleming",
+    "Parker", "Grossman", "Roberts", "Ziegler", "Jameson", "Mason", "Portman",
+    "Markham", "Fowler", "Tulman", "Chilton", "Hardy", "Lutz", "Cheswick",
+)  # fmt: skip
+"""Last names drawn for people"""
+
+CITIES: Final[Tuple[Tuple[str, str, str], ...]] = (
+    ("Lynnfield", "MA", "01940"),
+    ("Woburn", "MA", "01801"),
+    ("Quincy", "MA", "02169"),
+    ("Waltham", "MA", "02451"),
+    ("Salem", "NH", "03079"),
+    ("Wilmington", "MA", "01887"),
+    ("Newton", "MA", "02458"),
+)
+"""Cities, states and postal codes drawn for addresses"""
+
+STREETS: Final[Tuple[str, ...]] = (
+    "Main St", "Maple St", "Mockingbird Ln", "Clearwater Blvd", "Jessup Rd",
+    "Buchanan Ln", "Blaylock Ln", "Admiral Ln", "Freedom Rd", "Industrial Way",
+)  # fmt: skip
+"""Street names drawn for addresses"""
+
+FIRST_DATE: Final[date] = date(2000, 1, 1)
+"""Earliest date of the generated history"""
+
+LAST_DATE: Final[date] = date(2024, 12, 31)
+"""Latest date of the generated history"""
+
+BUSINESS_FRACTION: Final[float] = 0.2
+"""Fraction of customers that are businesses"""
+
+
+@dataclass(frozen=True)
+class ScaleSpec:
+    """Number of rows generated per table"""
+
+    branches: int
+    """Number of branches"""
+
+    employees_per_branch: int
+    """Number of employees assigned to each branch"""
+
+    customers: int
+    """Number of customers, individuals and businesses"""
+
+    accounts: int
+    """Number of accounts"""
+
+    transactions: int
+    """Number of transactions"""
+
+    @classmethod
+    def from_scale_factor(cls, scale_factor: float) -> "ScaleSpec":
+        """Derive the table sizes from a scale factor
+
+        A scale factor of 1 generates 100,000 transactions, 100 generates 10M.
+
+        :param scale_factor: Positive scale factor
+        :return: Table sizes
+        """
+        if scale_factor <= 0:
+            raise ValueError("scale_factor must be positive, got %s" % scale_factor)
+        customers = max(10, int(2_000 * scale_factor))
+        return cls(
+            branches=max(4, int(10 * scale_factor**0.5)),
+            employees_per_branch=5,
+            customers=customers,
+            accounts=int(customers * 2.5),
+            transactions=int(100_000 * scale_factor),
+        )
+
+    @property
+    def employees(self) -> int:
+        """Number of employees, the three executives and the branch staff"""
+        return 3 + self.branches * self.employees_per_branch
+
+    @property
+    def businesses(self) -> int:
+        """Number of business customers"""
+        return int(self.customers * BUSINESS_FRACTION)
+
+
+def _random_date(rng: random.Random, first: date, last: date) -> date:
+    """Draw a date uniformly between two dates, both included
+
+    :param rng: Random generator
+    :param first: Earliest date
+    :param last: Latest date
+    :return: Drawn date
+    """
+    return first + timedelta(days=rng.randint(0, max((last - first).days, 0)))
+
+
+class BankDataGenerator:
+    """Streams of synthetic rows for every table of the model"""
+
+    def __init__(self, scale: ScaleSpec, seed: int = 0) -> None:
+        """Create a generator
+
+        :param scale: Number of rows per table
+        :param seed: Seed of all random draws
+        """
+        self.scale: Final[ScaleSpec] = scale
+        """Number of rows per table"""
+
+        self.seed: Final[int] = seed
+        """Seed of all random draws"""
+
+    def _chunks(self, table: str, count: int) -> Iterator[Tuple[random.Random, range]]:
+        """Split the 1-based ids of a table into seeded chunks
+
+        :param table: Table name, part of the chunk seeds
+        :param count: Number of rows of the table
+        :return: Iterator over a random generator and its ids, per chunk
+        """
+        for chunk, start in enumerate(range(1, count + 1, CHUNK_SIZE)):
+            rng = random.Random("%d:%s:%d" % (self.seed, table, chunk))
+            yield rng, range(start, min(start + CHUNK_SIZE, count + 1))
+
+    def tables(self) -> Dict[str, Callable[[], Iterator[Row]]]:
+        """Row stream factories keyed by table name, in dependency order
+
+        :return: Factories, each returning a new stream of the table rows
+        """
+        factories = {
+            "department": self.departments,
+            "branch": self.branches,
+            "employee": self.employees,
+            "product_type": self.product_types,
+            "product": self.products,
+            "customer": self.customers,
+            "individual": self.individuals,
+            "business": self.businesses,
+            "officer": self.officers,
+            "account": self.accounts,
+            "transaction": self.transactions,
+        }
+        return {
+            table.name: factories[table.name] for table in Base.metadata.sorted_tables
+        }
+
+    def departments(self) -> Iterator[Row]:
+        """Department rows"""
+        for dept_id, name in enumerate(DEPARTMENTS, start=1):
+            yield {"dept_id": dept_id, "name": name}
+
+    def branches(self) -> Iterator[Row]:
+        """Branch rows, the first one is the headquarters"""
+        for rng, ids in self._chunks("branch", self.scale.branches):
+            for branch_id in ids:
+                city, state, zip_code = rng.choice(CITIES)
+                yield {
+                    "branch_id": branch_id,
+                    "name": "Headquarters"
+                    if branch_id == 1
+                    else "%s %d" % (city, branch_id),
+                    "address": "%d %s" % (rng.randint(1, 9999), rng.choice(STREETS)),
+                    "city": city,
+                    "state": state,
+                    "zip": zip_code,
+                }
+
+    def _employee_branch(self, emp_id: int) -> int:
+        """Assigned branch of an employee
+
+        :param emp_id: Employee ID
+        :return: Branch ID, the executives work at the headquarters
+        """
+        if emp_id <= 3:
+            return 1
+        return 1 + (emp_id - 4) // self.scale.employees_per_branch
+
+    def employees(self) -> Iterator[Row]:
+        """Employee rows
+
+        Employees 1 to 3 are the executives. The first employee of each branch
+        reports to the Operations executive, the rest to their branch head.
+        """
+        executives = ("President", "Vice President", "Treasurer")
+        for rng, ids in self._chunks("employee", self.scale.employees):
+            for emp_id in ids:
+                branch_id = self._employee_branch(emp_id)
+                branch_head = 4 + (branch_id - 1) * self.scale.employees_per_branch
+                if emp_id <= 3:
+                    title, dept_id = executives[emp_id - 1], 3
+                    superior = None if emp_id == 1 else 1
+                elif emp_id == branch_head:
+                    title, dept_id, superior = "Head Teller", 1, 3
+                else:
+                    title = rng.choice(("Teller", "Teller", "Loan Manager"))
+                    dept_id = 2 if title == "Loan Manager" else 1
+                    superior = branch_head
+                yield {
+                    "emp_id": emp_id,
+                    "fname": rng.choice(FIRST_NAMES),
+                    "lname": rng.choice(LAST_NAMES),
+                    "start_date": _random_date(rng, FIRST_DATE, date(2004, 12, 31)),
+                    "end_date": None,
+                    "superior_emp_id": superior,
+                    "dept_id": dept_id,
+                    "title": title,
+                    "assigned_branch_id": branch_id,
+                }
+
+    def product_types(self) -> Iterator[Row]:
+        """Product type rows"""
+        for product_type_cd, name in PRODUCT_TYPES:
+            yield {"product_type_cd": product_type_cd, "name": name}
+
+    def products(self) -> Iterator[Row]:
+        """Product rows"""
+        for product_cd, name, product_type_cd in PRODUCTS:
+            yield {
+                "product_cd": product_cd,
+                "name": name,
+                "product_type_cd": product_type_cd,
+                "date_offered": FIRST_DATE,
+                "date_retired": None,
+            }
+
+    def _is_business(self, cust_id: int) -> bool:
+        """Whether a customer is a business, the last customers are
+
+        :param cust_id: Customer ID
+        :return: True for a business customer
+        """
+        return cust_id > self.scale.customers - self.scale.businesses
+
+    def customers(self) -> Iterator[Row]:
+        """Customer rows"""
+        for rng, ids in self._chunks("customer", self.scale.customers):
+            for cust_id in ids:
+                city, state, postal_code = rng.choice(CITIES)
+                business = self._is_business(cust_id)
+                yield {
+                    "cust_id": cust_id,
+                    "fed_id": "%02d-%07d" % divmod(cust_id, 10_000_000)
+                    if business
+                    else "%03d-%02d-%04d"
+                    % (cust_id // 1_000_000, cust_id // 10_000 % 100, cust_id % 10_000),
+                    "cust_type_cd": CustomerTypeEnum.B
+                    if business
+                    else CustomerTypeEnum.I,
+                    "address": "%d %s" % (rng.randint(1, 9999), rng.choice(STREETS)),
+                    "city": city,
+                    "state": state,
+                    "postal_code": postal_code,
+                }
+
+    def individuals(self) -> Iterator[Row]:
+        """Individual rows, one per individual customer"""
+        count = self.scale.customers - self.scale.businesses
+        for rng, ids in self._chunks("individual", count):
+            for cust_id in ids:
+                yield {
+                    "cust_id": cust_id,
+                    "fname": rng.choice(FIRST_NAMES),
+                    "lname": rng.choice(LAST_NAMES),
+                    "birth_date": _random_date(
+                        rng, date(1940, 1, 1), date(2000, 12, 31)
+                    ),
+                }
+
+    def businesses(self) -> Iterator[Row]:
+        """Business rows, one per business customer"""
+        first = self.scale.customers - self.scale.businesses
+        for rng, ids in self._chunks("business", self.scale.businesses):
+            for index in ids:
+                yield {
+                    "cust_id": first + index,
+                    "name": "%s %s"
+                    % (
+                        rng.choice(LAST_NAMES),
+                        rng.choice(
+                            (
+                                "Engineering",
+                                "Cooling Inc.",
+                                "Auto Body",
+                                "Insurance Inc.",
+                            )
+                        ),
+                    ),
+                    "state_id": "%02d-%03d-%03d"
+                    % (index % 100, index // 100 % 1000, index % 1000),
+                    "incorp_date": _random_date(rng, date(1980, 1, 1), FIRST_DATE),
+                }
+
+    def officers(self) -> Iterator[Row]:
+        """Officer rows, one president per business customer"""
+        first = self.scale.customers - self.scale.businesses
+        for rng, ids in self._chunks("officer", self.scale.businesses):
+            for officer_id in ids:
+                yield {
+                    "officer_id": officer_id,
+                    "cust_id": first + officer_id,
+                    "fname": rng.choice(FIRST_NAMES),
+                    "lname": rng.choice(LAST_NAMES),
+                    "title": "President",
+                    "start_date": _random_date(rng, date(1980, 1, 1), FIRST_DATE),
+                    "end_date": None,
+                }
+
+    def _account_customer(self, account_id: int) -> int:
+        """Customer holding an account, accounts are spread evenly
+
+        :param account_id: Account ID
+        :return: Customer ID
+        """
+        return 1 + (account_id - 1) * self.scale.customers // self.scale.accounts
+
+    def accounts(self) -> Iterator[Row]:
+        """Account rows"""
+        for rng, ids in self._chunks("account", self.scale.accounts):
+            for account_id in ids:
+                cust_id = self._account_customer(account_id)
+                branch_id = rng.randint(1, self.scale.branches)
+                open_date = _random_date(rng, FIRST_DATE, date(2020, 12, 31))
+                roll = rng.random()
+                status = (
+                    AccountStatusEnum.ACTIVE
+                    if roll < 0.9
+                    else AccountStatusEnum.CLOSED
+                    if roll < 0.97
+                    else AccountStatusEnum.FROZEN
+                )
+                balance = round(rng.lognormvariate(8, 1.5), 2)
+                yield {
+                    "account_id": account_id,
+                    "product_cd": rng.choice(
+                        BUSINESS_PRODUCTS
+                        if self._is_business(cust_id)
+                        else INDIVIDUAL_PRODUCTS
+                    ),
+                    "cust_id": cust_id,
+                    "open_date": open_date,
+                    "close_date": _random_date(rng, open_date, LAST_DATE)
+                    if status == AccountStatusEnum.CLOSED
+                    else None,
+                    "last_activity_date": _random_date(rng, open_date, LAST_DATE),
+                    "status": status,
+                    "open_emp_id": 4
+                    + (branch_id - 1) * self.scale.employees_per_branch
+                    + rng.randrange(self.scale.employees_per_branch),
+                    "open_branch_id": branch_id,
+                    "avail_balance": balance,
+                    "pending_balance": balance,
+                }
+
+    def transactions(self) -> Iterator[Row]:
+        """Transaction rows, spread evenly over the accounts
+
+        The accounts are regenerated to date each transaction after the opening
+        of its account, instead of being kept in memory.
+        """
+        scale = self.scale
+        txn_chunks = self._chunks("transaction", scale.transactions)
+        rng, ids = next(txn_chunks, (None, range(0)))
+        txn_id = 0
+        for account in self.accounts():
+            account_id = account["account_id"]
+            count = (
+                scale.transactions * account_id // scale.accounts
+                - scale.transactions * (account_id - 1) // scale.accounts
+            )
+            first_day = datetime.combine(account["open_date"], datetime.min.time())
+            span = (LAST_DATE - account["open_date"]).days * 86_400
+            for _ in range(count):
+                txn_id += 1
+                if txn_id not in ids:
+                    rng, ids = next(txn_chunks)
+                txn_date = first_day + timedelta(seconds=rng.randint(0, span))
+                teller = rng.random() < 0.5
+                branch_id = rng.randint(1, scale.branches)
+                yield {
+                    "txn_id": txn_id,
+                    "txn_date": txn_date,
+                    "account_id": account_id,
+                    "txn_type_cd": TransactionTypeEnum.CDT
+                    if rng.random() < 0.55
+                    else TransactionTypeEnum.DBT,
+                    "amount": round(rng.lognormvariate(4.5, 1.2), 2),
+                    "teller_emp_id": 4
+                    + (branch_id - 1) * scale.employees_per_branch
+                    + rng.randrange(scale.employees_per_branch)
+                    if teller
+                    else None,
+                    "execution_branch_id": branch_id if teller else None,
+                    "funds_avail_date": txn_date
+                    + timedelta(days=rng.choice((0, 0, 1, 2))),
+                }
+
+
+def write_database(
+    engine: Engine,
+    generator: BankDataGenerator,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+) -> List[TableLoadStats]:
+    """Load the generated data into a database with existing, empty tables
+
+    :param engine: Database engine
+    :param generator: Data generator
+    :param batch_size: Number of rows per executemany call
+    :return: Load statistics, one per table
+    """
+    return bulk_load(
+        engine,
+        {name: factory() for name, factory in generator.tables().items()},
+        batch_size=batch_size,
+    )
+
+
+def write_csv(directory: Union[str, Path], generator: BankDataGenerator) -> List[Path]:
+    """Write the generated data to one CSV file per table
+
+    Empty values are written as empty fields, dates in ISO format.
+
+    :param directory: Output directory, created if missing
+    :param generator: Data generator
+    :return: Paths of the written files
+    """
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+    paths: List[Path] = []
+    for name, factory in generator.tables().items():
+        path = directory / ("%s.csv" % name)
+        columns = [column.name for column in Base.metadata.tables[name].columns]
+        with path.open("w", newline="") as output:
+            writer = csv.DictWriter(output, fieldnames=columns)
+            writer.writeheader()
+            for row in factory():
+                writer.writerow({key: plain_value(value) for key, value in row.items()})
+        paths.append(path)
+    return paths
+
+
+def write_parquet(
+    directory: Union[str, Path],
+    generator: BankDataGenerator,
+    row_group_size: int = 100_000,
+) -> List[Path]:
+    """Write the generated data to one Parquet file per table
+
+    Requires pyarrow. Rows are written one row group at a time.
+
+    :param directory: Output directory, created if missing
+    :param generator: Data generator
+    :param row_group_size: Number of rows per row group
+    :return: Paths of the written files
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+    paths: List[Path] = []
+    for name, factory in generator.tables().items():
+        path = directory / ("%s.parquet" % name)
+        schema = arrow_schema(Base.metadata.tables[name])
+        with pq.ParquetWriter(path, schema) as writer:
+            for batch in batched(factory(), row_group_size):
+                writer.write_table(
+                    pa.Table.from_pylist(
+                        [
+                            {key: plain_value(value) for key, value in row.items()}
+                            for row in batch
+                        ],
+                        schema=schema,
+                    )
+                )
+        paths.append(path)
+    return paths
+
+
+def main() -> None:
+    """Generate the data from the command line into a database or files"""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--scale", type=float, default=1.0, help="Scale factor")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed")
+    output = parser.add_mutually_exclusive_group(required=True)
+    output.add_argument("--url", help="Database URL with existing, empty tables")
+    output.add_argument("--csv", help="Output directory of CSV files")
+    output.add_argument("--parquet", help="Output directory of Parquet files")
+    args = parser.parse_args()
+
+    generator = BankDataGenerator(ScaleSpec.from_scale_factor(args.scale), args.seed)
+    if args.url is not None:
+        from db import get_engine
+
+        for stats in write_database(get_engine(args.url), generator):
+            print(stats)
+    elif args.csv is not None:
+        for path in write_csv(args.csv, generator):
+            print(path)
+    else:
+        for path in write_parquet(args.parquet, generator):
+            print(path)
+
+
+if __name__ == "__main__":
+    main()
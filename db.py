@@ -0,0 +1,290 @@
+"""Shared, pooled engine factory for the bank database
+
+One engine is kept per database URL for the life of the process, so notebooks
+and service code reuse the same warm connection pool instead of each building
+its own with ``create_engine``.
+"""
+
+import os
+import threading
+import time
+from dataclasses import dataclass, field, replace
+from typing import Dict, Final, Optional, Union
+
+from sqlalchemy import URL, Engine, create_engine, event, make_url
+from sqlalchemy.pool import QueuePool, StaticPool
+
+SQLITE_MEMORY: Final[str] = "sqlite://"
+"""URL of a private, in-memory SQLite database"""
+
+
+@dataclass(frozen=True)
+class PoolSettings:
+    """Connection pool settings shared by all engines of the factory"""
+
+    pool_size: int = 5
+    """Number of connections kept open in the pool"""
+
+    max_overflow: int = 10
+    """Number of connections allowed above pool_size under load"""
+
+    pool_timeout: float = 30.0
+    """Seconds to wait for a connection before giving up"""
+
+    pool_pre_ping: bool = True
+    """Test each connection with a ping when it is checked out"""
+
+    pool_recycle: int = 3600
+    """Seconds after which a connection is replaced, -1 to never recycle"""
+
+    @classmethod
+    def from_env(cls) -> "PoolSettings":
+        """Build the settings from the ``DB_POOL_*`` environment variables
+
+        Unset variables keep their default value.
+
+        :return: Pool settings
+        """
+        defaults = cls()
+        return cls(
+            pool_size=int(os.environ.get("DB_POOL_SIZE", defaults.pool_size)),
+            max_overflow=int(
+                os.environ.get("DB_POOL_MAX_OVERFLOW", defaults.max_overflow)
+            ),
+            pool_timeout=float(
+                os.environ.get("DB_POOL_TIMEOUT", defaults.pool_timeout)
+            ),
+            pool_pre_ping=os.environ.get(
+                "DB_POOL_PRE_PING", str(defaults.pool_pre_ping)
+            ).lower()
+            in ("1", "true", "yes"),
+            pool_recycle=int(os.environ.get("DB_POOL_RECYCLE", defaults.pool_recycle)),
+        )
+
+
+@dataclass
+class PoolStats:
+    """Connection counters and checkout latency of a single engine's pool"""
+
+    connects: int = 0
+    """Number of new DBAPI connections opened"""
+
+    checkouts: int = 0
+    """Number of connections handed out by the pool"""
+
+    checkins: int = 0
+    """Number of connections returned to the pool"""
+
+    invalidations: int = 0
+    """Number of connections discarded as invalid"""
+
+    checkout_seconds_total: float = 0.0
+    """Total time spent waiting on the pool for a connection"""
+
+    checkout_seconds_max: float = 0.0
+    """Longest time spent waiting on the pool for a connection"""
+
+    _lock: threading.Lock = field(
+        default_factory=threading.Lock, repr=False, compare=False
+    )
+
+    @property
+    def checked_out(self) -> int:
+        """Number of connections currently in use"""
+        return self.checkouts - self.checkins
+
+    @property
+    def checkout_seconds_mean(self) -> float:
+        """Mean time spent waiting on the pool for a connection"""
+        return self.checkout_seconds_total / self.checkouts if self.checkouts else 0.0
+
+    def record_checkout(self, seconds: float) -> None:
+        """Record a checkout and the time it took
+
+        :param seconds: Time spent waiting on the pool
+        :return: None
+        """
+        with self._lock:
+            self.checkouts += 1
+            self.checkout_seconds_total += seconds
+            self.checkout_seconds_max = max(self.checkout_seconds_max, seconds)
+
+    def increment(self, name: str) -> None:
+        """Increment one of the plain counters
+
+        :param name: Counter name, e.g. "connects"
+        :return: None
+        """
+        with self._lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+    def snapshot(self) -> "PoolStats":
+        """A consistent copy of the counters
+
+        :return: Copy of the statistics
+        """
+        with self._lock:
+            return replace(self, _lock=threading.Lock())
+
+
+class _TimedPoolMixin:
+    """Pool mixin that records the checkout latency in a PoolStats"""
+
+    stats: PoolStats
+
+    def _do_get(self):
+        start = time.perf_counter()
+        connection = super()._do_get()
+        self.stats.record_checkout(time.perf_counter() - start)
+        return connection
+
+    def recreate(self):
+        pool = super().recreate()
+        pool.stats = self.stats
+        return pool
+
+
+class TimedQueuePool(_TimedPoolMixin, QueuePool):
+    """QueuePool recording its checkout latency"""
+
+    pass
+
+
+class TimedStaticPool(_TimedPoolMixin, StaticPool):
+    """StaticPool recording its checkout latency, used for in-memory SQLite"""
+
+    pass
+
+
+_engines: Dict[str, Engine] = {}
+"""Process-wide engines, keyed by their rendered URL"""
+
+_engines_lock: Final[threading.Lock] = threading.Lock()
+
+
+def url_from_env() -> URL:
+    """Build the database URL from the ``DB_*`` environment variables
+
+    ``DB_ENGINE`` is the driver name, e.g. "mysql+mysqlconnector". For a
+    SQLite driver only ``DB_NAME`` is used, as the database file.
+
+    :return: Database URL
+    """
+    drivername = os.environ["DB_ENGINE"]
+    if drivername.startswith("sqlite"):
+        return URL.create(drivername, database=os.environ.get("DB_NAME"))
+    return URL.create(
+        drivername,
+        username=os.environ["DB_USER"],
+        password=os.environ["DB_PASSWD"],
+        host=os.environ["DB_HOST"],
+        database=os.environ["DB_NAME"],
+    )
+
+
+def _attach_stats(engine: Engine, stats: PoolStats) -> None:
+    """Count the pool events of the engine in the statistics
+
+    :param engine: Engine to instrument
+    :param stats: Statistics to update
+    :return: None
+    """
+    engine.pool.stats = stats
+    event.listen(engine, "connect", lambda *args: stats.increment("connects"))
+    event.listen(engine, "checkin", lambda *args: stats.increment("checkins"))
+    event.listen(engine, "invalidate", lambda *args: stats.increment("invalidations"))
+
+
+def _create_engine(url: URL, settings: PoolSettings, **kwargs) -> Engine:
+    """Create an instrumented engine for the URL
+
+    :param url: Database URL
+    :param settings: Pool settings, ignored for in-memory SQLite
+    :param kwargs: Extra keyword arguments for ``create_engine``
+    :return: New engine
+    """
+    if url.get_backend_name() == "sqlite" and url.database in (None, "", ":memory:"):
+        # A single shared connection, else every checkout is a new empty database
+        engine = create_engine(
+            url,
+            poolclass=TimedStaticPool,
+            connect_args={"check_same_thread": False},
+            **kwargs,
+        )
+    else:
+        engine = create_engine(
+            url,
+            poolclass=TimedQueuePool,
+            pool_size=settings.pool_size,
+            max_overflow=settings.max_overflow,
+            pool_timeout=settings.pool_timeout,
+            pool_pre_ping=settings.pool_pre_ping,
+            pool_recycle=settings.pool_recycle,
+            **kwargs,
+        )
+    _attach_stats(engine, PoolStats())
+    return engine
+
+
+def get_engine(
+    url: Optional[Union[URL, str]] = None,
+    settings: Optional[PoolSettings] = None,
+    **kwargs,
+) -> Engine:
+    """Get the process-wide engine of a database, creating it on first use
+
+    The settings and keyword arguments only apply when the engine is created;
+    later calls for the same URL return the existing engine.
+
+    :param url: Database URL, defaults to the ``DB_*`` environment variables
+    :param settings: Pool settings, defaults to the ``DB_POOL_*`` environment variables
+    :param kwargs: Extra keyword arguments for ``create_engine``
+    :return: Shared engine
+    """
+    url = url_from_env() if url is None else make_url(url)
+    key = url.render_as_string(hide_password=False)
+    with _engines_lock:
+        engine = _engines.get(key)
+        if engine is None:
+            engine = _create_engine(
+                url,
+                settings if settings is not None else PoolSettings.from_env(),
+                **kwargs,
+            )
+            _engines[key] = engine
+    return engine
+
+
+def sqlite_engine(path: Optional[str] = None, **kwargs) -> Engine:
+    """Get the shared engine of a local SQLite database
+
+    :param path: Database file, in-memory if None
+    :param kwargs: Extra keyword arguments for ``create_engine``
+    :return: Shared engine
+    """
+    return get_engine(
+        SQLITE_MEMORY if path is None else URL.create("sqlite", database=path),
+        **kwargs,
+    )
+
+
+def pool_stats(engine: Engine) -> PoolStats:
+    """Statistics of an engine's pool
+
+    :param engine: Engine created by this module
+    :return: Copy of the pool statistics
+    """
+    return engine.pool.stats.snapshot()
+
+
+def dispose_engines(close: bool = True) -> None:
+    """Close all pooled connections and forget every shared engine
+
+    :param close: Close the pooled connections, False in a forked child so the
+        connections inherited from the parent are left to the parent
+    :return: None
+    """
+    with _engines_lock:
+        for engine in _engines.values():
+            engine.dispose(close=close)
+        _engines.clear()
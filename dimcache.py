@@ -0,0 +1,369 @@
+"""Second-level cache of the small dimension entities
+
+Branches, products, product types, departments and employees are loaded by
+primary key over and over, by the many-to-one lazy loads of
+``Transaction.transaction_branch``, ``Account.account_product`` and the like,
+and by ``Session.get``. DimensionCache keeps their column values across
+sessions and answers these loads without SQL::
+
+    cache = DimensionCache()
+    cache.watch(Session)
+    cache.preload(engine)
+    with Session(engine) as session:
+        branch = session.get(Transaction, 1).transaction_branch   # no SQL
+
+A cached row is merged into the session as a clean persistent object, like a
+row just loaded. Flushes and bulk DML of watched sessions bump the version of
+the classes they write to and drop their rows, once when they run and again
+when the transaction ends. Until then the writing session bypasses the cache
+for these classes, and a load that started before a version bump is not
+stored. Rows written by other processes are picked up after the time to live.
+"""
+
+import threading
+import time
+from dataclasses import dataclass, replace
+from typing import Any, Dict, Final, Iterable, Optional, Sequence, Tuple, Union
+
+from sqlalchemy import Engine, event, inspect, select
+from sqlalchemy.engine import IteratorResult, Result
+from sqlalchemy.engine.result import SimpleResultMetaData
+from sqlalchemy.orm import (
+    Mapper,
+    ORMExecuteState,
+    Session,
+    make_transient_to_detached,
+    sessionmaker,
+)
+from sqlalchemy.orm.attributes import set_committed_value
+
+from model import Branch, Department, Employee, Product, ProductType
+
+DEFAULT_CLASSES: Final[Tuple[type, ...]] = (
+    Branch,
+    Department,
+    Employee,
+    Product,
+    ProductType,
+)
+"""Dimension classes cached by default"""
+
+DEFAULT_TTL: Final[float] = 3600.0
+"""Seconds a cached row stays valid"""
+
+BYPASS_OPTION: Final[str] = "dimension_cache_bypass"
+"""Execution option loading from the database when true, e.g. to refresh"""
+
+_WRITTEN_KEY: Final[str] = "dimension_cache_written"
+"""Session.info key of the cached classes written by the current transaction"""
+
+
+@dataclass
+class EntityStats:
+    """Counters of one cached class"""
+
+    hits: int = 0
+    """Primary key loads answered from the cache"""
+
+    misses: int = 0
+    """Primary key loads that ran a query"""
+
+    bypasses: int = 0
+    """Loads sent to the database by a session writing to the class"""
+
+    preloaded: int = 0
+    """Rows stored by preload"""
+
+    invalidations: int = 0
+    """Version bumps after a write"""
+
+    @property
+    def hit_ratio(self) -> float:
+        """Share of the primary key loads answered from the cache"""
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+
+@dataclass(frozen=True)
+class _Entry:
+    """A cached row"""
+
+    instance: Any
+    """Detached object holding the column values, never attached to a session"""
+
+    expires: float
+    """Monotonic time after which the row is stale"""
+
+
+def _pk_params(mapper: Mapper) -> Tuple[str, ...]:
+    """Names of the bound parameters of the primary key load of a mapper
+
+    :param mapper: Mapper of the class
+    :return: Parameter names, in primary key column order
+    """
+    _, params = mapper._get_clause
+    return tuple(params[column].key for column in mapper.primary_key)
+
+
+class DimensionCache:
+    """Process-wide cache of dimension objects, keyed by database and identity"""
+
+    def __init__(
+        self, classes: Sequence[type] = DEFAULT_CLASSES, ttl: float = DEFAULT_TTL
+    ) -> None:
+        """Create an empty cache
+
+        :param classes: Mapped classes to cache
+        :param ttl: Seconds a cached row stays valid
+        """
+        self.ttl: Final[float] = ttl
+        """Seconds a cached row stays valid"""
+
+        self._mappers: Final[Dict[type, Mapper]] = {
+            cls: inspect(cls) for cls in classes
+        }
+        self._pk_params: Final[Dict[type, Tuple[str, ...]]] = {
+            cls: _pk_params(mapper) for cls, mapper in self._mappers.items()
+        }
+        self._entries: Dict[Tuple[str, type, Tuple], _Entry] = {}
+        self._versions: Dict[type, int] = dict.fromkeys(classes, 0)
+        self._stats: Dict[type, EntityStats] = {cls: EntityStats() for cls in classes}
+        self._lock: Final[threading.Lock] = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @property
+    def classes(self) -> Tuple[type, ...]:
+        """Cached classes"""
+        return tuple(self._mappers)
+
+    def version(self, cls: type) -> int:
+        """Version of a cached class, bumped by every write to it
+
+        :param cls: Cached class
+        :return: Version
+        """
+        return self._versions[cls]
+
+    def stats(self) -> Dict[str, EntityStats]:
+        """A consistent copy of the counters
+
+        :return: Counters keyed by class name
+        """
+        with self._lock:
+            return {cls.__name__: replace(stats) for cls, stats in self._stats.items()}
+
+    def _detached(self, instance: Any) -> Any:
+        """Detached copy of the column values of a loaded object
+
+        :param instance: Persistent object
+        :return: New detached object of the same class
+        """
+        mapper = inspect(instance).mapper
+        copy = mapper.class_manager.new_instance()
+        for attribute in mapper.column_attrs:
+            set_committed_value(copy, attribute.key, getattr(instance, attribute.key))
+        make_transient_to_detached(copy)
+        return copy
+
+    def _store(
+        self, url: str, instances: Iterable[Any], version: Optional[int] = None
+    ) -> int:
+        """Cache loaded objects, unless their class changed version meanwhile
+
+        :param url: Database of the objects
+        :param instances: Persistent objects of the cached classes
+        :param version: Version of the class when the load started, if any
+        :return: Number of stored rows
+        """
+        stored = 0
+        expires = time.monotonic() + self.ttl
+        copies = [self._detached(instance) for instance in instances]
+        with self._lock:
+            for copy in copies:
+                cls = type(copy)
+                if version is not None and self._versions[cls] != version:
+                    continue
+                key = (url, cls, inspect(copy).identity)
+                self._entries[key] = _Entry(copy, expires)
+                stored += 1
+        return stored
+
+    def _lookup(self, url: str, cls: type, identity: Tuple) -> Optional[Any]:
+        """Fresh cached object of an identity, counting the hit or miss
+
+        :param url: Database of the object
+        :param cls: Cached class
+        :param identity: Primary key values
+        :return: Detached object, None on a miss
+        """
+        key = (url, cls, identity)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry.expires <= time.monotonic():
+                del self._entries[key]
+                entry = None
+            if entry is None:
+                self._stats[cls].misses += 1
+                return None
+            self._stats[cls].hits += 1
+            return entry.instance
+
+    def preload(
+        self, bind: Union[Engine, Session], classes: Optional[Iterable[type]] = None
+    ) -> int:
+        """Load every row of the cached classes, e.g. at startup
+
+        :param bind: Engine, or session to load with
+        :param classes: Classes to load, all the cached ones if None
+        :return: Number of stored rows
+        """
+        session = bind if isinstance(bind, Session) else Session(bind)
+        try:
+            stored = 0
+            for cls in classes or self.classes:
+                url = _url(session.get_bind(mapper=self._mappers[cls]))
+                instances = session.scalars(
+                    select(cls).execution_options(**{BYPASS_OPTION: True})
+                ).all()
+                count = self._store(url, instances)
+                with self._lock:
+                    self._stats[cls].preloaded += count
+                stored += count
+            return stored
+        finally:
+            if session is not bind:
+                session.close()
+
+    def invalidate(self, *classes: type) -> int:
+        """Bump the version of classes and drop their rows
+
+        :param classes: Cached classes, others are ignored
+        :return: Number of rows dropped
+        """
+        written = {cls for cls in classes if cls in self._versions}
+        if not written:
+            return 0
+        with self._lock:
+            for cls in written:
+                self._versions[cls] += 1
+                self._stats[cls].invalidations += 1
+            keys = [key for key in self._entries if key[1] in written]
+            for key in keys:
+                del self._entries[key]
+        return len(keys)
+
+    def clear(self) -> None:
+        """Drop every row, the versions and counters are kept
+
+        :return: None
+        """
+        with self._lock:
+            self._entries.clear()
+
+    def _cached_class(self, orm_execute_state: ORMExecuteState) -> Optional[type]:
+        """Cached class of a primary key load, None for any other statement
+
+        :param orm_execute_state: Execution of an ORM statement
+        :return: Class
+        """
+        if (
+            not orm_execute_state.is_select
+            or orm_execute_state.is_column_load
+            or orm_execute_state.execution_options.get(BYPASS_OPTION)
+            or orm_execute_state.load_options._populate_existing
+            or orm_execute_state.statement._for_update_arg is not None
+        ):
+            return None
+        mapper = orm_execute_state.bind_mapper
+        if mapper is None or mapper.class_ not in self._mappers:
+            return None
+        parameters = orm_execute_state.parameters
+        names = self._pk_params[mapper.class_]
+        if not isinstance(parameters, dict) or set(parameters) != set(names):
+            return None
+        return mapper.class_
+
+    def _do_orm_execute(self, orm_execute_state: ORMExecuteState) -> Optional[Result]:
+        if (
+            orm_execute_state.is_insert
+            or orm_execute_state.is_update
+            or (orm_execute_state.is_delete)
+        ):
+            mapper = orm_execute_state.bind_mapper
+            if mapper is not None:
+                self._written(orm_execute_state.session, [mapper.class_])
+            return None
+        cls = self._cached_class(orm_execute_state)
+        if cls is None:
+            return None
+        session = orm_execute_state.session
+        if cls in session.info.get(_WRITTEN_KEY, ()):
+            with self._lock:
+                self._stats[cls].bypasses += 1
+            return None
+        url = _url(session.get_bind(mapper=self._mappers[cls]))
+        parameters = orm_execute_state.parameters
+        identity = tuple(parameters[name] for name in self._pk_params[cls])
+        cached = self._lookup(url, cls, identity)
+        if cached is not None:
+            instance = session.merge(cached, load=False)
+            return IteratorResult(
+                SimpleResultMetaData([cls.__name__]), iter([(instance,)])
+            )
+        version = self._versions[cls]
+        frozen = orm_execute_state.invoke_statement().freeze()
+        self._store(url, frozen().scalars().all(), version)
+        return frozen()
+
+    def _after_flush(self, session: Session, flush_context) -> None:
+        self._written(
+            session,
+            {
+                type(instance)
+                for instance in (*session.new, *session.dirty, *session.deleted)
+            },
+        )
+
+    def _written(self, session: Session, classes: Iterable[type]) -> None:
+        """Invalidate classes now and again when the transaction ends
+
+        :param session: Session writing to the classes
+        :param classes: Written classes, the uncached ones are ignored
+        :return: None
+        """
+        written = {cls for cls in classes if cls in self._versions}
+        if written:
+            session.info.setdefault(_WRITTEN_KEY, set()).update(written)
+            self.invalidate(*written)
+
+    def _end_transaction(self, session: Session) -> None:
+        self.invalidate(*session.info.pop(_WRITTEN_KEY, ()))
+
+    def watch(self, target: Union[Session, sessionmaker, type]) -> None:
+        """Serve the primary key loads of sessions and invalidate on their writes
+
+        :param target: Session, sessionmaker, or Session class for all sessions
+        :return: None
+        """
+        event.listen(target, "do_orm_execute", self._do_orm_execute)
+        event.listen(target, "after_flush", self._after_flush)
+        event.listen(target, "after_commit", self._end_transaction)
+        event.listen(target, "after_rollback", self._end_transaction)
+
+    def unwatch(self, target: Union[Session, sessionmaker, type]) -> None:
+        """Stop serving and invalidating for sessions
+
+        :param target: Target previously passed to watch
+        :return: None
+        """
+        event.remove(target, "do_orm_execute", self._do_orm_execute)
+        event.remove(target, "after_flush", self._after_flush)
+        event.remove(target, "after_commit", self._end_transaction)
+        event.remove(target, "after_rollback", self._end_transaction)
+
+
+def _url(bind) -> str:
+    """Database URL of an engine or connection, without the password"""
+    return bind.engine.url.render_as_string(hide_password=True)
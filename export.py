@@ -0,0 +1,445 @@
+"""Parallel export of tables and extracts to partitioned Parquet or CSV files
+
+A source, a table of the model or a joined extract, is split into ranges of
+its integer key. Each range is read on its own pooled connection by a thread
+or process pool and streamed batch by batch into its own file, with the Arrow
+schema derived from the model column types::
+
+    for stats in export(engine, "transaction", "extracts", partitions=8):
+        print(stats)
+
+Files are written to ``<directory>/<source>/part-<partition>.<format>``.
+Process pools open their own engine from the URL, so they need a database
+file or server, not in-memory SQLite. Requires pyarrow.
+"""
+
+import argparse
+import math
+import os
+import time
+import tracemalloc
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, Final, List, Optional, Sequence, Tuple, Union
+
+from sqlalchemy import Column, Engine, Integer, Table, func, select
+from sqlalchemy.sql.selectable import Select as SQLSelect
+
+from db import dispose_engines, get_engine
+from model import Base, Business, Customer, Individual, configure
+from streaming import stream_arrow
+from utils import arrow_type
+
+FORMATS: Final[Tuple[str, ...]] = ("parquet", "csv")
+"""Output file formats"""
+
+DEFAULT_PARTITIONS: Final[int] = 4
+"""Number of key ranges a source is split into"""
+
+DEFAULT_ROW_GROUP_ROWS: Final[int] = 100_000
+"""Rows read per batch, one Parquet row group each"""
+
+DEFAULT_COMPRESSION: Final[Dict[str, Optional[str]]] = {
+    "parquet": "zstd",
+    "csv": None,
+}
+"""Compression codec of each format"""
+
+CSV_SUFFIXES: Final[Dict[str, str]] = {
+    "gzip": "csv.gz",
+    "bz2": "csv.bz2",
+    "brotli": "csv.br",
+    "lz4": "csv.lz4",
+    "zstd": "csv.zst",
+}
+"""File suffix of the compressed CSV files, keyed by codec"""
+
+NIGHTLY_SOURCES: Final[Tuple[str, ...]] = ("transaction", "account", "customer_detail")
+"""Sources of the nightly extracts"""
+
+
+@dataclass(frozen=True)
+class ExportSource:
+    """A table or joined extract that can be exported by key ranges"""
+
+    name: str
+    """Name of the source, the name of the output directory"""
+
+    statement: SQLSelect
+    """Select of the exported columns"""
+
+    key: Optional[Column]
+    """Integer column the ranges are taken on, a single partition if None"""
+
+    def schema(self):
+        """Arrow schema of the exported columns
+
+        Columns of other tables than the key's are nullable, as they may come
+        from an outer join.
+
+        :return: pyarrow.Schema
+        """
+        import pyarrow as pa
+
+        home = None if self.key is None else self.key.table
+        fields = []
+        for column in self.statement.selected_columns:
+            nullable = getattr(column, "nullable", True)
+            if home is not None and getattr(column, "table", None) is not home:
+                nullable = True
+            fields.append(pa.field(column.name, arrow_type(column.type), nullable))
+        return pa.schema(fields)
+
+
+def _table_source(name: str) -> ExportSource:
+    """Export source of a table of the model, keyed by its integer primary key"""
+    table = Base.metadata.tables[name]
+    keys = list(table.primary_key.columns)
+    key = keys[0] if len(keys) == 1 and isinstance(keys[0].type, Integer) else None
+    return ExportSource(name, select(table), key)
+
+
+SOURCES: Dict[str, ExportSource] = {
+    name: _table_source(name) for name in Base.metadata.tables
+}
+"""Exportable sources, keyed by name"""
+
+_individual: Final[Table] = Individual.__table__
+"""Subclass table joined on its own, customer is already in the select"""
+
+_business: Final[Table] = Business.__table__
+"""Subclass table joined on its own, customer is already in the select"""
+
+SOURCES["customer_detail"] = ExportSource(
+    "customer_detail",
+    select(
+        Customer.cust_id,
+        Customer.fed_id,
+        Customer.cust_type_cd,
+        Customer.address,
+        Customer.city,
+        Customer.state,
+        Customer.postal_code,
+        _individual.c.fname,
+        _individual.c.lname,
+        _individual.c.birth_date,
+        _business.c.name.label("business_name"),
+        _business.c.state_id,
+        _business.c.incorp_date,
+    )
+    .outerjoin(_individual, Customer.cust_id == _individual.c.cust_id)
+    .outerjoin(_business, Customer.cust_id == _business.c.cust_id),
+    Customer.__table__.c.cust_id,
+)
+
+
+@dataclass
+class PartitionStats:
+    """Export statistics of one partition"""
+
+    source: str
+    """Name of the exported source"""
+
+    partition: int
+    """Index of the partition"""
+
+    low: Optional[int]
+    """First key of the range, None for the whole source"""
+
+    high: Optional[int]
+    """Key after the range, None for the whole source"""
+
+    path: str
+    """Written file"""
+
+    rows: int = 0
+    """Number of rows written"""
+
+    seconds: float = 0.0
+    """Time spent reading and writing the partition"""
+
+    bytes_written: int = 0
+    """Size of the written file"""
+
+    peak_batch_bytes: int = 0
+    """Largest Arrow batch held while writing"""
+
+    peak_memory_bytes: int = 0
+    """Peak Python memory allocated while exporting the partition
+
+    Traced by tracemalloc from the start of the partition. A process worker
+    exports one partition at a time, thread workers share the trace, so
+    the partitions running alongside are included.
+    """
+
+    @property
+    def rows_per_second(self) -> float:
+        """Export throughput of the partition"""
+        return self.rows / self.seconds if self.seconds > 0 else 0.0
+
+    def __repr__(self) -> str:
+        return (
+            "PartitionStats(source=%s, partition=%d, rows=%d, seconds=%.3f, "
+            "rows_per_second=%.0f, bytes_written=%d, peak_batch_bytes=%d, "
+            "peak_memory_bytes=%d)"
+            % (
+                self.source,
+                self.partition,
+                self.rows,
+                self.seconds,
+                self.rows_per_second,
+                self.bytes_written,
+                self.peak_batch_bytes,
+                self.peak_memory_bytes,
+            )
+        )
+
+
+@dataclass(frozen=True)
+class _Task:
+    """A partition to export, sent to a pool worker"""
+
+    bind: Union[Engine, str]
+    source: str
+    partition: int
+    low: Optional[int]
+    high: Optional[int]
+    path: str
+    file_format: str
+    compression: Optional[str]
+    chunksize: int
+
+
+def key_ranges(
+    engine: Engine, source: ExportSource, partitions: int
+) -> List[Tuple[Optional[int], Optional[int]]]:
+    """Split the key of a source into ranges of equal width
+
+    :param engine: Database engine
+    :param source: Export source
+    :param partitions: Maximum number of ranges
+    :return: (low, high) ranges, high excluded, one (None, None) if unsplittable
+    """
+    if partitions < 1:
+        raise ValueError("partitions must be positive, got %d" % partitions)
+    if source.key is None:
+        return [(None, None)]
+    with engine.connect() as connection:
+        lowest, highest = connection.execute(
+            select(func.min(source.key), func.max(source.key))
+        ).one()
+    if lowest is None:
+        return [(None, None)]
+    width = math.ceil((highest - lowest + 1) / partitions)
+    return [
+        (low, min(low + width, highest + 1))
+        for low in range(lowest, highest + 1, width)
+    ]
+
+
+def _start_worker() -> None:
+    """Set up a process worker: own engines, memory traced"""
+    dispose_engines(close=False)
+    tracemalloc.start()
+
+
+def _export_partition(task: _Task) -> PartitionStats:
+    """Stream one key range of a source to its file
+
+    :param task: Partition to export
+    :return: Statistics of the partition
+    """
+    import pyarrow as pa
+    import pyarrow.csv as pa_csv
+    import pyarrow.parquet as pq
+
+    if isinstance(task.bind, str):
+        engine = get_engine(task.bind)
+    else:
+        engine = task.bind
+    source = SOURCES[task.source]
+    schema = source.schema()
+    statement = source.statement
+    if task.low is not None:
+        statement = statement.where(
+            source.key >= task.low, source.key < task.high
+        ).order_by(source.key)
+
+    stats = PartitionStats(task.source, task.partition, task.low, task.high, task.path)
+    tracemalloc.reset_peak()
+    memory = tracemalloc.get_traced_memory()[0]
+    start = time.perf_counter()
+    if task.file_format == "parquet":
+        writer = pq.ParquetWriter(task.path, schema, compression=task.compression)
+        write = writer.write_batch
+    else:
+        sink = (
+            pa.CompressedOutputStream(task.path, task.compression)
+            if task.compression is not None
+            else pa.OSFile(task.path, "wb")
+        )
+        writer = pa_csv.CSVWriter(sink, schema)
+        write = writer.write
+    try:
+        for batch in stream_arrow(
+            engine, statement, chunksize=task.chunksize, schema=schema
+        ):
+            write(batch)
+            stats.rows += batch.num_rows
+            stats.peak_batch_bytes = max(stats.peak_batch_bytes, batch.nbytes)
+    finally:
+        writer.close()
+        if task.file_format == "csv":
+            sink.close()
+    stats.seconds = time.perf_counter() - start
+    stats.peak_memory_bytes = max(0, tracemalloc.get_traced_memory()[1] - memory)
+    stats.bytes_written = os.path.getsize(task.path)
+    return stats
+
+
+def export(
+    engine: Engine,
+    name: str,
+    directory: Union[str, Path],
+    partitions: int = DEFAULT_PARTITIONS,
+    workers: Optional[int] = None,
+    file_format: str = "parquet",
+    compression: Optional[str] = "default",
+    chunksize: int = DEFAULT_ROW_GROUP_ROWS,
+    processes: bool = False,
+) -> List[PartitionStats]:
+    """Export a source to partitioned files in parallel
+
+    Earlier part files of the source are removed first.
+
+    :param engine: Database engine, its pool serves the thread workers
+    :param name: Name of the source, a table or an extract of SOURCES
+    :param directory: Output directory, the files go to a subdirectory per source
+    :param partitions: Maximum number of key ranges
+    :param workers: Number of pool workers, one per partition up to the CPUs if None
+    :param file_format: One of FORMATS
+    :param compression: Codec, the DEFAULT_COMPRESSION of the format if "default"
+    :param chunksize: Rows read per batch
+    :param processes: Use a process pool instead of a thread pool
+    :return: Statistics of each partition, in key order
+    """
+    if file_format not in FORMATS:
+        raise ValueError(
+            "Unknown format %r, expected one of %s" % (file_format, FORMATS)
+        )
+    try:
+        source = SOURCES[name]
+    except KeyError:
+        raise KeyError(
+            "Unknown source %r, expected one of %s" % (name, sorted(SOURCES))
+        ) from None
+    if compression == "default":
+        compression = DEFAULT_COMPRESSION[file_format]
+    bind: Union[Engine, str] = engine
+    if processes:
+        if engine.url.get_backend_name() == "sqlite" and engine.url.database in (
+            None,
+            "",
+            ":memory:",
+        ):
+            raise ValueError("Process workers cannot read an in-memory database")
+        bind = engine.url.render_as_string(hide_password=False)
+
+    output = Path(directory) / name
+    output.mkdir(parents=True, exist_ok=True)
+    for stale in output.glob("part-*"):
+        stale.unlink()
+    suffix = (
+        file_format
+        if file_format == "parquet" or compression is None
+        else CSV_SUFFIXES.get(compression, "csv.%s" % compression)
+    )
+    ranges = key_ranges(engine, source, partitions)
+    tasks = [
+        _Task(
+            bind,
+            name,
+            index,
+            low,
+            high,
+            str(output / ("part-%05d.%s" % (index, suffix))),
+            file_format,
+            compression,
+            chunksize,
+        )
+        for index, (low, high) in enumerate(ranges)
+    ]
+    workers = workers or min(len(tasks), os.cpu_count() or 1)
+    if processes:
+        # Forked workers inherit the configured mappers
+        configure()
+    pool: Executor = (
+        ProcessPoolExecutor(workers, initializer=_start_worker)
+        if processes
+        else ThreadPoolExecutor(workers)
+    )
+    tracing = not processes and not tracemalloc.is_tracing()
+    if tracing:
+        tracemalloc.start()
+    try:
+        with pool:
+            return list(pool.map(_export_partition, tasks))
+    finally:
+        if tracing:
+            tracemalloc.stop()
+
+
+def export_all(
+    engine: Engine,
+    directory: Union[str, Path],
+    names: Sequence[str] = NIGHTLY_SOURCES,
+    **kwargs,
+) -> Dict[str, List[PartitionStats]]:
+    """Export several sources, one after the other
+
+    :param engine: Database engine
+    :param directory: Output directory
+    :param names: Names of the sources
+    :param kwargs: Settings of export
+    :return: Statistics of the partitions, keyed by source
+    """
+    return {name: export(engine, name, directory, **kwargs) for name in names}
+
+
+def main() -> None:
+    """Export sources from the command line"""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--url", help="Database URL, else the DB_* variables")
+    parser.add_argument("--output", required=True, help="Output directory")
+    parser.add_argument(
+        "--sources", nargs="+", default=NIGHTLY_SOURCES, choices=sorted(SOURCES)
+    )
+    parser.add_argument("--partitions", type=int, default=DEFAULT_PARTITIONS)
+    parser.add_argument("--workers", type=int, help="Pool workers")
+    parser.add_argument("--format", choices=FORMATS, default="parquet")
+    parser.add_argument("--compression", default="default", help="Codec or 'none'")
+    parser.add_argument("--chunksize", type=int, default=DEFAULT_ROW_GROUP_ROWS)
+    parser.add_argument(
+        "--processes", action="store_true", help="Process pool instead of threads"
+    )
+    args = parser.parse_args()
+
+    results = export_all(
+        get_engine(args.url),
+        args.output,
+        args.sources,
+        partitions=args.partitions,
+        workers=args.workers,
+        file_format=args.format,
+        compression=None if args.compression == "none" else args.compression,
+        chunksize=args.chunksize,
+        processes=args.processes,
+    )
+    for partitions in results.values():
+        for stats in partitions:
+            print(stats)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,514 @@
+"""Per-statement metrics and slow-query log from the engine events
+
+Instrumentation listens to the cursor events of an engine and records, per
+statement fingerprint, the number of executions, the wall time and the rows
+returned or affected, with the call site that issued it. Statements slower
+than a threshold go to a bounded slow-query log, optionally with their EXPLAIN
+plan::
+
+    metrics = instrument(engine, slow_threshold=0.05, explain=True)
+    ...
+    print(metrics.to_prometheus())
+    for query in metrics.slow_queries():
+        print(query.seconds, query.statement, query.plan)
+
+A fingerprint is the statement with its literals replaced by ``?``, so the
+same query with different values is counted once. Executions of SQLAlchemy
+statements also count as hits or misses of the compiled cache of the engine,
+with the time spent compiling on misses and the time saved on hits.
+"""
+
+import hashlib
+import json
+import re
+import sys
+import threading
+import time
+from collections import deque
+from dataclasses import asdict, dataclass, field, replace
+from datetime import datetime
+from typing import (
+    AbstractSet,
+    Any,
+    Deque,
+    Dict,
+    Final,
+    FrozenSet,
+    Iterable,
+    List,
+    Optional,
+)
+
+from sqlalchemy import Engine, event
+from sqlalchemy.engine.default import CACHE_HIT, CACHE_MISS
+
+DEFAULT_SLOW_THRESHOLD: Final[float] = 0.1
+"""Seconds above which a statement is logged as slow"""
+
+DEFAULT_SLOW_LOG_SIZE: Final[int] = 1000
+"""Number of slow statements kept, the oldest are dropped"""
+
+_FINGERPRINT_CACHE_SIZE: Final[int] = 10_000
+"""Number of statement texts whose fingerprint is remembered"""
+
+_EXPLAIN_PREFIXES: Final[Dict[str, str]] = {
+    "sqlite": "EXPLAIN QUERY PLAN ",
+    "mysql": "EXPLAIN ",
+    "mariadb": "EXPLAIN ",
+    "postgresql": "EXPLAIN ",
+}
+"""Prefix of the EXPLAIN statement of each dialect"""
+
+DEFAULT_HELPER_MODULES: Final[FrozenSet[str]] = frozenset(
+    {
+        "analytics",
+        "cache",
+        "export",
+        "loading",
+        "pagination",
+        "queries",
+        "streaming",
+    }
+)
+"""Modules of this repository running statements on behalf of their callers"""
+
+_LIBRARY_PACKAGES: Final[FrozenSet[str]] = frozenset({"sqlalchemy", "pandas", __name__})
+"""Top-level packages of the library frames, skipped for the call site"""
+
+_EXECUTE_START: Final[str] = "instrumentation_execute_start"
+"""Connection info key of the start time of the current execution"""
+
+_NORMALIZE: Final[tuple] = (
+    (re.compile(r"--[^\n]*|/\*.*?\*/", re.S), " "),
+    (re.compile(r"'(?:[^']|'')*'"), "?"),
+    (re.compile(r"\b\d+(?:\.\d+)?\b"), "?"),
+    (re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)"), "(?+)"),
+    (re.compile(r"\s+"), " "),
+)
+"""Substitutions turning a statement into its fingerprint text"""
+
+
+def normalize(statement: str) -> str:
+    """Statement text with comments, literals and IN lists collapsed
+
+    :param statement: SQL statement
+    :return: Normalized statement
+    """
+    for pattern, substitute in _NORMALIZE:
+        statement = pattern.sub(substitute, statement)
+    return statement.strip()
+
+
+@dataclass
+class StatementStats:
+    """Metrics of the executions of one statement fingerprint"""
+
+    fingerprint: str
+    """Digest of the normalized statement"""
+
+    statement: str
+    """Normalized statement"""
+
+    calls: int = 0
+    """Number of executions"""
+
+    seconds_total: float = 0.0
+    """Total wall time of the executions"""
+
+    seconds_max: float = 0.0
+    """Slowest execution"""
+
+    rows: int = 0
+    """Rows fetched by selects and affected by other statements"""
+
+    slow: int = 0
+    """Executions above the slow threshold"""
+
+    call_site: str = ""
+    """Call site of the latest execution"""
+
+    cache_hits: int = 0
+    """Executions reusing the compiled statement of the cache"""
+
+    cache_misses: int = 0
+    """Executions compiling the statement"""
+
+    compile_seconds: float = 0.0
+    """Time spent building the cache key and compiling on misses"""
+
+    @property
+    def seconds_mean(self) -> float:
+        """Mean wall time of the executions"""
+        return self.seconds_total / self.calls if self.calls else 0.0
+
+    @property
+    def cache_hit_ratio(self) -> float:
+        """Share of the compiled executions served by the cache"""
+        compiled = self.cache_hits + self.cache_misses
+        return self.cache_hits / compiled if compiled else 0.0
+
+    @property
+    def compile_seconds_saved(self) -> float:
+        """Compile time saved by the hits, at the mean compile time of the misses"""
+        if not self.cache_misses:
+            return 0.0
+        return self.cache_hits * self.compile_seconds / self.cache_misses
+
+
+@dataclass(frozen=True)
+class SlowQuery:
+    """An execution above the slow threshold"""
+
+    fingerprint: str
+    """Digest of the normalized statement"""
+
+    statement: str
+    """Statement as executed"""
+
+    parameters: str
+    """Bound parameters, truncated"""
+
+    seconds: float
+    """Wall time of the execution"""
+
+    call_site: str
+    """Code that issued the statement"""
+
+    timestamp: str
+    """Time of the execution, ISO format"""
+
+    plan: List[str] = field(default_factory=list)
+    """EXPLAIN output rows, empty unless captured"""
+
+
+class _CountingCursor:
+    """DBAPI cursor proxy adding the fetched rows to the statement metrics"""
+
+    __slots__ = ("_cursor", "_stats", "_lock")
+
+    def __init__(self, cursor, stats: StatementStats, lock: threading.Lock) -> None:
+        self._cursor = cursor
+        self._stats = stats
+        self._lock = lock
+
+    def _count(self, rows: int) -> None:
+        with self._lock:
+            self._stats.rows += rows
+
+    def fetchone(self):
+        row = self._cursor.fetchone()
+        if row is not None:
+            self._count(1)
+        return row
+
+    def fetchmany(self, *args):
+        rows = self._cursor.fetchmany(*args)
+        self._count(len(rows))
+        return rows
+
+    def fetchall(self):
+        rows = self._cursor.fetchall()
+        self._count(len(rows))
+        return rows
+
+    def __iter__(self):
+        return iter(self.fetchone, None)
+
+    def __getattr__(self, name: str):
+        return getattr(self._cursor, name)
+
+
+def _call_site(skipped: AbstractSet[str]) -> str:
+    """File, line and function of the innermost frame outside the skipped modules
+
+    :param skipped: Names of the modules and top-level packages to skip
+    :return: Call site, empty if every frame is skipped
+    """
+    frame = sys._getframe(2)
+    while frame is not None:
+        module = frame.f_globals.get("__name__", "")
+        if module not in skipped and module.split(".", 1)[0] not in skipped:
+            return "%s:%d in %s" % (
+                frame.f_code.co_filename,
+                frame.f_lineno,
+                frame.f_code.co_name,
+            )
+        frame = frame.f_back
+    return ""
+
+
+class Instrumentation:
+    """Statement metrics and slow-query log of one engine"""
+
+    def __init__(
+        self,
+        engine: Engine,
+        slow_threshold: float = DEFAULT_SLOW_THRESHOLD,
+        explain: bool = False,
+        slow_log_size: int = DEFAULT_SLOW_LOG_SIZE,
+        call_sites: bool = True,
+        helper_modules: Iterable[str] = DEFAULT_HELPER_MODULES,
+    ) -> None:
+        """Create the instrumentation, call attach to start recording
+
+        :param engine: Engine to instrument
+        :param slow_threshold: Seconds above which a statement is logged as slow
+        :param explain: Capture the EXPLAIN plan of slow selects
+        :param slow_log_size: Number of slow statements kept
+        :param call_sites: Record the code issuing each statement
+        :param helper_modules: Modules skipped for the call site, as a library
+        """
+        self.engine: Final[Engine] = engine
+        """Instrumented engine"""
+
+        self.slow_threshold: float = slow_threshold
+        """Seconds above which a statement is logged as slow"""
+
+        self.explain: bool = explain
+        """Capture the EXPLAIN plan of slow selects"""
+
+        self.call_sites: bool = call_sites
+        """Record the code issuing each statement"""
+
+        self.helper_modules: Final[FrozenSet[str]] = frozenset(helper_modules)
+        """Modules whose callers are recorded as the call site"""
+
+        self._stats: Dict[str, StatementStats] = {}
+        self._slow: Deque[SlowQuery] = deque(maxlen=slow_log_size)
+        self._fingerprints: Dict[str, str] = {}
+        self._lock: threading.Lock = threading.Lock()
+
+    def fingerprint(self, statement: str) -> StatementStats:
+        """Metrics entry of a statement, created on first use
+
+        :param statement: SQL statement as executed
+        :return: Metrics of its fingerprint
+        """
+        digest = self._fingerprints.get(statement)
+        if digest is None:
+            normalized = normalize(statement)
+            digest = hashlib.sha1(normalized.encode()).hexdigest()[:16]
+            if len(self._fingerprints) >= _FINGERPRINT_CACHE_SIZE:
+                self._fingerprints.clear()
+            self._fingerprints[statement] = digest
+            with self._lock:
+                self._stats.setdefault(digest, StatementStats(digest, normalized))
+        return self._stats[digest]
+
+    def _start(self, conn, clauseelement, multiparams, params, execution_options):
+        conn.info[_EXECUTE_START] = time.perf_counter()
+
+    def _before(self, conn, cursor, statement, parameters, context, executemany):
+        context._instrumentation_start = time.perf_counter()
+
+    def _after(self, conn, cursor, statement, parameters, context, executemany):
+        seconds = time.perf_counter() - context._instrumentation_start
+        stats = self.fingerprint(statement)
+        call_site = (
+            _call_site(_LIBRARY_PACKAGES | self.helper_modules)
+            if self.call_sites
+            else ""
+        )
+        slow = seconds >= self.slow_threshold
+        with self._lock:
+            stats.calls += 1
+            stats.seconds_total += seconds
+            stats.seconds_max = max(stats.seconds_max, seconds)
+            stats.call_site = call_site
+            self._count_compile(conn, context, stats)
+            if cursor.description is None:
+                stats.rows += max(cursor.rowcount, 0)
+            if slow:
+                stats.slow += 1
+        if cursor.description is not None and context.cursor is cursor:
+            context.cursor = _CountingCursor(cursor, stats, self._lock)
+        if slow:
+            plan = (
+                self._plan(conn, statement, parameters)
+                if self.explain and not executemany
+                else []
+            )
+            with self._lock:
+                self._slow.append(
+                    SlowQuery(
+                        stats.fingerprint,
+                        statement,
+                        repr(parameters)[:500],
+                        seconds,
+                        call_site,
+                        datetime.now().isoformat(timespec="milliseconds"),
+                        plan,
+                    )
+                )
+
+    @staticmethod
+    def _count_compile(conn, context, stats: StatementStats) -> None:
+        """Add a compiled cache hit or miss to the statement metrics
+
+        On a miss the compile time runs from the start of the execution to
+        the end of the compilation.
+
+        :param conn: Connection that ran the statement
+        :param context: Execution context
+        :param stats: Metrics of the statement
+        :return: None
+        """
+        compiled = context.compiled
+        if compiled is None:
+            return
+        if context.cache_hit is CACHE_HIT:
+            stats.cache_hits += 1
+        elif context.cache_hit is CACHE_MISS:
+            stats.cache_misses += 1
+            start = conn.info.get(_EXECUTE_START)
+            if start is not None and compiled._gen_time >= start:
+                stats.compile_seconds += compiled._gen_time - start
+
+    def _plan(self, conn, statement: str, parameters) -> List[str]:
+        """EXPLAIN output of a select, on a raw cursor of the same connection
+
+        :param conn: Connection that ran the statement
+        :param statement: SQL statement as executed
+        :param parameters: Bound parameters as executed
+        :return: Plan rows, empty if the statement or dialect is not explained
+        """
+        prefix = _EXPLAIN_PREFIXES.get(conn.dialect.name)
+        if prefix is None or not re.match(r"\s*(SELECT|WITH)\b", statement, re.I):
+            return []
+        cursor = conn.connection.dbapi_connection.cursor()
+        try:
+            cursor.execute(prefix + statement, parameters)
+            return [
+                " | ".join(str(value) for value in row) for row in cursor.fetchall()
+            ]
+        except Exception as error:
+            return ["EXPLAIN failed: %s" % error]
+        finally:
+            cursor.close()
+
+    def attach(self) -> "Instrumentation":
+        """Start recording the statements of the engine
+
+        :return: The instrumentation
+        """
+        if not event.contains(self.engine, "before_cursor_execute", self._before):
+            event.listen(self.engine, "before_execute", self._start)
+            event.listen(self.engine, "before_cursor_execute", self._before)
+            event.listen(self.engine, "after_cursor_execute", self._after)
+        return self
+
+    def detach(self) -> None:
+        """Stop recording, the metrics are kept
+
+        :return: None
+        """
+        if event.contains(self.engine, "before_cursor_execute", self._before):
+            event.remove(self.engine, "before_execute", self._start)
+            event.remove(self.engine, "before_cursor_execute", self._before)
+            event.remove(self.engine, "after_cursor_execute", self._after)
+
+    def reset(self) -> None:
+        """Forget every metric and slow statement
+
+        :return: None
+        """
+        with self._lock:
+            self._stats.clear()
+            self._slow.clear()
+            self._fingerprints.clear()
+
+    def statements(self, by: str = "seconds_total", limit: Optional[int] = None):
+        """Metrics of the statements, hottest first
+
+        :param by: StatementStats attribute to sort on
+        :param limit: Maximum number of statements, all if None
+        :return: Copies of the metrics
+        """
+        with self._lock:
+            stats = [replace(entry) for entry in self._stats.values() if entry.calls]
+        stats.sort(key=lambda entry: getattr(entry, by), reverse=True)
+        return stats if limit is None else stats[:limit]
+
+    def slow_queries(self) -> List[SlowQuery]:
+        """Slow-query log, oldest first
+
+        :return: Slow statements
+        """
+        with self._lock:
+            return list(self._slow)
+
+    def to_json(self) -> str:
+        """Metrics and slow-query log as JSON
+
+        :return: JSON document
+        """
+        return json.dumps(
+            {
+                "statements": [
+                    {
+                        **asdict(entry),
+                        "seconds_mean": entry.seconds_mean,
+                        "cache_hit_ratio": entry.cache_hit_ratio,
+                        "compile_seconds_saved": entry.compile_seconds_saved,
+                    }
+                    for entry in self.statements()
+                ],
+                "slow_queries": [asdict(query) for query in self.slow_queries()],
+            },
+            indent=2,
+        )
+
+    def to_prometheus(self, prefix: str = "sql_statement") -> str:
+        """Metrics in the Prometheus text exposition format
+
+        :param prefix: Prefix of the metric names
+        :return: Exposition text
+        """
+        metrics = (
+            ("calls_total", "counter", "Number of executions", "calls"),
+            ("seconds_total", "counter", "Total wall time", "seconds_total"),
+            ("seconds_max", "gauge", "Slowest execution", "seconds_max"),
+            ("rows_total", "counter", "Rows fetched or affected", "rows"),
+            ("slow_total", "counter", "Executions above the threshold", "slow"),
+            ("cache_hits_total", "counter", "Compiled cache hits", "cache_hits"),
+            ("cache_misses_total", "counter", "Compiled cache misses", "cache_misses"),
+            (
+                "compile_seconds_total",
+                "counter",
+                "Compile time of the misses",
+                "compile_seconds",
+            ),
+            (
+                "compile_seconds_saved_total",
+                "counter",
+                "Compile time saved by the hits",
+                "compile_seconds_saved",
+            ),
+        )
+        statements = self.statements()
+        lines: List[str] = []
+        for suffix, kind, description, attribute in metrics:
+            name = "%s_%s" % (prefix, suffix)
+            lines.append("# HELP %s %s" % (name, description))
+            lines.append("# TYPE %s %s" % (name, kind))
+            for entry in statements:
+                lines.append(
+                    '%s{fingerprint="%s"} %s'
+                    % (name, entry.fingerprint, _number(getattr(entry, attribute)))
+                )
+        return "\n".join(lines) + "\n"
+
+
+def _number(value: Any) -> str:
+    """Prometheus representation of a metric value"""
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def instrument(engine: Engine, **kwargs) -> Instrumentation:
+    """Attach a new instrumentation to an engine
+
+    :param engine: Engine to instrument
+    :param kwargs: Settings of the Instrumentation
+    :return: Attached instrumentation
+    """
+    return Instrumentation(engine, **kwargs).attach()
@@ -0,0 +1,250 @@
+"""Bulk loading of the bank database with batched Core inserts"""
+
+import itertools
+import re
+import time
+from contextlib import contextmanager, nullcontext
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, Final, Iterable, Iterator, List, Mapping, Union
+
+from sqlalchemy import Connection, Engine, insert, select, text
+
+from model import Base
+
+DEFAULT_BATCH_SIZE: Final[int] = 5_000
+"""Number of rows sent per executemany call"""
+
+EXAMPLE_SCRIPT: Final[Path] = Path(__file__).parent / "LearningSQLExample.sql"
+"""Example MySQL schema and data of the book"""
+
+_INSERT_TABLE_PATTERN: Final[re.Pattern] = re.compile(
+    r"^\s*insert\s+into\s+`?(\w+)`?", re.IGNORECASE
+)
+"""Pattern matching the target table of an insert statement"""
+
+Row = Mapping[str, object]
+"""A row to insert, keyed by column name"""
+
+
+@dataclass
+class TableLoadStats:
+    """Load statistics of a single table"""
+
+    table: str
+    """Name of the loaded table"""
+
+    rows: int = 0
+    """Number of rows inserted"""
+
+    seconds: float = 0.0
+    """Time spent inserting the rows"""
+
+    @property
+    def rows_per_second(self) -> float:
+        """Insert throughput of the table"""
+        return self.rows / self.seconds if self.seconds > 0 else 0.0
+
+    def __repr__(self) -> str:
+        return (
+            "TableLoadStats(table=%s, rows=%d, seconds=%.3f, rows_per_second=%.0f)"
+            % (
+                self.table,
+                self.rows,
+                self.seconds,
+                self.rows_per_second,
+            )
+        )
+
+
+@contextmanager
+def foreign_key_checks_disabled(connection: Connection) -> Iterator[None]:
+    """Suspend foreign key checks on a connection for the duration of a load
+
+    MySQL checks are switched off and back on for the session. SQLite checks
+    are deferred until the transaction commits. Other dialects are unchanged.
+
+    :param connection: Connection used by the load
+    :return: Context manager
+    """
+    dialect = connection.dialect.name
+    if dialect == "mysql":
+        connection.execute(text("SET FOREIGN_KEY_CHECKS = 0"))
+    elif dialect == "sqlite":
+        connection.execute(text("PRAGMA defer_foreign_keys = ON"))
+    try:
+        yield
+    finally:
+        if dialect == "mysql":
+            connection.execute(text("SET FOREIGN_KEY_CHECKS = 1"))
+
+
+def batched(rows: Iterable[Row], batch_size: int) -> Iterator[List[Row]]:
+    """Split rows into lists of at most batch_size rows
+
+    :param rows: Rows to split, consumed lazily
+    :param batch_size: Maximum number of rows per batch
+    :return: Iterator over the batches
+    """
+    if batch_size < 1:
+        raise ValueError("batch_size must be positive, got %d" % batch_size)
+    iterator = iter(rows)
+    while batch := list(itertools.islice(iterator, batch_size)):
+        yield batch
+
+
+def load_rows(
+    connection: Connection,
+    table_name: str,
+    rows: Iterable[Row],
+    batch_size: int = DEFAULT_BATCH_SIZE,
+) -> TableLoadStats:
+    """Insert rows into a single table in executemany batches
+
+    :param connection: Connection within an open transaction
+    :param table_name: Name of a table of the model
+    :param rows: Rows to insert, consumed lazily
+    :param batch_size: Number of rows per executemany call
+    :return: Load statistics of the table
+    """
+    table = Base.metadata.tables[table_name]
+    statement = insert(table).execution_options(insertmanyvalues_page_size=batch_size)
+    stats = TableLoadStats(table=table_name)
+    start = time.perf_counter()
+    for batch in batched(rows, batch_size):
+        # executemany needs the same keys in every row, missing ones are NULL
+        keys = set().union(*batch)
+        if any(len(row) != len(keys) for row in batch):
+            batch = [{key: row.get(key) for key in keys} for row in batch]
+        connection.execute(statement, batch)
+        stats.rows += len(batch)
+    stats.seconds = time.perf_counter() - start
+    return stats
+
+
+def bulk_load(
+    engine: Engine,
+    rows_by_table: Mapping[str, Iterable[Row]],
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    disable_fk_checks: bool = True,
+) -> List[TableLoadStats]:
+    """Load rows into the tables of the model in foreign key dependency order
+
+    All tables are loaded in a single transaction.
+
+    :param engine: Database engine
+    :param rows_by_table: Rows to insert keyed by table name, consumed lazily
+    :param batch_size: Number of rows per executemany call
+    :param disable_fk_checks: Suspend foreign key checks during the load
+    :return: Load statistics, one per loaded table in load order
+    """
+    unknown = set(rows_by_table) - set(Base.metadata.tables)
+    if unknown:
+        raise KeyError("Unknown tables: %s" % ", ".join(sorted(unknown)))
+
+    results: List[TableLoadStats] = []
+    with engine.begin() as connection:
+        with (
+            foreign_key_checks_disabled(connection)
+            if disable_fk_checks
+            else nullcontext()
+        ):
+            for table in Base.metadata.sorted_tables:
+                if table.name in rows_by_table:
+                    results.append(
+                        load_rows(
+                            connection,
+                            table.name,
+                            rows_by_table[table.name],
+                            batch_size,
+                        )
+                    )
+    return results
+
+
+def copy_tables(
+    source: Engine,
+    target: Engine,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+) -> List[TableLoadStats]:
+    """Copy every table of the model from one database to another
+
+    The source tables are streamed, so memory use does not grow with their size.
+    The target tables must exist and be empty.
+
+    :param source: Engine of the database to read
+    :param target: Engine of the database to load
+    :param batch_size: Number of rows per executemany call
+    :return: Load statistics, one per table in load order
+    """
+    with source.connect().execution_options(
+        stream_results=True, yield_per=batch_size
+    ) as connection:
+        return bulk_load(
+            target,
+            {
+                table.name: _stream_rows(connection, table.name, batch_size)
+                for table in Base.metadata.sorted_tables
+            },
+            batch_size=batch_size,
+        )
+
+
+def _stream_rows(
+    connection: Connection, table_name: str, batch_size: int
+) -> Iterator[Row]:
+    """Stream the rows of a table, the query runs on first iteration
+
+    :param connection: Connection to read from
+    :param table_name: Name of a table of the model
+    :param batch_size: Number of rows fetched at a time
+    :return: Iterator over the rows
+    """
+    statement = select(Base.metadata.tables[table_name])
+    for row in connection.execute(statement).yield_per(batch_size):
+        yield row._asdict()
+
+
+def split_sql_script(script: str) -> List[str]:
+    """Split a SQL script into statements, dropping its comments
+
+    :param script: SQL script text
+    :return: Non-empty statements, without their terminating semicolon
+    """
+    script = re.sub(r"/\*.*?\*/", "", script, flags=re.DOTALL)
+    script = re.sub(r"^\s*--.*$", "", script, flags=re.MULTILINE)
+    return [
+        statement.strip()
+        for statement in re.split(r";\s*$", script, flags=re.MULTILINE)
+        if statement.strip()
+    ]
+
+
+def load_sql_script(
+    engine: Engine,
+    path: Union[str, Path] = EXAMPLE_SCRIPT,
+) -> List[TableLoadStats]:
+    """Run a SQL script, such as LearningSQLExample.sql, on a single connection
+
+    The statements share one transaction with foreign key checks suspended,
+    instead of being committed one at a time.
+
+    :param engine: Database engine
+    :param path: Path of the SQL script
+    :return: Insert statistics, one per table in first insert order
+    """
+    results: Dict[str, TableLoadStats] = {}
+    with engine.begin() as connection:
+        with foreign_key_checks_disabled(connection):
+            for statement in split_sql_script(Path(path).read_text()):
+                start = time.perf_counter()
+                result = connection.exec_driver_sql(statement)
+                match = _INSERT_TABLE_PATTERN.match(statement)
+                if match is None:
+                    continue
+                stats = results.setdefault(
+                    match.group(1), TableLoadStats(table=match.group(1))
+                )
+                stats.rows += max(result.rowcount, 0)
+                stats.seconds += time.perf_counter() - start
+    return list(results.values())
@@ -0,0 +1,153 @@
+"""Named eager-loading profiles for the relationships of the model
+
+Every relationship of the model lazy loads, so walking a customer's accounts
+and their transactions emits one query per object. A profile is the set of
+loader options a traversal needs, applied to its statement up front::
+
+    statement = with_profile(select(Customer), "customer_statement")
+
+assert_max_statements guards a traversal against falling back to lazy loads.
+"""
+
+from contextlib import contextmanager
+from typing import Dict, Final, Iterator, List, Tuple, Union
+
+from sqlalchemy import Connection, Engine, event
+from sqlalchemy.orm import (
+    Session,
+    joinedload,
+    raiseload,
+    selectinload,
+)
+from sqlalchemy.orm.interfaces import ORMOption
+from sqlalchemy.sql.selectable import Select as SQLSelect
+
+from model import (
+    Account,
+    Branch,
+    Customer,
+    Department,
+    Employee,
+    Product,
+    Transaction,
+)
+
+LOADING_PROFILES: Final[Dict[str, Tuple[ORMOption, ...]]] = {
+    "customer_statement": (
+        joinedload(Customer.customer_officer),
+        selectinload(Customer.customer_accounts).joinedload(Account.account_product),
+        selectinload(Customer.customer_accounts).selectinload(
+            Account.account_transactions
+        ),
+    ),
+    "account_detail": (
+        joinedload(Account.account_customer),
+        joinedload(Account.account_product).joinedload(Product.product_product_type),
+        joinedload(Account.account_open_branch),
+        selectinload(Account.account_transactions),
+    ),
+    "transaction_detail": (
+        joinedload(Transaction.transaction_account),
+        joinedload(Transaction.transaction_teller),
+        joinedload(Transaction.transaction_branch),
+    ),
+    "org_chart": (
+        selectinload(Employee.superior_emp, recursion_depth=-1),
+        joinedload(Employee.employee_dept),
+        joinedload(Employee.employee_branch),
+    ),
+    "branch_roster": (
+        selectinload(Branch.branch_employees).joinedload(Employee.employee_dept),
+    ),
+    "department_roster": (
+        selectinload(Department.dept_employees).joinedload(Employee.employee_branch),
+    ),
+}
+"""Loader options of each profile, keyed by profile name"""
+
+
+def loading_profile(name: str, strict: bool = False) -> Tuple[ORMOption, ...]:
+    """Loader options of a profile
+
+    :param name: Profile name, a key of LOADING_PROFILES
+    :param strict: Raise on any relationship the profile does not load
+    :return: Loader options
+    """
+    try:
+        options = LOADING_PROFILES[name]
+    except KeyError:
+        raise KeyError(
+            "Unknown loading profile %r, expected one of: %s"
+            % (name, ", ".join(sorted(LOADING_PROFILES)))
+        ) from None
+    return (*options, raiseload("*")) if strict else options
+
+
+def with_profile(statement: SQLSelect, name: str, strict: bool = False) -> SQLSelect:
+    """Apply a loading profile to a select statement
+
+    :param statement: Select of the profile's root entity
+    :param name: Profile name, a key of LOADING_PROFILES
+    :param strict: Raise on any relationship the profile does not load
+    :return: Select statement with the loader options
+    """
+    return statement.options(*loading_profile(name, strict))
+
+
+@contextmanager
+def count_statements(bind: Union[Engine, Connection, Session]) -> Iterator[List[str]]:
+    """Record the SQL statements emitted while the context is open
+
+    Only an engine is watched as a whole. A connection records its own
+    statements, and a session those of the connections of its transactions,
+    so other threads and sessions on the same engine are not counted.
+
+    :param bind: Engine, connection or session to watch
+    :return: Context manager of the list of recorded statements
+    """
+    statements: List[str] = []
+    watched: List[Union[Engine, Connection]] = []
+
+    def record(conn, cursor, statement, parameters, context, executemany) -> None:
+        statements.append(statement)
+
+    def watch(target: Union[Engine, Connection]) -> None:
+        if not any(target is other for other in watched):
+            event.listen(target, "before_cursor_execute", record)
+            watched.append(target)
+
+    def begin(session: Session, transaction, connection: Connection) -> None:
+        watch(connection)
+
+    if isinstance(bind, Session):
+        if bind.in_transaction():
+            watch(bind.connection())
+        event.listen(bind, "after_begin", begin)
+    else:
+        watch(bind)
+    try:
+        yield statements
+    finally:
+        if isinstance(bind, Session):
+            event.remove(bind, "after_begin", begin)
+        for target in watched:
+            event.remove(target, "before_cursor_execute", record)
+
+
+@contextmanager
+def assert_max_statements(
+    bind: Union[Engine, Connection, Session], maximum: int
+) -> Iterator[List[str]]:
+    """Fail if a traversal emits more than a number of SQL statements
+
+    :param bind: Engine, connection or session to watch
+    :param maximum: Maximum number of statements allowed
+    :return: Context manager of the list of recorded statements
+    """
+    with count_statements(bind) as statements:
+        yield statements
+    if len(statements) > maximum:
+        raise AssertionError(
+            "Expected at most %d statements, %d were emitted:\n%s"
+            % (maximum, len(statements), "\n".join(statements))
+        )
@@ -1,13 +1,52 @@
-"""Model for the bank business"""
-
-from .account import Account, AccountStatusEnum
-from .branch import Branch
-from .business import Business
-from .customer import Customer, CustomerTypeEnum
-from .department import Department
-from .employee import Employee
-from .individual import Individual
-from .officer import Officer
-from .product import Product
-from .producttype import ProductType
-from .transaction import Transaction, TransactionTypeEnum
+"""Model for the bank business
+
+Classes are imported on first access, so ``from model import
+TransactionTypeEnum`` does not import SQLAlchemy. Accessing ``Base`` or any
+mapped class imports every mapped class, as their relationships refer to each
+other.
+"""
+
+# typing is not imported, it takes longer to import than the enumerations
+import importlib
+
+_ENUMS = {
+    "AccountStatusEnum": "enums",
+    "CustomerTypeEnum": "enums",
+    "TransactionTypeEnum": "enums",
+}
+"""Enumerations, keyed by name, with their module"""
+
+_MAPPED = {
+    "Account": "account",
+    "Base": "base",
+    "Branch": "branch",
+    "Business": "business",
+    "Customer": "customer",
+    "Department": "department",
+    "Employee": "employee",
+    "Individual": "individual",
+    "Officer": "officer",
+    "PolymorphicCustomer": "polymorphic",
+    "Product": "product",
+    "ProductType": "producttype",
+    "Transaction": "transaction",
+    "configure": "base",
+}
+"""Mapped classes and mapper helpers, keyed by name, with their module"""
+
+__all__ = sorted({**_ENUMS, **_MAPPED})
+
+
+def __getattr__(name: str):
+    module = _ENUMS.get(name) or _MAPPED.get(name)
+    if module is None:
+        raise AttributeError("module %r has no attribute %r" % (__name__, name))
+    if name in _MAPPED:
+        importlib.import_module(".base", __name__).import_models()
+    value = getattr(importlib.import_module("." + module, __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
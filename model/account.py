@@ -1,26 +1,13 @@
 """An account of the bank"""
-import enum
 from datetime import date
 from typing import Final, Optional, List
 
-from sqlalchemy import Date
+from sqlalchemy import Date, Index
 from sqlalchemy import Enum, ForeignKey, Float
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
 from .base import Base
-
-
-class AccountStatusEnum(enum.Enum):
-    """Account status values"""
-
-    ACTIVE = "ACTIVE"
-    """Account is open and active"""
-
-    CLOSED = "CLOSED"
-    """Account is closed and inactive"""
-
-    FROZEN = "FROZEN"
-    """Account has been frozen due to something"""
+from .enums import AccountStatusEnum
 
 
 class Account(Base):
@@ -29,6 +16,14 @@ class Account(Base):
     __tablename__: Final[str] = "account"
     """Table name for the associated object"""
 
+    __table_args__: Final[tuple] = (
+        Index("ix_account_cust_id_status", "cust_id", "status"),
+        Index("ix_account_open_branch_id", "open_branch_id"),
+        Index("ix_account_product_cd", "product_cd"),
+        Index("ix_account_open_emp_id", "open_emp_id"),
+    )
+    """Indexes for the customer, branch and product predicates"""
+
     account_id: Mapped[int] = mapped_column(primary_key=True)
     """Account ID, primary key"""
 
@@ -1,9 +1,60 @@
 """Declarative base model for the SQLalchemy ORM"""
 
-from sqlalchemy.orm import DeclarativeBase
+import importlib
+from typing import Final, Tuple
 
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncAttrs
+from sqlalchemy.orm import DeclarativeBase, Mapper, configure_mappers
 
-class Base(DeclarativeBase):
-    """Base class for all declarative objects"""
+MODEL_MODULES: Final[Tuple[str, ...]] = (
+    "account",
+    "branch",
+    "business",
+    "customer",
+    "department",
+    "employee",
+    "individual",
+    "officer",
+    "product",
+    "producttype",
+    "transaction",
+)
+"""Modules of the mapped classes, relative to the package"""
+
+
+class Base(AsyncAttrs, DeclarativeBase):
+    """Base class for all declarative objects
+
+    With an AsyncSession, relationships are loaded by awaiting them through
+    ``awaitable_attrs``, e.g. ``await customer.awaitable_attrs.customer_accounts``.
+    """
 
     pass
+
+
+def import_models() -> None:
+    """Import every mapped class, completing the relationships and the metadata
+
+    :return: None
+    """
+    for name in MODEL_MODULES:
+        importlib.import_module("." + name, __package__)
+
+
+def configure() -> None:
+    """Import and configure every mapper, e.g. in a parent process before fork
+
+    Forked workers then inherit the configured mappers instead of each
+    configuring them on first use.
+
+    :return: None
+    """
+    import_models()
+    configure_mappers()
+
+
+@event.listens_for(Mapper, "before_configured")
+def _import_before_configure() -> None:
+    # Relationships name their target class, which may not be imported yet
+    import_models()
@@ -1,14 +1,15 @@
 """A business customer for the bank"""
 from datetime import date
-from typing import Final, Optional
+from typing import Any, Dict, Final, Optional
 
 from sqlalchemy import String, ForeignKey, Date
 from sqlalchemy.orm import Mapped, mapped_column
 
-from .base import Base
+from .customer import Customer
+from .enums import CustomerTypeEnum
 
 
-class Business(Base):
+class Business(Customer):
     """A business customer for the bank"""
 
     __tablename__: Final[str] = "business"
@@ -28,6 +29,16 @@ class Business(Base):
     incorp_date: Mapped[Optional[date]] = mapped_column(Date, nullable=True)
     """Incorporation date of the business, nullable"""
 
+    __mapper_args__: Final[Dict[str, Any]] = {
+        "polymorphic_identity": CustomerTypeEnum.B,
+    }
+    """Customers of type B"""
+
+    @property
+    def display_name(self) -> str:
+        """Name of the business"""
+        return self.name
+
     def __repr__(self) -> str:
         return "Business(cust_id=%d, name=%s, state_id=%s, incorp_date=%s)" % (
             self.cust_id,
@@ -1,21 +1,18 @@
-"""A generalized customer of the bank, either an individual or business"""
-import enum
-from typing import Final, Optional, List
+"""A generalized customer of the bank, either an individual or business
+
+Individual and Business are joined-table subclasses of Customer, told apart
+by cust_type_cd. Loading Customer returns Individual and Business instances
+whose own columns load on first access, while loading
+model.PolymorphicCustomer outer joins both subclass tables and fetches every
+column in a single statement.
+"""
+from typing import Any, Dict, Final, Optional, List
 
 from sqlalchemy import String, Enum
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
 from .base import Base
-
-
-class CustomerTypeEnum(enum.Enum):
-    """Customer type as either individual 'I' or business 'B'"""
-
-    I = "I"
-    """Individual customer of the bank"""
-
-    B = "B"
-    """Business customer of the bank"""
+from .enums import CustomerTypeEnum
 
 
 class Customer(Base):
@@ -57,6 +54,16 @@ class Customer(Base):
     )
     """Pointer to an officer, if exists. Else none"""
 
+    __mapper_args__: Final[Dict[str, Any]] = {
+        "polymorphic_on": "cust_type_cd",
+    }
+    """Subclass discriminated on the customer type"""
+
+    @property
+    def display_name(self) -> str:
+        """Name of the customer, its federal ID without a subclass"""
+        return self.fed_id
+
     def __repr__(self) -> str:
         return (
             "Customer(cust_id=%d, fed_id=%s, cust_type_cd=%s, address=%s"
@@ -2,7 +2,7 @@
 from datetime import date
 from typing import Final, Optional, List
 
-from sqlalchemy import String, Date, ForeignKey
+from sqlalchemy import String, Date, ForeignKey, Index
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
 from .base import Base
@@ -14,6 +14,13 @@ class Employee(Base):
     __tablename__: Final[str] = "employee"
     """Table name for the associated object"""
 
+    __table_args__: Final[tuple] = (
+        Index("ix_employee_superior_emp_id", "superior_emp_id"),
+        Index("ix_employee_assigned_branch_id", "assigned_branch_id"),
+        Index("ix_employee_dept_id", "dept_id"),
+    )
+    """Indexes for the superior, branch and department predicates"""
+
     emp_id: Mapped[int] = mapped_column(primary_key=True)
     """Employee ID, primary key"""
 
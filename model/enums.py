@@ -0,0 +1,35 @@
+"""Enumerations of the model, importable without SQLAlchemy"""
+import enum
+
+
+class AccountStatusEnum(enum.Enum):
+    """Account status values"""
+
+    ACTIVE = "ACTIVE"
+    """Account is open and active"""
+
+    CLOSED = "CLOSED"
+    """Account is closed and inactive"""
+
+    FROZEN = "FROZEN"
+    """Account has been frozen due to something"""
+
+
+class CustomerTypeEnum(enum.Enum):
+    """Customer type as either individual 'I' or business 'B'"""
+
+    I = "I"
+    """Individual customer of the bank"""
+
+    B = "B"
+    """Business customer of the bank"""
+
+
+class TransactionTypeEnum(enum.Enum):
+    """Transaction type as either credit 'CDT' or debit 'DBT'"""
+
+    CDT = "CDT"
+    """Credit type transition"""
+
+    DBT = "DBT"
+    """Debit type transaction"""
@@ -1,14 +1,15 @@
 """An individual customer of the bank"""
 from datetime import date
-from typing import Final, Optional, List
+from typing import Any, Dict, Final, Optional, List
 
 from sqlalchemy import String, Date, ForeignKey
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
-from .base import Base
+from .customer import Customer
+from .enums import CustomerTypeEnum
 
 
-class Individual(Base):
+class Individual(Customer):
     """An individual customer of the bank"""
 
     __tablename__: Final[str] = "individual"
@@ -28,6 +29,16 @@ class Individual(Base):
     birth_date: Mapped[Optional[date]] = mapped_column(Date, nullable=True)
     """Start date of the employee, non-nullable"""
 
+    __mapper_args__: Final[Dict[str, Any]] = {
+        "polymorphic_identity": CustomerTypeEnum.I,
+    }
+    """Customers of type I"""
+
+    @property
+    def display_name(self) -> str:
+        """Name of the individual"""
+        return "%s %s" % (self.fname, self.lname)
+
     def __repr__(self) -> str:
         return "Individual(cust_id=%s, fname=%s, lname=%s, birthdate=%s)" % (
             self.cust_id,
@@ -2,7 +2,7 @@
 from datetime import date
 from typing import Final, Optional
 
-from sqlalchemy import String, Date, ForeignKey
+from sqlalchemy import String, Date, ForeignKey, Index
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
 from .base import Base
@@ -14,6 +14,9 @@ class Officer(Base):
     __tablename__: Final[str] = "officer"
     """Table name for the associated object"""
 
+    __table_args__: Final[tuple] = (Index("ix_officer_cust_id", "cust_id"),)
+    """Index for the customer predicate"""
+
     officer_id: Mapped[int] = mapped_column(primary_key=True)
     """Officer ID, primary key"""
 
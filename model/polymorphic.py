@@ -0,0 +1,17 @@
+"""Customers loaded with their individual or business columns"""
+from typing import Final
+
+from sqlalchemy.orm import with_polymorphic
+from sqlalchemy.orm.util import AliasedClass
+
+from .business import Business
+from .customer import Customer
+from .individual import Individual
+
+PolymorphicCustomer: Final[AliasedClass] = with_polymorphic(
+    Customer, [Individual, Business]
+)
+"""Customer entity outer joining the individual and business tables, so
+``select(PolymorphicCustomer)`` returns fully loaded Individual and Business
+instances in a single statement, and ``PolymorphicCustomer.Individual.lname``
+filters on a subclass column"""
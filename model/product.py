@@ -2,7 +2,7 @@
 from datetime import date
 from typing import Final, Optional, List
 
-from sqlalchemy import String, ForeignKey, Date
+from sqlalchemy import String, ForeignKey, Date, Index
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
 from .base import Base
@@ -14,6 +14,11 @@ class Product(Base):
     __tablename__: Final[str] = "product"
     """Table name for the associated object"""
 
+    __table_args__: Final[tuple] = (
+        Index("ix_product_product_type_cd", "product_type_cd"),
+    )
+    """Index for the product type predicate"""
+
     product_cd: Mapped[str] = mapped_column(String(10), primary_key=True)
     """Product code for the product, primary key"""
 
@@ -1,22 +1,12 @@
 """A transaction with the bank"""
-import enum
 from datetime import datetime
 from typing import Final, Optional
 
-from sqlalchemy import Enum, DateTime, ForeignKey, Double
+from sqlalchemy import Enum, DateTime, ForeignKey, Double, Index
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
 from .base import Base
-
-
-class TransactionTypeEnum(enum.Enum):
-    """Transaction type as either credit 'CDT' or debit 'DBT'"""
-
-    CDT = "CDT"
-    """Credit type transition"""
-
-    DBT = "DBT"
-    """Debit type transaction"""
+from .enums import TransactionTypeEnum
 
 
 class Transaction(Base):
@@ -25,6 +15,14 @@ class Transaction(Base):
     __tablename__: Final[str] = "transaction"
     """Table name for the associated object"""
 
+    __table_args__: Final[tuple] = (
+        Index("ix_transaction_account_id_txn_date", "account_id", "txn_date"),
+        Index("ix_transaction_txn_date", "txn_date"),
+        Index("ix_transaction_teller_emp_id", "teller_emp_id"),
+        Index("ix_transaction_execution_branch_id", "execution_branch_id"),
+    )
+    """Indexes for the account history and date range predicates"""
+
     txn_id: Mapped[int] = mapped_column(primary_key=True)
     """Transaction ID, primary key"""
 
@@ -0,0 +1,402 @@
+"""Management chains and subtrees of the Employee.superior_emp hierarchy
+
+Following Employee.superior_emp lazy loads one superior at a time. The
+functions below walk the hierarchy on the database with a recursive CTE, in a
+single round trip, and return flat rows with their depth::
+
+    chain = ancestors(session, 10)
+    tree = nest(descendants(session, 1, include_self=True))
+
+For very large hierarchies, the employee_closure table caches every
+(ancestor, descendant, depth) pair. It is created and filled by create_closure,
+kept in sync with Employee inserts, updates and deletes once
+enable_closure_sync is called, and read by passing closure=True.
+"""
+
+from dataclasses import dataclass, field
+from typing import Dict, Final, List, Optional, Sequence
+
+from sqlalchemy import (
+    Column,
+    Connection,
+    Engine,
+    Index,
+    Integer,
+    MetaData,
+    Table,
+    delete,
+    event,
+    func,
+    insert,
+    inspect,
+    literal,
+    select,
+)
+from sqlalchemy.orm import Mapper, Session, aliased
+from sqlalchemy.sql.selectable import CTE
+from sqlalchemy.sql.selectable import Select as SQLSelect
+
+from model import Employee
+
+MAX_DEPTH: Final[int] = 64
+"""Depth at which the recursion stops, guarding against superior cycles"""
+
+closure_metadata: Final[MetaData] = MetaData()
+"""Metadata of the closure table, kept apart from the model tables"""
+
+employee_closure: Final[Table] = Table(
+    "employee_closure",
+    closure_metadata,
+    Column("ancestor_id", Integer, primary_key=True),
+    Column("descendant_id", Integer, primary_key=True),
+    Column("depth", Integer, nullable=False),
+    Index("ix_employee_closure_descendant_id", "descendant_id"),
+)
+"""Every (ancestor, descendant) pair of the hierarchy, each employee being its own
+ancestor at depth 0"""
+
+
+@dataclass(frozen=True)
+class OrgChartRow:
+    """An employee of a chain or subtree"""
+
+    emp_id: int
+    """Employee ID"""
+
+    fname: str
+    """First name of the employee"""
+
+    lname: str
+    """Last name of the employee"""
+
+    title: Optional[str]
+    """Title of the employee"""
+
+    superior_emp_id: Optional[int]
+    """Superior of the employee, None for the top of the hierarchy"""
+
+    depth: int
+    """Distance to the employee the walk started from, or to the top for depths"""
+
+    def __repr__(self) -> str:
+        return "OrgChartRow(emp_id=%d, fname=%s, lname=%s, depth=%d)" % (
+            self.emp_id,
+            self.fname,
+            self.lname,
+            self.depth,
+        )
+
+
+@dataclass
+class OrgChartNode:
+    """An employee and their direct reports, for nested output"""
+
+    employee: OrgChartRow
+    """The employee"""
+
+    reports: List["OrgChartNode"] = field(default_factory=list)
+    """Direct reports of the employee present in the rows"""
+
+    def to_dict(self) -> dict:
+        """Nested plain dictionaries, e.g. for JSON
+
+        :return: Employee fields with a "reports" list
+        """
+        return {
+            "emp_id": self.employee.emp_id,
+            "fname": self.employee.fname,
+            "lname": self.employee.lname,
+            "title": self.employee.title,
+            "depth": self.employee.depth,
+            "reports": [report.to_dict() for report in self.reports],
+        }
+
+
+def _rows(session: Session, tree: CTE) -> List[OrgChartRow]:
+    """Employee fields of the employees of a walk
+
+    :param session: Session to run on
+    :param tree: Walk with emp_id and depth columns
+    :return: Rows ordered by depth then employee ID
+    """
+    statement = (
+        select(
+            Employee.emp_id,
+            Employee.fname,
+            Employee.lname,
+            Employee.title,
+            Employee.superior_emp_id,
+            tree.c.depth,
+        )
+        .join(tree, tree.c.emp_id == Employee.emp_id)
+        .order_by(tree.c.depth, Employee.emp_id)
+    )
+    return [OrgChartRow(*row) for row in session.execute(statement)]
+
+
+def _ancestor_cte(emp_id: int) -> CTE:
+    """Recursive walk up from an employee, the employee at depth 0"""
+    tree = (
+        select(Employee.emp_id, Employee.superior_emp_id, literal(0).label("depth"))
+        .where(Employee.emp_id == emp_id)
+        .cte("tree", recursive=True)
+    )
+    superior = aliased(Employee, name="superior")
+    return tree.union_all(
+        select(superior.emp_id, superior.superior_emp_id, tree.c.depth + 1).where(
+            superior.emp_id == tree.c.superior_emp_id, tree.c.depth < MAX_DEPTH
+        )
+    )
+
+
+def _descendant_cte(anchor: SQLSelect) -> CTE:
+    """Recursive walk down from the anchor employees, at depth 0"""
+    tree = anchor.cte("tree", recursive=True)
+    report = aliased(Employee, name="report")
+    return tree.union_all(
+        select(report.emp_id, tree.c.depth + 1).where(
+            report.superior_emp_id == tree.c.emp_id, tree.c.depth < MAX_DEPTH
+        )
+    )
+
+
+def _closure_cte(emp_id: int, up: bool) -> CTE:
+    """Walk read from the closure table"""
+    known, wanted = (
+        (employee_closure.c.descendant_id, employee_closure.c.ancestor_id)
+        if up
+        else (employee_closure.c.ancestor_id, employee_closure.c.descendant_id)
+    )
+    return (
+        select(wanted.label("emp_id"), employee_closure.c.depth)
+        .where(known == emp_id)
+        .cte("tree")
+    )
+
+
+def ancestors(
+    session: Session, emp_id: int, include_self: bool = False, closure: bool = False
+) -> List[OrgChartRow]:
+    """Management chain of an employee, from the direct superior to the top
+
+    :param session: Session to run on
+    :param emp_id: Employee ID
+    :param include_self: Include the employee at depth 0
+    :param closure: Read the closure table instead of walking the hierarchy
+    :return: Rows ordered by depth, 1 being the direct superior
+    """
+    tree = _closure_cte(emp_id, up=True) if closure else _ancestor_cte(emp_id)
+    rows = _rows(session, tree)
+    return rows if include_self else [row for row in rows if row.depth > 0]
+
+
+def descendants(
+    session: Session, emp_id: int, include_self: bool = False, closure: bool = False
+) -> List[OrgChartRow]:
+    """Subtree of the employees reporting directly or indirectly to an employee
+
+    :param session: Session to run on
+    :param emp_id: Employee ID
+    :param include_self: Include the employee at depth 0
+    :param closure: Read the closure table instead of walking the hierarchy
+    :return: Rows ordered by depth, 1 being the direct reports
+    """
+    tree = (
+        _closure_cte(emp_id, up=False)
+        if closure
+        else _descendant_cte(
+            select(Employee.emp_id, literal(0).label("depth")).where(
+                Employee.emp_id == emp_id
+            )
+        )
+    )
+    rows = _rows(session, tree)
+    return rows if include_self else [row for row in rows if row.depth > 0]
+
+
+def depths(session: Session) -> List[OrgChartRow]:
+    """Every employee with their depth below the top of the hierarchy
+
+    :param session: Session to run on
+    :return: Rows ordered by depth, 0 being the employees without superior
+    """
+    return _rows(
+        session,
+        _descendant_cte(
+            select(Employee.emp_id, literal(0).label("depth")).where(
+                Employee.superior_emp_id.is_(None)
+            )
+        ),
+    )
+
+
+def nest(rows: Sequence[OrgChartRow]) -> List[OrgChartNode]:
+    """Nest flat rows under their superiors
+
+    :param rows: Rows of a chain, subtree or depths
+    :return: Nodes of the rows whose superior is not in the rows
+    """
+    nodes: Dict[int, OrgChartNode] = {row.emp_id: OrgChartNode(row) for row in rows}
+    roots: List[OrgChartNode] = []
+    for node in nodes.values():
+        superior = nodes.get(node.employee.superior_emp_id)
+        (roots if superior is None else superior.reports).append(node)
+    return roots
+
+
+def rebuild_closure(connection: Connection) -> int:
+    """Refill the closure table from the hierarchy
+
+    :param connection: Connection, in the transaction of the caller
+    :return: Number of closure rows
+    """
+    tree = select(
+        Employee.emp_id.label("ancestor_id"),
+        Employee.emp_id.label("descendant_id"),
+        literal(0).label("depth"),
+    ).cte("tree", recursive=True)
+    report = aliased(Employee, name="report")
+    tree = tree.union_all(
+        select(tree.c.ancestor_id, report.emp_id, tree.c.depth + 1).where(
+            report.superior_emp_id == tree.c.descendant_id, tree.c.depth < MAX_DEPTH
+        )
+    )
+    connection.execute(delete(employee_closure))
+    connection.execute(
+        insert(employee_closure).from_select(
+            ["ancestor_id", "descendant_id", "depth"], select(tree)
+        )
+    )
+    return connection.execute(
+        select(func.count()).select_from(employee_closure)
+    ).scalar_one()
+
+
+def create_closure(engine: Engine) -> int:
+    """Create the closure table if needed and fill it
+
+    :param engine: Database engine
+    :return: Number of closure rows
+    """
+    closure_metadata.create_all(engine)
+    with engine.begin() as connection:
+        return rebuild_closure(connection)
+
+
+def _attach(connection: Connection, emp_id: int, superior_emp_id: int) -> None:
+    """Add the paths from the chain of a superior into the subtree of an employee"""
+    chain = connection.execute(
+        select(employee_closure.c.ancestor_id, employee_closure.c.depth).where(
+            employee_closure.c.descendant_id == superior_emp_id
+        )
+    ).all()
+    subtree = connection.execute(
+        select(employee_closure.c.descendant_id, employee_closure.c.depth).where(
+            employee_closure.c.ancestor_id == emp_id
+        )
+    ).all()
+    paths = [
+        {
+            "ancestor_id": ancestor_id,
+            "descendant_id": descendant_id,
+            "depth": up + down + 1,
+        }
+        for ancestor_id, up in chain
+        for descendant_id, down in subtree
+    ]
+    # No paths when the superior or the employee predates the sync, and an
+    # empty executemany would insert a single row of NULLs
+    if paths:
+        connection.execute(insert(employee_closure), paths)
+
+
+def _detach(connection: Connection, emp_id: int) -> None:
+    """Remove the paths from outside the subtree of an employee into it"""
+    subtree = (
+        connection.execute(
+            select(employee_closure.c.descendant_id).where(
+                employee_closure.c.ancestor_id == emp_id
+            )
+        )
+        .scalars()
+        .all()
+    )
+    connection.execute(
+        delete(employee_closure).where(
+            employee_closure.c.descendant_id.in_(subtree),
+            employee_closure.c.ancestor_id.not_in(subtree),
+        )
+    )
+
+
+def _after_insert(mapper: Mapper, connection: Connection, target: Employee) -> None:
+    connection.execute(
+        insert(employee_closure).values(
+            ancestor_id=target.emp_id, descendant_id=target.emp_id, depth=0
+        )
+    )
+    if target.superior_emp_id is not None:
+        _attach(connection, target.emp_id, target.superior_emp_id)
+
+
+def _after_update(mapper: Mapper, connection: Connection, target: Employee) -> None:
+    if not inspect(target).attrs.superior_emp_id.history.has_changes():
+        return
+    superior = target.superior_emp_id
+    if superior is not None and (
+        superior == target.emp_id
+        or connection.execute(
+            select(employee_closure.c.descendant_id).where(
+                employee_closure.c.ancestor_id == target.emp_id,
+                employee_closure.c.descendant_id == superior,
+            )
+        ).first()
+    ):
+        raise ValueError(
+            "Employee %d cannot report to %d, who reports to it"
+            % (target.emp_id, superior)
+        )
+    _detach(connection, target.emp_id)
+    if superior is not None:
+        _attach(connection, target.emp_id, superior)
+
+
+def _after_delete(mapper: Mapper, connection: Connection, target: Employee) -> None:
+    connection.execute(
+        delete(employee_closure).where(
+            (employee_closure.c.ancestor_id == target.emp_id)
+            | (employee_closure.c.descendant_id == target.emp_id)
+        )
+    )
+
+
+_SYNC_LISTENERS: Final[dict] = {
+    "after_insert": _after_insert,
+    "after_update": _after_update,
+    "after_delete": _after_delete,
+}
+"""Mapper events keeping the closure table in sync with the Employee flushes"""
+
+
+def enable_closure_sync() -> None:
+    """Keep the closure table in sync with every Employee flush
+
+    Changes made outside the ORM are not tracked, call rebuild_closure after them.
+    A flush making an employee report to itself or to one of its reports
+    raises ValueError.
+
+    :return: None
+    """
+    for name, listener in _SYNC_LISTENERS.items():
+        if not event.contains(Employee, name, listener):
+            event.listen(Employee, name, listener)
+
+
+def disable_closure_sync() -> None:
+    """Stop syncing the closure table
+
+    :return: None
+    """
+    for name, listener in _SYNC_LISTENERS.items():
+        if event.contains(Employee, name, listener):
+            event.remove(Employee, name, listener)
@@ -0,0 +1,256 @@
+"""Keyset pagination of select statements with opaque continuation tokens
+
+OFFSET pagination reads and discards every row before the page, so each page
+costs more than the previous one. Keyset pagination remembers the ordering key
+of the last row seen and filters on it, so with an index on the key every
+page costs the same::
+
+    keys = (Transaction.txn_date, Transaction.txn_id)
+    page = paginate(session, select(Transaction), keys, page_size=100)
+    later = paginate(session, select(Transaction), keys, 100, page.next_token)
+    back = paginate(session, select(Transaction), keys, 100, later.previous_token)
+
+The keys must make the ordering unique, ending with a primary key is enough,
+and may be wrapped by desc(). Their values are taken from the selected
+columns, or from the entity of rows selecting a model class.
+"""
+
+import base64
+import enum
+import hashlib
+import json
+from dataclasses import dataclass
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Any, Iterator, List, Optional, Sequence, Tuple, Union
+
+from sqlalchemy import ColumnElement, Connection, Row, and_, or_
+from sqlalchemy.orm import Session
+from sqlalchemy.sql.selectable import Select as SQLSelect
+
+Executor = Union[Session, Connection]
+"""Where the pages are read"""
+
+_FORWARD = "f"
+_BACKWARD = "b"
+
+
+@dataclass(frozen=True)
+class Page:
+    """A page of rows and the tokens of its neighbours"""
+
+    rows: Sequence[Row]
+    """Rows of the page, in key order"""
+
+    next_token: Optional[str]
+    """Token of the following page, None on the last page"""
+
+    previous_token: Optional[str]
+    """Token of the preceding page, None on the first page"""
+
+
+def _key(clause: ColumnElement) -> Tuple[ColumnElement, bool]:
+    """Column and direction of an ordering key
+
+    :param clause: Column, optionally wrapped by asc() or desc()
+    :return: Column, True if descending
+    """
+    modifier = getattr(clause, "modifier", None)
+    if modifier is None:
+        return clause, False
+    return clause.element, modifier.__name__ == "desc_op"
+
+
+def _fingerprint(keys: Sequence[ColumnElement]) -> str:
+    """Short digest of the ordering keys, to reject tokens of another ordering"""
+    text = "|".join(
+        "%s %s" % (column, descending) for column, descending in map(_key, keys)
+    )
+    return hashlib.sha1(text.encode()).hexdigest()[:12]
+
+
+def _encode_value(value: Any) -> Any:
+    """JSON form of a key value"""
+    if isinstance(value, datetime):
+        return {"dt": value.isoformat()}
+    if isinstance(value, date):
+        return {"d": value.isoformat()}
+    if isinstance(value, Decimal):
+        return {"dec": str(value)}
+    if isinstance(value, enum.Enum):
+        return value.value
+    return value
+
+
+def _decode_value(value: Any) -> Any:
+    """Key value of its JSON form"""
+    if isinstance(value, dict):
+        if "dt" in value:
+            return datetime.fromisoformat(value["dt"])
+        if "d" in value:
+            return date.fromisoformat(value["d"])
+        if "dec" in value:
+            return Decimal(value["dec"])
+    return value
+
+
+def encode_token(
+    keys: Sequence[ColumnElement], values: Sequence[Any], direction: str
+) -> str:
+    """Opaque token of a position in the ordering
+
+    :param keys: Ordering keys
+    :param values: Key values of the row at the position
+    :param direction: "f" for the rows after the position, "b" for before
+    :return: URL-safe token
+    """
+    document = {
+        "k": _fingerprint(keys),
+        "d": direction,
+        "v": [_encode_value(value) for value in values],
+    }
+    raw = json.dumps(document, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_token(keys: Sequence[ColumnElement], token: str) -> Tuple[List[Any], str]:
+    """Position and direction of a token
+
+    :param keys: Ordering keys, the same the token was made with
+    :param token: Token of encode_token
+    :return: Key values, direction
+    """
+    try:
+        raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))
+        document = json.loads(raw)
+    except ValueError:
+        raise ValueError("Malformed pagination token") from None
+    if document.get("k") != _fingerprint(keys) or len(document["v"]) != len(keys):
+        raise ValueError("Pagination token of another ordering")
+    return [_decode_value(value) for value in document["v"]], document["d"]
+
+
+def _beyond(
+    keys: Sequence[ColumnElement], values: Sequence[Any], forward: bool
+) -> ColumnElement:
+    """Filter on the rows strictly after, or before, a position
+
+    The leading key is also bounded on its own, so an index range can be used.
+
+    :param keys: Ordering keys
+    :param values: Key values of the position
+    :param forward: Rows after the position if True, else before
+    :return: Filter expression
+    """
+    columns = [_key(clause) for clause in keys]
+
+    def past(column: ColumnElement, descending: bool, value: Any, strict: bool):
+        later = forward != descending
+        if strict:
+            return column > value if later else column < value
+        return column >= value if later else column <= value
+
+    alternatives = []
+    for index, (column, descending) in enumerate(columns):
+        equal = [columns[prior][0] == values[prior] for prior in range(index)]
+        alternatives.append(and_(*equal, past(column, descending, values[index], True)))
+    leading, descending = columns[0]
+    return and_(past(leading, descending, values[0], False), or_(*alternatives))
+
+
+def _ordering(keys: Sequence[ColumnElement], forward: bool) -> List[ColumnElement]:
+    """Order by clauses of the keys, reversed for backward pages"""
+    clauses = []
+    for column, descending in map(_key, keys):
+        clauses.append(column.desc() if descending == forward else column.asc())
+    return clauses
+
+
+def _values(row: Row, keys: Sequence[ColumnElement]) -> List[Any]:
+    """Key values of a row, from its columns or its entity
+
+    :param row: Result row
+    :param keys: Ordering keys
+    :return: Key values
+    """
+    values = []
+    for column, _ in map(_key, keys):
+        try:
+            values.append(row._mapping[column])
+        except KeyError:
+            values.append(getattr(row[0], column.key))
+    return values
+
+
+def paginate(
+    executor: Executor,
+    statement: SQLSelect,
+    keys: Sequence[ColumnElement],
+    page_size: int,
+    token: Optional[str] = None,
+) -> Page:
+    """Read one page of a select statement
+
+    Any ordering of the statement is replaced by the keys.
+
+    :param executor: Session or connection
+    :param statement: Select statement, with its filters
+    :param keys: Unique ordering keys, optionally wrapped by desc()
+    :param page_size: Maximum number of rows of the page
+    :param token: Token of a previous page, the first page if None
+    :return: Page
+    """
+    if page_size < 1:
+        raise ValueError("page_size must be positive, got %d" % page_size)
+    forward = True
+    statement = statement.order_by(None)
+    if token is not None:
+        values, direction = decode_token(keys, token)
+        forward = direction == _FORWARD
+        statement = statement.where(_beyond(keys, values, forward))
+    rows = list(
+        executor.execute(
+            statement.order_by(*_ordering(keys, forward)).limit(page_size + 1)
+        )
+    )
+    more = len(rows) > page_size
+    rows = rows[:page_size]
+    if not forward:
+        rows.reverse()
+    if not rows:
+        return Page(rows, None, None)
+
+    # Going forward there are rows before the page unless it is the first one,
+    # going backward there are rows after it, the page we came back from
+    has_next = more if forward else True
+    has_previous = token is not None if forward else more
+    return Page(
+        rows,
+        encode_token(keys, _values(rows[-1], keys), _FORWARD) if has_next else None,
+        encode_token(keys, _values(rows[0], keys), _BACKWARD) if has_previous else None,
+    )
+
+
+def iter_pages(
+    executor: Executor,
+    statement: SQLSelect,
+    keys: Sequence[ColumnElement],
+    page_size: int,
+    token: Optional[str] = None,
+) -> Iterator[Page]:
+    """Read the pages of a select statement forward, until the last one
+
+    :param executor: Session or connection
+    :param statement: Select statement, with its filters
+    :param keys: Unique ordering keys, optionally wrapped by desc()
+    :param page_size: Maximum number of rows per page
+    :param token: Token to start from, the first page if None
+    :return: Iterator over the pages
+    """
+    while True:
+        page = paginate(executor, statement, keys, page_size, token)
+        if page.rows:
+            yield page
+        if page.next_token is None:
+            return
+        token = page.next_token
@@ -0,0 +1,332 @@
+"""Batched posting of transactions and of their account balance changes
+
+Postings are validated, inserted with a Core executemany, and their balance
+changes applied with one set-based UPDATE of the accounts, per batch and in a
+single transaction::
+
+    result = post(engine, [Posting(1, TransactionTypeEnum.CDT, 100.0), ...])
+    print(result.posted, result.rejected)
+
+A credit adds its amount to the pending balance and a debit subtracts it. The
+available balance changes as well once the funds are available, when
+funds_avail_date is not after the posting time. A batch hitting a deadlock is
+rolled back and posted again.
+"""
+
+import math
+import random
+import time
+from collections import defaultdict
+from dataclasses import dataclass, field
+from datetime import date, datetime
+from typing import (
+    Dict,
+    Final,
+    FrozenSet,
+    Iterable,
+    List,
+    Mapping,
+    Optional,
+    Sequence,
+    Tuple,
+    Union,
+)
+
+from sqlalchemy import Connection, Engine, case, func, insert, select, update
+from sqlalchemy.exc import DBAPIError
+
+from loader import batched
+from model import Account, AccountStatusEnum, Transaction, TransactionTypeEnum
+
+DEFAULT_BATCH_SIZE: Final[int] = 5_000
+"""Number of postings per transaction"""
+
+MAX_UPDATE_ACCOUNTS: Final[int] = 500
+"""Accounts per balance UPDATE, bounds its number of bound parameters"""
+
+DEFAULT_MAX_RETRIES: Final[int] = 3
+"""Times a batch is posted again after a deadlock"""
+
+RETRY_BACKOFF: Final[float] = 0.05
+"""Seconds slept before the first retry, doubled for each following one"""
+
+POSTABLE_STATUSES: Final[FrozenSet[Optional[AccountStatusEnum]]] = frozenset(
+    (AccountStatusEnum.ACTIVE, None)
+)
+"""Account statuses accepting postings"""
+
+_DEADLOCK_CODES: Final[FrozenSet[Union[int, str]]] = frozenset(
+    (1205, 1213, "40001", "40P01")
+)
+"""MySQL error numbers and PostgreSQL SQLSTATEs of deadlocks and lock timeouts"""
+
+
+@dataclass(frozen=True)
+class Posting:
+    """A transaction to post"""
+
+    account_id: int
+    """Account of the transaction"""
+
+    txn_type_cd: Union[TransactionTypeEnum, str]
+    """Credit or debit, as the enumeration or its value"""
+
+    amount: float
+    """Positive amount of the transaction"""
+
+    txn_date: Optional[datetime] = None
+    """Date of the transaction, the posting time if None"""
+
+    funds_avail_date: Optional[datetime] = None
+    """Date the funds are available, txn_date if None"""
+
+    teller_emp_id: Optional[int] = None
+    """Teller who executed the transaction, if any"""
+
+    execution_branch_id: Optional[int] = None
+    """Branch where the transaction was executed, if any"""
+
+
+@dataclass(frozen=True)
+class Rejection:
+    """A posting failing validation"""
+
+    index: int
+    """Position of the posting in the input"""
+
+    posting: Posting
+    """Rejected posting"""
+
+    reason: str
+    """Why it was rejected"""
+
+
+@dataclass
+class PostingResult:
+    """Outcome of a post call"""
+
+    posted: int = 0
+    """Number of transactions inserted"""
+
+    rejected: List[Rejection] = field(default_factory=list)
+    """Postings failing validation, not inserted"""
+
+    batches: int = 0
+    """Number of committed batches"""
+
+    retries: int = 0
+    """Number of batches posted again after a deadlock"""
+
+    seconds: float = 0.0
+    """Time spent posting"""
+
+    @property
+    def rows_per_second(self) -> float:
+        """Posting throughput"""
+        return self.posted / self.seconds if self.seconds > 0 else 0.0
+
+
+class PostingError(ValueError):
+    """Postings failing validation in strict mode"""
+
+    def __init__(self, rejections: Sequence[Rejection]) -> None:
+        self.rejections: Final[Sequence[Rejection]] = rejections
+        """Postings failing validation"""
+
+        first = rejections[0]
+        super().__init__(
+            "%d postings rejected, first at index %d: %s"
+            % (len(rejections), first.index, first.reason)
+        )
+
+
+@dataclass
+class _Delta:
+    """Balance changes of one account in a batch"""
+
+    avail: float = 0.0
+    pending: float = 0.0
+    last_activity: Optional[date] = None
+
+
+def is_deadlock(error: DBAPIError) -> bool:
+    """Whether a database error is a deadlock or lock timeout, worth a retry
+
+    :param error: Error raised by the execution
+    :return: True if the transaction can be retried
+    """
+    original = error.orig
+    codes = {
+        getattr(original, "errno", None),
+        getattr(original, "sqlstate", None),
+        getattr(original, "pgcode", None),
+    }
+    args = getattr(original, "args", ())
+    if args:
+        codes.add(args[0])
+    return bool(codes & _DEADLOCK_CODES) or "database is locked" in str(original)
+
+
+def _check(
+    posting: Posting, statuses: Mapping[int, Optional[AccountStatusEnum]]
+) -> Tuple[Optional[TransactionTypeEnum], str]:
+    """Transaction type of a posting, or why it is rejected
+
+    :param posting: Posting to validate
+    :param statuses: Status of the accounts of the batch
+    :return: Transaction type and "", or None and the rejection reason
+    """
+    try:
+        txn_type = TransactionTypeEnum(posting.txn_type_cd)
+    except ValueError:
+        return None, "unknown transaction type %r" % (posting.txn_type_cd,)
+    try:
+        amount = float(posting.amount)
+    except (TypeError, ValueError):
+        amount = math.nan
+    if not (math.isfinite(amount) and amount > 0):
+        return None, "amount %r is not a positive number" % (posting.amount,)
+    if posting.account_id not in statuses:
+        return None, "unknown account %r" % posting.account_id
+    status = statuses[posting.account_id]
+    if status not in POSTABLE_STATUSES:
+        return None, "account %d is %s" % (posting.account_id, status.value)
+    return txn_type, ""
+
+
+def _apply_deltas(connection: Connection, deltas: Mapping[int, _Delta]) -> None:
+    """Add the balance changes to the accounts, one UPDATE per account chunk
+
+    :param connection: Connection within the posting transaction
+    :param deltas: Balance changes, keyed by account ID
+    :return: None
+    """
+    table = Account.__table__
+    account_ids = sorted(deltas)
+    for start in range(0, len(account_ids), MAX_UPDATE_ACCOUNTS):
+        chunk = account_ids[start : start + MAX_UPDATE_ACCOUNTS]
+        avail = {key: deltas[key].avail for key in chunk if deltas[key].avail}
+        pending = {key: deltas[key].pending for key in chunk}
+        activity = case(
+            {key: deltas[key].last_activity for key in chunk},
+            value=table.c.account_id,
+        )
+        values = {
+            "pending_balance": func.coalesce(table.c.pending_balance, 0)
+            + case(pending, value=table.c.account_id),
+            "last_activity_date": case(
+                (table.c.last_activity_date.is_(None), activity),
+                (table.c.last_activity_date < activity, activity),
+                else_=table.c.last_activity_date,
+            ),
+        }
+        if avail:
+            values["avail_balance"] = func.coalesce(table.c.avail_balance, 0) + case(
+                avail, value=table.c.account_id, else_=0
+            )
+        connection.execute(
+            update(table).where(table.c.account_id.in_(chunk)).values(values)
+        )
+
+
+def post_batch(
+    connection: Connection,
+    postings: Sequence[Tuple[int, Posting]],
+    now: datetime,
+) -> Tuple[int, List[Rejection]]:
+    """Validate and post a batch in the current transaction of a connection
+
+    :param connection: Connection within an open transaction
+    :param postings: Postings with their position in the input
+    :param now: Posting time
+    :return: Number of inserted transactions, rejected postings
+    """
+    account_ids = sorted({posting.account_id for _, posting in postings})
+    # Lock the accounts in key order, so concurrent batches queue up instead
+    # of deadlocking
+    statuses = dict(
+        connection.execute(
+            select(Account.account_id, Account.status)
+            .where(Account.account_id.in_(account_ids))
+            .order_by(Account.account_id)
+            .with_for_update()
+        ).all()
+    )
+    rows: List[dict] = []
+    rejections: List[Rejection] = []
+    deltas: Dict[int, _Delta] = defaultdict(_Delta)
+    for index, posting in postings:
+        txn_type, reason = _check(posting, statuses)
+        if txn_type is None:
+            rejections.append(Rejection(index, posting, reason))
+            continue
+        amount = float(posting.amount)
+        txn_date = posting.txn_date or now
+        funds_avail_date = posting.funds_avail_date or txn_date
+        rows.append(
+            {
+                "txn_date": txn_date,
+                "account_id": posting.account_id,
+                "txn_type_cd": txn_type,
+                "amount": amount,
+                "teller_emp_id": posting.teller_emp_id,
+                "execution_branch_id": posting.execution_branch_id,
+                "funds_avail_date": funds_avail_date,
+            }
+        )
+        signed = amount if txn_type is TransactionTypeEnum.CDT else -amount
+        delta = deltas[posting.account_id]
+        delta.pending += signed
+        if funds_avail_date <= now:
+            delta.avail += signed
+        if delta.last_activity is None or txn_date.date() > delta.last_activity:
+            delta.last_activity = txn_date.date()
+    if rows:
+        connection.execute(insert(Transaction.__table__), rows)
+        _apply_deltas(connection, deltas)
+    return len(rows), rejections
+
+
+def post(
+    engine: Engine,
+    postings: Iterable[Union[Posting, Mapping]],
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    strict: bool = False,
+    max_retries: int = DEFAULT_MAX_RETRIES,
+    now: Optional[datetime] = None,
+) -> PostingResult:
+    """Post transactions in batches, each in its own database transaction
+
+    :param engine: Database engine
+    :param postings: Postings, or mappings of the Posting fields, consumed lazily
+    :param batch_size: Number of postings per transaction
+    :param strict: Raise PostingError and roll the batch back on any rejection
+    :param max_retries: Times a batch is posted again after a deadlock
+    :param now: Posting time, the current time if None
+    :return: Numbers of posted and rejected postings
+    """
+    now = now or datetime.now()
+    result = PostingResult()
+    start = time.perf_counter()
+    numbered = (
+        (index, posting if isinstance(posting, Posting) else Posting(**posting))
+        for index, posting in enumerate(postings)
+    )
+    for batch in batched(numbered, batch_size):
+        for attempt in range(max_retries + 1):
+            try:
+                with engine.begin() as connection:
+                    posted, rejections = post_batch(connection, batch, now)
+                    if strict and rejections:
+                        raise PostingError(rejections)
+                break
+            except DBAPIError as error:
+                if attempt == max_retries or not is_deadlock(error):
+                    raise
+                result.retries += 1
+                time.sleep(RETRY_BACKOFF * 2**attempt * (1 + random.random()))
+        result.posted += posted
+        result.rejected.extend(rejections)
+        result.batches += 1
+    result.seconds = time.perf_counter() - start
+    return result
@@ -0,0 +1,328 @@
+"""Registry of named, parameterized queries of the notebooks
+
+Each query is built once from the model classes, with ``bindparam``
+placeholders for its values, so the statement is never rebuilt or rewritten
+as text. Executions share the compiled form from the compiled cache of the
+engine, and the values reach the driver as bound parameters::
+
+    accounts = execute(session, "customer_accounts", cust_id=1).all()
+    df = read_sql("accounts_left_join_individuals", engine)
+
+With ``instrumentation.instrument(engine)`` the cache hits, misses and the
+compile time they saved are reported per statement.
+
+Drivers that prepare statements on the server are configured with
+prepared_connect_args, the other ones still reuse the compiled statement.
+"""
+
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, Dict, Final, FrozenSet, Optional, Union
+
+import pandas as pd
+from sqlalchemy import (
+    URL,
+    BindParameter,
+    Connection,
+    Engine,
+    Executable,
+    Result,
+    StatementLambdaElement,
+    Table,
+    bindparam,
+    func,
+    lambda_stmt,
+    make_url,
+    select,
+)
+from sqlalchemy.orm import Session, aliased
+from sqlalchemy.sql import visitors
+
+from model import (
+    Account,
+    Branch,
+    Business,
+    Employee,
+    Individual,
+    Product,
+    Transaction,
+    TransactionTypeEnum,
+)
+
+Executor = Union[Session, Connection]
+"""Where the queries are executed"""
+
+SQLITE_CACHED_STATEMENTS: Final[int] = 256
+"""Prepared statements kept per SQLite connection, the sqlite3 default is 128"""
+
+PREPARED_CONNECT_ARGS: Final[Dict[str, Dict[str, Any]]] = {
+    "pysqlite": {"cached_statements": SQLITE_CACHED_STATEMENTS},
+    "psycopg": {"prepare_threshold": 1},
+    "asyncpg": {"prepared_statement_cache_size": 500},
+}
+"""Connect arguments enabling prepared statements, keyed by DBAPI driver"""
+
+
+@dataclass(frozen=True)
+class NamedQuery:
+    """A registered query and its parameters"""
+
+    name: str
+    """Name of the query in the registry"""
+
+    statement: Executable
+    """Statement, with bindparam placeholders"""
+
+    description: str
+    """What the query returns"""
+
+    parameters: FrozenSet[str]
+    """Names of the placeholders, required at execution"""
+
+
+QUERIES: Dict[str, NamedQuery] = {}
+"""Registered queries, keyed by name"""
+
+
+def _placeholders(statement: Executable) -> FrozenSet[str]:
+    """Names of the bindparam placeholders of a statement without a value"""
+    return frozenset(
+        element.key
+        for element in visitors.iterate(statement)
+        if isinstance(element, BindParameter) and element.required
+    )
+
+
+def register(name: str, statement: Executable, description: str) -> NamedQuery:
+    """Add a query to the registry
+
+    :param name: Unique name of the query
+    :param statement: Statement, with bindparam placeholders for its values
+    :param description: What the query returns
+    :return: Registered query
+    """
+    if name in QUERIES:
+        raise ValueError("Query %r is already registered" % name)
+    query = NamedQuery(name, statement, description, _placeholders(statement))
+    QUERIES[name] = query
+    return query
+
+
+def get(name: str) -> NamedQuery:
+    """Registered query of a name
+
+    :param name: Name of the query
+    :return: Registered query
+    """
+    try:
+        return QUERIES[name]
+    except KeyError:
+        raise KeyError(
+            "Unknown query %r, expected one of %s" % (name, sorted(QUERIES))
+        ) from None
+
+
+def _parameters(query: NamedQuery, params: Dict[str, Any]) -> Dict[str, Any]:
+    """Check the values given for the placeholders of a query"""
+    missing = query.parameters - params.keys()
+    unknown = params.keys() - query.parameters
+    if missing or unknown:
+        raise TypeError(
+            "Query %r takes %s, missing %s, unknown %s"
+            % (query.name, sorted(query.parameters), sorted(missing), sorted(unknown))
+        )
+    return params
+
+
+def execute(executor: Executor, name: str, **params) -> Result:
+    """Execute a registered query
+
+    :param executor: Session or connection
+    :param name: Name of the query
+    :param params: Values of its placeholders
+    :return: Result of the execution
+    """
+    query = get(name)
+    return executor.execute(query.statement, _parameters(query, params))
+
+
+def read_sql(name: str, con: Union[Engine, Connection], **params) -> pd.DataFrame:
+    """Execute a registered query into a DataFrame
+
+    :param name: Name of the query
+    :param con: Engine or connection
+    :param params: Values of its placeholders
+    :return: Rows of the query
+    """
+    query = get(name)
+    return pd.read_sql_query(query.statement, con, params=_parameters(query, params))
+
+
+def transactions_of_account(
+    executor: Executor,
+    account_id: int,
+    start: datetime,
+    end: datetime,
+    txn_type: Optional[TransactionTypeEnum] = None,
+) -> Result:
+    """Transactions of an account in a period, optionally of one type
+
+    The optional filter changes the statement, so it is built as a lambda
+    statement: each shape is cached once and the values stay bound.
+
+    :param executor: Session or connection
+    :param account_id: Account ID
+    :param start: Start of the period, inclusive
+    :param end: End of the period, exclusive
+    :param txn_type: Transaction type, any if None
+    :return: Result of Transaction entities, in txn_date order
+    """
+    statement: StatementLambdaElement = lambda_stmt(
+        lambda: select(Transaction).order_by(Transaction.txn_date, Transaction.txn_id)
+    )
+    statement += lambda s: s.where(
+        Transaction.account_id == account_id,
+        Transaction.txn_date >= start,
+        Transaction.txn_date < end,
+    )
+    if txn_type is not None:
+        statement += lambda s: s.where(Transaction.txn_type_cd == txn_type)
+    return executor.execute(statement)
+
+
+def prepared_connect_args(url: Union[URL, str]) -> Dict[str, Any]:
+    """Connect arguments enabling server-side or driver prepared statements
+
+    Pass them to the engine, e.g. ``get_engine(url, connect_args=...)``. The
+    MySQL drivers do not prepare statements through SQLAlchemy, they get none.
+
+    :param url: Database URL
+    :return: Connect arguments, empty if the driver has none
+    """
+    url = make_url(url)
+    return dict(PREPARED_CONNECT_ARGS.get(url.get_driver_name(), {}))
+
+
+# ch03, ch04: filtering on bound values
+register(
+    "customer_accounts",
+    select(Account)
+    .where(Account.cust_id == bindparam("cust_id"))
+    .order_by(Account.account_id),
+    "Accounts of a customer",
+)
+register(
+    "employees_started_between",
+    select(Employee.emp_id, Employee.fname, Employee.lname, Employee.start_date)
+    .where(Employee.start_date.between(bindparam("start"), bindparam("end")))
+    .order_by(Employee.start_date),
+    "Employees hired in a period, inclusive",
+)
+register(
+    "accounts_of_products",
+    select(Account.account_id, Account.product_cd, Account.avail_balance)
+    .where(Account.product_cd.in_(bindparam("product_cds", expanding=True)))
+    .order_by(Account.account_id),
+    "Accounts of a list of products",
+)
+
+# ch05: inner joins
+register(
+    "branch_tellers",
+    select(Employee.emp_id, Employee.fname, Employee.lname, Branch.name)
+    .join(Branch, Employee.assigned_branch_id == Branch.branch_id)
+    .where(Employee.title == bindparam("title"))
+    .order_by(Employee.emp_id),
+    "Employees of a title with their branch name",
+)
+
+# ch08: grouping
+register(
+    "customers_with_accounts",
+    select(Account.cust_id, func.count().label("num_accounts"))
+    .group_by(Account.cust_id)
+    .having(func.count() >= bindparam("min_accounts"))
+    .order_by(Account.cust_id),
+    "Customers with at least a number of accounts",
+)
+
+# ch09: transactions of a day
+register(
+    "transactions_between",
+    select(
+        Transaction.txn_id,
+        Transaction.account_id,
+        Transaction.txn_date,
+        Transaction.txn_type_cd,
+        Transaction.amount,
+    )
+    .where(Transaction.txn_date >= bindparam("start"))
+    .where(Transaction.txn_date < bindparam("end"))
+    .order_by(Transaction.txn_date, Transaction.txn_id),
+    "Transactions of a period, start inclusive and end exclusive",
+)
+
+# ch10: outer joins, a statement per direction instead of rewriting the text
+register(
+    "products_left_join_accounts",
+    select(Product.product_cd, Account.account_id, Account.cust_id)
+    .outerjoin(Account, Product.product_cd == Account.product_cd)
+    .order_by(Product.product_cd, Account.account_id),
+    "Every product with its accounts, if any",
+)
+
+_individual: Final[Table] = Individual.__table__
+"""Individual table alone, the Individual entity also selects from customer"""
+
+_business: Final[Table] = Business.__table__
+"""Business table alone, the Business entity also selects from customer"""
+
+register(
+    "accounts_left_join_individuals",
+    select(
+        Account.account_id, Account.cust_id, _individual.c.fname, _individual.c.lname
+    )
+    .outerjoin(_individual, Account.cust_id == _individual.c.cust_id)
+    .order_by(Account.account_id),
+    "Every account with the name of its customer, NULL for businesses",
+)
+register(
+    "accounts_right_join_individuals",
+    select(
+        Account.account_id, Account.cust_id, _individual.c.fname, _individual.c.lname
+    )
+    .select_from(_individual)
+    .outerjoin(Account, Account.cust_id == _individual.c.cust_id)
+    .order_by(Account.account_id),
+    "Every individual customer with their accounts, if any",
+)
+register(
+    "account_customer_names",
+    select(
+        Account.account_id,
+        Account.cust_id,
+        _individual.c.fname,
+        _individual.c.lname,
+        _business.c.name.label("business_name"),
+    )
+    .outerjoin(_individual, Account.cust_id == _individual.c.cust_id)
+    .outerjoin(_business, Account.cust_id == _business.c.cust_id)
+    .order_by(Account.account_id),
+    "Every account with its individual or business customer name",
+)
+_superior = aliased(Employee, name="e_sup")
+register(
+    "superiors_right_join_employees",
+    select(
+        Employee.fname.label("e_fname"),
+        Employee.lname.label("e_lname"),
+        Employee.title.label("e_title"),
+        _superior.fname.label("s_fname"),
+        _superior.lname.label("s_lname"),
+        _superior.title.label("s_title"),
+    )
+    .select_from(_superior)
+    .outerjoin(Employee, Employee.superior_emp_id == _superior.emp_id)
+    .order_by(_superior.lname, _superior.fname),
+    "Every employee with their subordinates, if any",
+)
@@ -0,0 +1,261 @@
+"""Session routing writes to a primary database and reads to replicas
+
+RoutingSession picks the engine of each statement in get_bind: flushes, DML
+and SELECT ... FOR UPDATE go to the primary, plain selects to a replica chosen
+by a load-balancing policy::
+
+    Session = routing_sessionmaker(primary, [replica_1, replica_2])
+    with Session() as session:
+        accounts = session.scalars(select(Account)).all()   # a replica
+        accounts[0].avail_balance += 10
+        session.commit()                                    # the primary
+
+After a write the session reads from the primary until the end of the
+transaction and for pin_seconds after it, so it reads its own writes despite
+the replication lag. A replica raising a connection error is taken out of the
+rotation for a cooldown and the reads fall back to the primary when no
+replica is left. The statement that hit the error still raises.
+
+Locally, two SQLite files stand in for the primary and a replica, the replica
+being a copy of the primary.
+"""
+
+import itertools
+import random
+import threading
+import time
+from typing import (
+    AbstractSet,
+    Callable,
+    Dict,
+    Final,
+    FrozenSet,
+    List,
+    Optional,
+    Sequence,
+)
+
+from sqlalchemy import Engine, event
+from sqlalchemy.orm import Session, sessionmaker
+from sqlalchemy.sql import Delete, Insert, Select, Update
+
+DEFAULT_PIN_SECONDS: Final[float] = 5.0
+"""Seconds a session keeps reading from the primary after a committed write"""
+
+DEFAULT_COOLDOWN: Final[float] = 30.0
+"""Seconds a failing replica is left out of the rotation"""
+
+CONNECTION_ERROR_CODES: Final[FrozenSet[int]] = frozenset(
+    {1040, 1053, 2002, 2003, 2006, 2013, 2055}
+)
+"""MySQL error numbers of a refused, failed or lost connection
+
+Too many connections, server shutdown, cannot connect, server gone away and
+lost connection. SQLAlchemy already flags most lost connections as
+disconnects, but not the failures to connect.
+"""
+
+Policy = Callable[[Sequence[Engine]], Engine]
+"""Load-balancing policy, picks one of the healthy replicas"""
+
+
+class RoundRobinPolicy:
+    """Pick the replicas in turn"""
+
+    def __init__(self) -> None:
+        self._counter = itertools.count()
+        self._lock: Final[threading.Lock] = threading.Lock()
+
+    def __call__(self, replicas: Sequence[Engine]) -> Engine:
+        with self._lock:
+            index = next(self._counter)
+        return replicas[index % len(replicas)]
+
+
+def random_policy(replicas: Sequence[Engine]) -> Engine:
+    """Pick a replica at random
+
+    :param replicas: Healthy replicas
+    :return: Chosen replica
+    """
+    return random.choice(replicas)
+
+
+def _error_code(exception: BaseException) -> Optional[int]:
+    """Error code of a DBAPI exception, None if it has none
+
+    :param exception: Exception raised by the driver
+    :return: errno of mysql-connector, else the first argument if an integer
+    """
+    code = getattr(exception, "errno", None)
+    if code is None and exception.args and isinstance(exception.args[0], int):
+        code = exception.args[0]
+    return code
+
+
+class ReplicaSet:
+    """Replica engines, their health and the policy choosing among them"""
+
+    def __init__(
+        self,
+        replicas: Sequence[Engine],
+        policy: Optional[Policy] = None,
+        cooldown: float = DEFAULT_COOLDOWN,
+        error_codes: AbstractSet[int] = CONNECTION_ERROR_CODES,
+    ) -> None:
+        """Watch the connection errors of the replicas
+
+        Errors of the statements themselves, e.g. an unknown column, leave the
+        replica in the rotation.
+
+        :param replicas: Replica engines
+        :param policy: Load-balancing policy, round robin if None
+        :param cooldown: Seconds a failing replica is left out of the rotation
+        :param error_codes: Driver error codes of a failed or lost connection
+        """
+        self.replicas: Final[List[Engine]] = list(replicas)
+        """Replica engines"""
+
+        self.policy: Policy = policy if policy is not None else RoundRobinPolicy()
+        """Load-balancing policy"""
+
+        self.cooldown: float = cooldown
+        """Seconds a failing replica is left out of the rotation"""
+
+        self.error_codes: Final[AbstractSet[int]] = error_codes
+        """Driver error codes of a connection failure"""
+
+        self._down_until: Dict[Engine, float] = {}
+        self._lock: Final[threading.Lock] = threading.Lock()
+        for replica in self.replicas:
+            event.listen(replica, "handle_error", self._on_error)
+
+    def _on_error(self, context) -> None:
+        code = _error_code(context.original_exception)
+        if context.is_disconnect or code in self.error_codes:
+            self.mark_down(context.engine)
+
+    def mark_down(self, replica: Engine) -> None:
+        """Leave a replica out of the rotation for the cooldown
+
+        :param replica: Failing replica
+        :return: None
+        """
+        with self._lock:
+            self._down_until[replica] = time.monotonic() + self.cooldown
+
+    def healthy(self) -> List[Engine]:
+        """Replicas in the rotation, the ones past their cooldown are back
+
+        :return: Healthy replicas
+        """
+        now = time.monotonic()
+        with self._lock:
+            return [
+                replica
+                for replica in self.replicas
+                if self._down_until.get(replica, 0.0) <= now
+            ]
+
+    def choose(self) -> Optional[Engine]:
+        """Replica for the next read transaction
+
+        :return: A healthy replica, None if there is none
+        """
+        healthy = self.healthy()
+        return self.policy(healthy) if healthy else None
+
+
+class RoutingSession(Session):
+    """Session sending writes to the primary and plain reads to the replicas"""
+
+    def __init__(
+        self,
+        primary: Engine,
+        replicas: Optional[ReplicaSet] = None,
+        pin_seconds: float = DEFAULT_PIN_SECONDS,
+        **kwargs,
+    ) -> None:
+        """Create the session, without a bind of its own
+
+        :param primary: Engine of the primary database
+        :param replicas: Replica engines, all reads go to the primary if None
+        :param pin_seconds: Seconds of primary reads after a committed write
+        :param kwargs: Other arguments of Session
+        """
+        super().__init__(**kwargs)
+        self.primary: Final[Engine] = primary
+        """Engine of the primary database"""
+
+        self.replicas: Optional[ReplicaSet] = replicas
+        """Replica engines and their policy"""
+
+        self.pin_seconds: float = pin_seconds
+        """Seconds of primary reads after a committed write"""
+
+        self._replica: Optional[Engine] = None
+        self._wrote: bool = False
+        self._pinned_until: float = 0.0
+        event.listen(self, "after_transaction_end", self._end_transaction)
+
+    def _end_transaction(self, session: Session, transaction) -> None:
+        if transaction.parent is not None:
+            return
+        if self._wrote:
+            self._pinned_until = time.monotonic() + self.pin_seconds
+        self._wrote = False
+        self._replica = None
+
+    @property
+    def pinned(self) -> bool:
+        """Whether the reads go to the primary after a recent write"""
+        return self._wrote or time.monotonic() < self._pinned_until
+
+    def get_bind(self, mapper=None, clause=None, **kwargs) -> Engine:
+        """Engine of a statement, the primary for writes and locking reads
+
+        :param mapper: Mapper of the statement, if any
+        :param clause: Statement, if any
+        :param kwargs: Other arguments of Session.get_bind
+        :return: Primary or replica engine
+        """
+        if self._flushing or isinstance(clause, (Insert, Update, Delete)):
+            self._wrote = True
+            return self.primary
+        if (
+            self.replicas is None
+            or not isinstance(clause, Select)
+            or clause._for_update_arg is not None
+            or self.pinned
+        ):
+            return self.primary
+        if self._replica is None or self._replica not in self.replicas.healthy():
+            self._replica = self.replicas.choose()
+        return self._replica if self._replica is not None else self.primary
+
+
+def routing_sessionmaker(
+    primary: Engine,
+    replicas: Sequence[Engine] = (),
+    policy: Optional[Policy] = None,
+    pin_seconds: float = DEFAULT_PIN_SECONDS,
+    cooldown: float = DEFAULT_COOLDOWN,
+    **kwargs,
+) -> sessionmaker:
+    """Factory of routing sessions sharing the same replica set
+
+    :param primary: Engine of the primary database
+    :param replicas: Replica engines
+    :param policy: Load-balancing policy, round robin if None
+    :param pin_seconds: Seconds of primary reads after a committed write
+    :param cooldown: Seconds a failing replica is left out of the rotation
+    :param kwargs: Other arguments of the sessions
+    :return: Session factory
+    """
+    return sessionmaker(
+        class_=RoutingSession,
+        primary=primary,
+        replicas=ReplicaSet(replicas, policy, cooldown) if replicas else None,
+        pin_seconds=pin_seconds,
+        **kwargs,
+    )
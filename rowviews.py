@@ -0,0 +1,124 @@
+"""Read-only row views of the model classes
+
+Loading ORM instances costs an identity map entry, an instance state and
+attribute instrumentation per object, even when the code only reads a few
+columns. A row view is a tuple subclass generated from the mapping of a model
+class, with the same attribute names and the same ``__repr__`` as the model,
+built straight from the Core rows of the query::
+
+    for account in fetch_views(engine, Account, Account.cust_id == 1):
+        print(account.account_id, account.avail_balance)
+
+Views are not attached to any session, have no relationships and cannot be
+modified.
+"""
+
+from operator import itemgetter
+from typing import Dict, Iterator, List, Optional, Sequence, Type
+
+from sqlalchemy import ColumnElement, inspect, select
+from sqlalchemy.sql.selectable import Select as SQLSelect
+
+from model import Base
+from streaming import DEFAULT_CHUNKSIZE, BatchSizer, Connectable, stream_rows
+
+_views: Dict[Type[Base], Type[tuple]] = {}
+"""Generated view classes, keyed by model class"""
+
+
+def _as_dict(self) -> Dict[str, object]:
+    """Column values keyed by attribute name
+
+    :return: Column values
+    """
+    return dict(zip(self._fields, self))
+
+
+def _make(cls: Type[tuple], values: Sequence) -> tuple:
+    """Build a view from the column values of a row
+
+    :param values: Column values, in the order of the view fields
+    :return: View
+    """
+    return tuple.__new__(cls, values)
+
+
+def view_class(model: Type[Base]) -> Type[tuple]:
+    """Row view class of a model class, generated on first use
+
+    :param model: Model class, e.g. Account
+    :return: Tuple subclass named after the model, e.g. AccountView
+    """
+    view = _views.get(model)
+    if view is None:
+        fields = tuple(attribute.key for attribute in inspect(model).column_attrs)
+        namespace = {
+            "__slots__": (),
+            "__doc__": "Read-only row of %s" % model.__name__,
+            "__repr__": model.__repr__,
+            "_fields": fields,
+            "_model": model,
+            "_make": classmethod(_make),
+            "as_dict": _as_dict,
+        }
+        for index, field in enumerate(fields):
+            namespace[field] = property(itemgetter(index))
+        view = type("%sView" % model.__name__, (tuple,), namespace)
+        _views[model] = view
+    return view
+
+
+def view_statement(model: Type[Base]) -> SQLSelect:
+    """Select of the columns of a model class, in the order of its view fields
+
+    :param model: Model class
+    :return: Select statement, to filter and order further
+    """
+    return select(*(getattr(model, field) for field in view_class(model)._fields))
+
+
+def iter_views(
+    connectable: Connectable,
+    model: Type[Base],
+    *criteria: ColumnElement,
+    order_by: Sequence[ColumnElement] = (),
+    limit: Optional[int] = None,
+    chunksize: int = DEFAULT_CHUNKSIZE,
+) -> Iterator[tuple]:
+    """Stream row views on a server-side cursor
+
+    :param connectable: Engine, connection or session
+    :param model: Model class
+    :param criteria: Filters, combined with AND
+    :param order_by: Ordering of the rows
+    :param limit: Maximum number of rows, all if None
+    :param chunksize: Rows per fetch
+    :return: Iterator over the views
+    """
+    make = view_class(model)._make
+    statement = view_statement(model).where(*criteria).order_by(*order_by)
+    if limit is not None:
+        statement = statement.limit(limit)
+    for rows in stream_rows(connectable, statement, sizer=BatchSizer(chunksize)):
+        yield from map(make, rows)
+
+
+def fetch_views(
+    connectable: Connectable,
+    model: Type[Base],
+    *criteria: ColumnElement,
+    order_by: Sequence[ColumnElement] = (),
+    limit: Optional[int] = None,
+) -> List[tuple]:
+    """Load row views
+
+    :param connectable: Engine, connection or session
+    :param model: Model class
+    :param criteria: Filters, combined with AND
+    :param order_by: Ordering of the rows
+    :param limit: Maximum number of rows, all if None
+    :return: Views of the rows
+    """
+    return list(
+        iter_views(connectable, model, *criteria, order_by=order_by, limit=limit)
+    )
@@ -0,0 +1,134 @@
+"""Schema creation and index checks for the bank model"""
+
+import enum
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import Engine, Index, inspect
+
+from model import Base
+
+
+class IndexStatusEnum(enum.Enum):
+    """How a declared index compares with the live database"""
+
+    PRESENT = "PRESENT"
+    """Declared on the model and present on the database"""
+
+    MISSING = "MISSING"
+    """Declared on the model but absent from the database"""
+
+    UNDECLARED = "UNDECLARED"
+    """Present on the database but not declared on the model"""
+
+
+@dataclass(frozen=True)
+class IndexReportRow:
+    """A single index of the report"""
+
+    table: str
+    """Table name of the index"""
+
+    columns: Tuple[str, ...]
+    """Indexed columns, in index order"""
+
+    declared_name: Optional[str]
+    """Name of the index on the model, None if undeclared"""
+
+    live_name: Optional[str]
+    """Name of the index on the database, None if missing"""
+
+    status: IndexStatusEnum
+    """Comparison status of the index"""
+
+    def __repr__(self) -> str:
+        return "IndexReportRow(table=%s, columns=(%s), status=%s, name=%s)" % (
+            self.table,
+            ", ".join(self.columns),
+            self.status.value,
+            self.declared_name if self.declared_name is not None else self.live_name,
+        )
+
+
+def create_schema(engine: Engine) -> None:
+    """Create all tables of the model and their declared indexes
+
+    Existing tables are left untouched, use create_missing_indexes to add
+    new indexes to them.
+
+    :param engine: Database engine
+    :return: None
+    """
+    Base.metadata.create_all(engine)
+
+
+def declared_indexes() -> Dict[Tuple[str, Tuple[str, ...]], Index]:
+    """Indexes declared on the model
+
+    :return: Indexes keyed by table name and indexed columns
+    """
+    return {
+        (table.name, tuple(column.name for column in index.columns)): index
+        for table in Base.metadata.sorted_tables
+        for index in table.indexes
+    }
+
+
+def index_report(engine: Engine) -> List[IndexReportRow]:
+    """Compare the declared indexes with the indexes of a live database
+
+    Indexes are matched on their table and column list, not their name, so an
+    index the database created for a foreign key satisfies a declared index on
+    the same columns.
+
+    :param engine: Database engine
+    :return: One row per declared or live index, ordered by table and columns
+    """
+    inspector = inspect(engine)
+    live: Dict[Tuple[str, Tuple[str, ...]], str] = {}
+    for table in Base.metadata.sorted_tables:
+        if not inspector.has_table(table.name):
+            continue
+        for index in inspector.get_indexes(table.name):
+            columns = tuple(column for column in index["column_names"] if column)
+            live.setdefault((table.name, columns), index["name"])
+
+    rows: List[IndexReportRow] = []
+    declared = declared_indexes()
+    for key in sorted(set(declared) | set(live)):
+        table, columns = key
+        index = declared.get(key)
+        if index is None:
+            status = IndexStatusEnum.UNDECLARED
+        elif key in live:
+            status = IndexStatusEnum.PRESENT
+        else:
+            status = IndexStatusEnum.MISSING
+        rows.append(
+            IndexReportRow(
+                table=table,
+                columns=columns,
+                declared_name=index.name if index is not None else None,
+                live_name=live.get(key),
+                status=status,
+            )
+        )
+    return rows
+
+
+def create_missing_indexes(engine: Engine) -> List[Index]:
+    """Create the declared indexes that are missing on a live database
+
+    :param engine: Database engine
+    :return: Indexes that were created
+    """
+    declared = declared_indexes()
+    missing = [
+        declared[(row.table, row.columns)]
+        for row in index_report(engine)
+        if row.status == IndexStatusEnum.MISSING
+    ]
+    with engine.begin() as connection:
+        for index in missing:
+            index.create(connection)
+    return missing
@@ -0,0 +1,411 @@
+"""Indexed name search over customers, officers and employees
+
+NameIndex keeps the names of individuals, businesses, officers and employees
+in memory, indexed by word and by trigram, instead of scanning them with
+``LIKE '%...%'``::
+
+    index = NameIndex()
+    index.build(engine)
+    index.watch(Session)
+    for match in index.search("tuck fra"):
+        print(match.kind, match.key, match.name, match.score)
+
+Every word of the query must match a word of the name: in "prefix" mode when
+it starts that word, in "fuzzy" mode when their trigram similarity reaches a
+threshold, as in pg_trgm, and in "ranked" mode either way. Matches are ranked
+by score, an exact word scoring 1, a prefix less, a fuzzy match less again.
+The key of a match is the cust_id of an individual, a business or the
+business of an officer, and the emp_id of an employee.
+
+The index is database independent. Flushes of watched sessions update it
+when their transaction commits, bulk DML on an indexed class reloads that
+class.
+"""
+
+import bisect
+import threading
+import unicodedata
+from collections import defaultdict
+from dataclasses import dataclass
+from typing import (
+    Dict,
+    Final,
+    FrozenSet,
+    Iterable,
+    List,
+    Optional,
+    Set,
+    Tuple,
+    Union,
+)
+
+from sqlalchemy import Engine, event, inspect, select
+from sqlalchemy.orm import ORMExecuteState, Session, sessionmaker
+
+from model import Business, Employee, Individual, Officer
+
+MODES: Final[Tuple[str, ...]] = ("prefix", "fuzzy", "ranked")
+"""Matching modes of NameIndex.search"""
+
+DEFAULT_LIMIT: Final[int] = 20
+"""Maximum number of matches returned by a search"""
+
+DEFAULT_SIMILARITY: Final[float] = 0.3
+"""Smallest trigram similarity of a fuzzy match, the pg_trgm default"""
+
+PREFIX_WEIGHT: Final[float] = 0.8
+"""Score of a prefix match covering none of the word, 1 when covering all"""
+
+FUZZY_WEIGHT: Final[float] = 0.6
+"""Score of a fuzzy match per unit of similarity"""
+
+_PENDING_KEY: Final[str] = "name_index_pending"
+"""Session.info key of the index changes of the current transaction"""
+
+
+@dataclass(frozen=True)
+class NameSource:
+    """An indexed class and its name columns"""
+
+    kind: str
+    """Kind of the matches, e.g. employee"""
+
+    model: type
+    """Mapped class"""
+
+    id_column: str
+    """Primary key column, identifies the name in the index"""
+
+    key_column: str
+    """Column returned as the key of the matches"""
+
+    name_columns: Tuple[str, ...]
+    """Columns making up the name, in display order"""
+
+
+SOURCES: Final[Dict[str, NameSource]] = {
+    source.kind: source
+    for source in (
+        NameSource("individual", Individual, "cust_id", "cust_id", ("fname", "lname")),
+        NameSource("business", Business, "cust_id", "cust_id", ("name",)),
+        NameSource("officer", Officer, "officer_id", "cust_id", ("fname", "lname")),
+        NameSource("employee", Employee, "emp_id", "emp_id", ("fname", "lname")),
+    )
+}
+"""Indexed names, keyed by kind"""
+
+
+@dataclass(frozen=True)
+class Match:
+    """A name matching a search"""
+
+    kind: str
+    """Kind of the name: individual, business, officer or employee"""
+
+    key: int
+    """cust_id, or emp_id for an employee"""
+
+    name: str
+    """Name as stored"""
+
+    score: float
+    """Relevance, 1 when every query word is a word of the name"""
+
+
+@dataclass(frozen=True)
+class _Name:
+    """An indexed name"""
+
+    kind: str
+    key: int
+    name: str
+    words: FrozenSet[str]
+
+
+_Id = Tuple[str, int]
+"""Kind and primary key of an indexed name"""
+
+
+def normalize(text: str) -> List[str]:
+    """Words of a text, case folded and without accents
+
+    :param text: Name or query
+    :return: Words, in order
+    """
+    decomposed = unicodedata.normalize("NFKD", text.casefold())
+    stripped = "".join(char for char in decomposed if not unicodedata.combining(char))
+    return "".join(char if char.isalnum() else " " for char in stripped).split()
+
+
+def trigrams(word: str) -> FrozenSet[str]:
+    """Trigrams of a word padded like pg_trgm, two spaces before and one after
+
+    :param word: Normalized word
+    :return: Trigrams
+    """
+    padded = "  %s " % word
+    return frozenset(padded[index : index + 3] for index in range(len(padded) - 2))
+
+
+def similarity(left: str, right: str) -> float:
+    """Trigram similarity of two words, shared over distinct trigrams
+
+    :param left: Normalized word
+    :param right: Normalized word
+    :return: Similarity between 0 and 1
+    """
+    left_trigrams, right_trigrams = trigrams(left), trigrams(right)
+    return len(left_trigrams & right_trigrams) / len(left_trigrams | right_trigrams)
+
+
+def _source_of(instance) -> Optional[NameSource]:
+    """Source of an indexed object, None for the other classes"""
+    for source in SOURCES.values():
+        if type(instance) is source.model:
+            return source
+    return None
+
+
+class NameIndex:
+    """In-memory word and trigram index of the person and business names"""
+
+    def __init__(self, similarity_threshold: float = DEFAULT_SIMILARITY) -> None:
+        """Create an empty index
+
+        :param similarity_threshold: Smallest trigram similarity of a fuzzy match
+        """
+        self.similarity_threshold: Final[float] = similarity_threshold
+        """Smallest trigram similarity of a fuzzy match"""
+
+        self._names: Dict[_Id, _Name] = {}
+        self._by_word: Dict[str, Set[_Id]] = defaultdict(set)
+        self._by_trigram: Dict[str, Set[str]] = defaultdict(set)
+        self._sorted_words: Optional[List[str]] = None
+        self._lock: Final[threading.RLock] = threading.RLock()
+
+    def __len__(self) -> int:
+        return len(self._names)
+
+    def add(self, kind: str, name_id: int, key: int, name: str) -> None:
+        """Index a name, replacing the one of the same kind and primary key
+
+        :param kind: Kind of the name
+        :param name_id: Primary key of the row
+        :param key: Key returned by the matches
+        :param name: Name to index
+        :return: None
+        """
+        entry = _Name(kind, key, name, frozenset(normalize(name)))
+        with self._lock:
+            self.remove(kind, name_id)
+            self._names[(kind, name_id)] = entry
+            for word in entry.words:
+                if word not in self._by_word:
+                    self._sorted_words = None
+                    for trigram in trigrams(word):
+                        self._by_trigram[trigram].add(word)
+                self._by_word[word].add((kind, name_id))
+
+    def remove(self, kind: str, name_id: int) -> None:
+        """Drop a name from the index, if indexed
+
+        :param kind: Kind of the name
+        :param name_id: Primary key of the row
+        :return: None
+        """
+        with self._lock:
+            entry = self._names.pop((kind, name_id), None)
+            if entry is None:
+                return
+            for word in entry.words:
+                ids = self._by_word[word]
+                ids.discard((kind, name_id))
+                if not ids:
+                    del self._by_word[word]
+                    self._sorted_words = None
+                    for trigram in trigrams(word):
+                        self._by_trigram[trigram].discard(word)
+
+    def build(self, bind: Union[Engine, Session], kinds: Iterable[str] = ()) -> int:
+        """Load the names from the database, replacing the indexed ones
+
+        :param bind: Engine, or session to read with
+        :param kinds: Kinds to load, all if empty
+        :return: Number of indexed names
+        """
+        count = 0
+        for kind in kinds or SOURCES:
+            source = SOURCES[kind]
+            table = inspect(source.model).local_table
+            statement = select(
+                table.c[source.id_column],
+                table.c[source.key_column],
+                *(table.c[column] for column in source.name_columns),
+            )
+            if isinstance(bind, Session):
+                rows = bind.execute(statement).all()
+            else:
+                with bind.connect() as connection:
+                    rows = connection.execute(statement).all()
+            with self._lock:
+                for name_id in [
+                    name_id for indexed, name_id in self._names if indexed == kind
+                ]:
+                    self.remove(kind, name_id)
+                for name_id, key, *parts in rows:
+                    self.add(kind, name_id, key, " ".join(filter(None, parts)))
+            count += len(rows)
+        return count
+
+    def _word_scores(self, word: str, mode: str) -> Dict[str, float]:
+        """Indexed words matching a query word, with their score
+
+        :param word: Normalized query word
+        :param mode: Matching mode
+        :return: Score of each matching indexed word
+        """
+        scores: Dict[str, float] = {}
+        if mode in ("prefix", "ranked"):
+            if self._sorted_words is None:
+                self._sorted_words = sorted(self._by_word)
+            start = bisect.bisect_left(self._sorted_words, word)
+            for indexed in self._sorted_words[start:]:
+                if not indexed.startswith(word):
+                    break
+                scores[indexed] = (
+                    1.0
+                    if indexed == word
+                    else PREFIX_WEIGHT + (1 - PREFIX_WEIGHT) * len(word) / len(indexed)
+                )
+        if mode in ("fuzzy", "ranked"):
+            candidates = set().union(
+                *(self._by_trigram.get(trigram, ()) for trigram in trigrams(word))
+            )
+            for indexed in candidates:
+                shared = similarity(word, indexed)
+                if shared >= self.similarity_threshold:
+                    score = 1.0 if indexed == word else FUZZY_WEIGHT * shared
+                    scores[indexed] = max(scores.get(indexed, 0.0), score)
+        return scores
+
+    def search(
+        self,
+        query: str,
+        mode: str = "ranked",
+        kinds: Iterable[str] = (),
+        limit: Optional[int] = DEFAULT_LIMIT,
+    ) -> List[Match]:
+        """Names matching every word of a query, best first
+
+        :param query: Words to look for, e.g. "fra tuck"
+        :param mode: "prefix", "fuzzy" or "ranked"
+        :param kinds: Kinds of names to search, all if empty
+        :param limit: Maximum number of matches, all if None
+        :return: Matches ordered by decreasing score, then name
+        """
+        if mode not in MODES:
+            raise ValueError("mode must be one of %s, got %r" % (MODES, mode))
+        words = normalize(query)
+        if not words:
+            return []
+        wanted = set(kinds or SOURCES)
+        with self._lock:
+            totals: Optional[Dict[_Id, float]] = None
+            for word in words:
+                best: Dict[_Id, float] = {}
+                for indexed, score in self._word_scores(word, mode).items():
+                    for name_id in self._by_word[indexed]:
+                        if name_id[0] in wanted and score > best.get(name_id, 0.0):
+                            best[name_id] = score
+                if totals is None:
+                    totals = best
+                else:
+                    totals = {
+                        name_id: total + best[name_id]
+                        for name_id, total in totals.items()
+                        if name_id in best
+                    }
+                if not totals:
+                    return []
+            matches = [
+                Match(entry.kind, entry.key, entry.name, total / len(words))
+                for entry, total in (
+                    (self._names[name_id], total) for name_id, total in totals.items()
+                )
+            ]
+        matches.sort(key=lambda match: (-match.score, match.name, match.key))
+        return matches[:limit] if limit is not None else matches
+
+    def _after_flush(self, session: Session, flush_context) -> None:
+        pending = session.info.setdefault(_PENDING_KEY, {})
+        for instance in (*session.new, *session.dirty):
+            source = _source_of(instance)
+            if source is not None:
+                pending[(source.kind, getattr(instance, source.id_column))] = (
+                    getattr(instance, source.key_column),
+                    " ".join(
+                        filter(
+                            None,
+                            (
+                                getattr(instance, column)
+                                for column in source.name_columns
+                            ),
+                        )
+                    ),
+                )
+        for instance in session.deleted:
+            source = _source_of(instance)
+            if source is not None:
+                pending[(source.kind, getattr(instance, source.id_column))] = None
+
+    def _do_orm_execute(self, orm_execute_state: ORMExecuteState) -> None:
+        if not (
+            orm_execute_state.is_insert
+            or orm_execute_state.is_update
+            or orm_execute_state.is_delete
+        ):
+            return
+        mapper = orm_execute_state.bind_mapper
+        for source in SOURCES.values():
+            if mapper is not None and mapper.class_ is source.model:
+                pending = orm_execute_state.session.info.setdefault(_PENDING_KEY, {})
+                pending[(source.kind, None)] = None
+
+    def _after_commit(self, session: Session) -> None:
+        pending = session.info.pop(_PENDING_KEY, {})
+        reload = [kind for kind, name_id in pending if name_id is None]
+        with self._lock:
+            for (kind, name_id), change in pending.items():
+                if name_id is None or kind in reload:
+                    continue
+                if change is None:
+                    self.remove(kind, name_id)
+                else:
+                    self.add(kind, name_id, *change)
+        for kind in reload:
+            self.build(session.get_bind(mapper=SOURCES[kind].model), [kind])
+
+    def _after_rollback(self, session: Session) -> None:
+        session.info.pop(_PENDING_KEY, None)
+
+    def watch(self, target: Union[Session, sessionmaker, type]) -> None:
+        """Update the index with the committed writes of sessions
+
+        :param target: Session, sessionmaker, or Session class for all sessions
+        :return: None
+        """
+        event.listen(target, "after_flush", self._after_flush)
+        event.listen(target, "do_orm_execute", self._do_orm_execute)
+        event.listen(target, "after_commit", self._after_commit)
+        event.listen(target, "after_rollback", self._after_rollback)
+
+    def unwatch(self, target: Union[Session, sessionmaker, type]) -> None:
+        """Stop updating the index for sessions
+
+        :param target: Target previously passed to watch
+        :return: None
+        """
+        event.remove(target, "after_flush", self._after_flush)
+        event.remove(target, "do_orm_execute", self._do_orm_execute)
+        event.remove(target, "after_commit", self._after_commit)
+        event.remove(target, "after_rollback", self._after_rollback)
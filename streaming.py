@@ -0,0 +1,237 @@
+"""Streaming reads of large results in bounded batches
+
+pd.read_sql_query buffers the whole result on the client before the DataFrame
+is built. These helpers run the query on a server-side cursor and yield one
+bounded DataFrame or Arrow batch at a time, so only a single batch is held in
+memory however large the result is. Both raw SQL strings and ``select()``
+statements over the model are accepted; statements always run on the Core
+connection, so no ORM objects are created.
+"""
+
+import enum
+import sys
+from contextlib import contextmanager
+from typing import Any, Dict, Final, Iterator, List, Mapping, Optional, Sequence, Union
+
+import pandas as pd
+from sqlalchemy import Connection, Engine, Result, Row, text
+from sqlalchemy.orm import Session
+from sqlalchemy.sql import Executable
+
+from utils import arrow_select_schema, plain_value
+
+DEFAULT_CHUNKSIZE: Final[int] = 10_000
+"""Maximum number of rows per batch"""
+
+MIN_CHUNKSIZE: Final[int] = 1
+"""Smallest allowed chunksize"""
+
+BUFFER_ROWS: Final[int] = 100
+"""Rows read ahead from the cursor under a memory budget"""
+
+VALUE_BYTES: Final[int] = 8
+"""Memory of a value in a column, a number or the pointer to an object"""
+
+Query = Union[str, Executable]
+"""Raw SQL text or a select statement"""
+
+Connectable = Union[Engine, Connection, Session]
+"""Where the query runs, a Session runs it in its current transaction"""
+
+
+def row_nbytes(row: Sequence[Any]) -> int:
+    """Memory of a row once in a batch, as pandas counts it with deep=True
+
+    Each value takes VALUE_BYTES, strings and bytes also take their own size.
+
+    :param row: Row of a result
+    :return: Size in bytes
+    """
+    nbytes = 0
+    for value in row:
+        value = plain_value(value)
+        nbytes += VALUE_BYTES
+        if isinstance(value, (str, bytes)):
+            nbytes += sys.getsizeof(value)
+    return nbytes
+
+
+class BatchSizer:
+    """Cuts a result into batches of at most chunksize rows and max_batch_bytes
+
+    Under a memory budget each row is measured as it is added, and the batch
+    is cut before the row that would take it past the budget. A single row
+    larger than the budget makes a batch on its own.
+    """
+
+    def __init__(self, chunksize: int, max_batch_bytes: Optional[int] = None) -> None:
+        """Create a sizer
+
+        :param chunksize: Maximum number of rows per batch
+        :param max_batch_bytes: Memory budget of a batch, unbounded if None
+        """
+        if chunksize < MIN_CHUNKSIZE:
+            raise ValueError("chunksize must be positive, got %d" % chunksize)
+
+        self.chunksize: Final[int] = chunksize
+        """Maximum number of rows per batch"""
+
+        self.max_batch_bytes: Final[Optional[int]] = max_batch_bytes
+        """Memory budget of a batch, unbounded if None"""
+
+    @property
+    def buffer_rows(self) -> int:
+        """Rows the cursor reads ahead of the batches"""
+        if self.max_batch_bytes is None:
+            return self.chunksize
+        return min(self.chunksize, BUFFER_ROWS)
+
+    def batches(self, result: Result) -> Iterator[List[Row]]:
+        """Cut the rows of a result into batches
+
+        :param result: Result of a streaming query
+        :return: Iterator over lists of rows
+        """
+        if self.max_batch_bytes is None:
+            while rows := result.fetchmany(self.chunksize):
+                yield rows
+            return
+        batch: List[Row] = []
+        nbytes = 0
+        for row in result:
+            size = row_nbytes(row)
+            if batch and (
+                len(batch) >= self.chunksize or nbytes + size > self.max_batch_bytes
+            ):
+                yield batch
+                batch, nbytes = [], 0
+            batch.append(row)
+            nbytes += size
+        if batch:
+            yield batch
+
+
+@contextmanager
+def _connection(connectable: Connectable) -> Iterator[Connection]:
+    """Connection to run a streaming query on
+
+    An engine gets a new connection, closed once the stream is done.
+
+    :param connectable: Engine, connection or session
+    :return: Context manager of the connection
+    """
+    if isinstance(connectable, Engine):
+        with connectable.connect() as connection:
+            yield connection
+    elif isinstance(connectable, Session):
+        yield connectable.connection()
+    else:
+        yield connectable
+
+
+def stream_rows(
+    connectable: Connectable,
+    query: Query,
+    params: Optional[Mapping[str, Any]] = None,
+    sizer: Optional[BatchSizer] = None,
+) -> Iterator[Sequence[Row]]:
+    """Stream the rows of a query on a server-side cursor, a batch at a time
+
+    :param connectable: Engine, connection or session
+    :param query: Raw SQL text or select statement
+    :param params: Bound parameters of the query
+    :param sizer: Size of the batches, DEFAULT_CHUNKSIZE rows if None
+    :return: Iterator over lists of rows
+    """
+    sizer = sizer if sizer is not None else BatchSizer(DEFAULT_CHUNKSIZE)
+    if isinstance(query, str):
+        query = text(query)
+    with _connection(connectable) as connection:
+        # Options of this execution only, Connection.execution_options would
+        # change the caller's connection for good
+        result = connection.execute(
+            query,
+            params or {},
+            execution_options={
+                "stream_results": True,
+                "max_row_buffer": sizer.buffer_rows,
+            },
+        )
+        try:
+            yield from sizer.batches(result)
+        finally:
+            result.close()
+
+
+def _columns(rows: Sequence[Row]) -> Dict[str, list]:
+    """Transpose rows to columns of plain values
+
+    Only the columns holding enumerated values are converted value by value.
+
+    :param rows: Non-empty rows of a batch
+    :return: Values of each column, keyed by column name
+    """
+    columns: Dict[str, list] = {}
+    for key, values in zip(rows[0]._fields, zip(*rows)):
+        if any(issubclass(kind, enum.Enum) for kind in set(map(type, values))):
+            columns[key] = [plain_value(value) for value in values]
+        else:
+            columns[key] = list(values)
+    return columns
+
+
+def stream_dataframes(
+    connectable: Connectable,
+    query: Query,
+    params: Optional[Mapping[str, Any]] = None,
+    chunksize: int = DEFAULT_CHUNKSIZE,
+    max_batch_bytes: Optional[int] = None,
+) -> Iterator[pd.DataFrame]:
+    """Stream a query into DataFrames of at most chunksize rows
+
+    Enumerated values are converted to their database values, as a raw SQL
+    query would return them.
+
+    :param connectable: Engine, connection or session
+    :param query: Raw SQL text or select statement
+    :param params: Bound parameters of the query
+    :param chunksize: Maximum number of rows per DataFrame
+    :param max_batch_bytes: Memory budget of a DataFrame, unbounded if None
+    :return: Iterator over the DataFrames
+    """
+    sizer = BatchSizer(chunksize, max_batch_bytes)
+    for rows in stream_rows(connectable, query, params, sizer):
+        yield pd.DataFrame(_columns(rows))
+
+
+def stream_arrow(
+    connectable: Connectable,
+    query: Query,
+    params: Optional[Mapping[str, Any]] = None,
+    chunksize: int = DEFAULT_CHUNKSIZE,
+    max_batch_bytes: Optional[int] = None,
+    schema=None,
+):
+    """Stream a query into Arrow record batches of at most chunksize rows
+
+    Requires pyarrow. Enumerated values are converted to their database values.
+    Every batch has the same schema, by default the one of the column types of
+    a select statement. The schema of raw SQL is inferred batch by batch
+    unless given, so a column that is NULL throughout a batch gets the null
+    type in that batch.
+
+    :param connectable: Engine, connection or session
+    :param query: Raw SQL text or select statement
+    :param params: Bound parameters of the query
+    :param chunksize: Maximum number of rows per batch
+    :param max_batch_bytes: Memory budget of a batch, unbounded if None
+    :param schema: pyarrow.Schema of the batches, None for the default
+    :return: Iterator over pyarrow.RecordBatch
+    """
+    import pyarrow as pa
+
+    if schema is None and hasattr(query, "selected_columns"):
+        schema = arrow_select_schema(query)
+    sizer = BatchSizer(chunksize, max_batch_bytes)
+    for rows in stream_rows(connectable, query, params, sizer):
+        yield pa.RecordBatch.from_pydict(_columns(rows), schema=schema)
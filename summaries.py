@@ -0,0 +1,375 @@
+"""Materialized daily transaction summaries, refreshed incrementally
+
+Rollups over ``transaction`` re-sum the whole table on every run. The summary
+tables below keep daily credit and debit totals, counts and last activity per
+account, branch and product. refresh_summaries only aggregates the
+transactions above the high-water mark on txn_id stored for each summary and
+merges them into the existing rows::
+
+    create_summaries(engine)
+    refresh_summaries(engine)       # after new transactions are inserted
+    assert not verify_summaries(engine)
+
+The branch is the execution branch of the transaction, transactions executed
+outside a branch are left out of the branch summary. The product is the
+product of the account. Transactions committed with a txn_id below the mark of
+an earlier refresh are missed, verify_summaries reports them and
+rebuild_summaries recomputes everything.
+"""
+
+import math
+from dataclasses import dataclass
+from typing import Any, Dict, Final, List, Optional, Tuple
+
+from sqlalchemy import (
+    Column,
+    ColumnElement,
+    Connection,
+    Date,
+    DateTime,
+    Double,
+    Engine,
+    Integer,
+    MetaData,
+    String,
+    Table,
+    case,
+    delete,
+    func,
+    insert,
+    literal,
+    select,
+    update,
+)
+from sqlalchemy.sql.selectable import Select as SQLSelect
+
+from model import Account, Transaction, TransactionTypeEnum
+
+summary_metadata: Final[MetaData] = MetaData()
+"""Metadata of the summary tables, kept apart from the model tables"""
+
+MEASURES: Final[Tuple[str, ...]] = (
+    "credit_total",
+    "debit_total",
+    "credit_count",
+    "debit_count",
+    "txn_count",
+)
+"""Additive columns of the summaries, merged by addition"""
+
+LAST_ACTIVITY: Final[str] = "last_txn_date"
+"""Column of the latest transaction date, merged by maximum"""
+
+summary_watermark: Final[Table] = Table(
+    "summary_watermark",
+    summary_metadata,
+    Column("summary", String(40), primary_key=True),
+    Column("txn_id", Integer, nullable=False),
+)
+"""Highest txn_id aggregated into each summary"""
+
+
+def _summary_table(name: str, key: Column) -> Table:
+    """Daily summary table keyed by a column and the day
+
+    :param name: Table name
+    :param key: Key column, part of the primary key
+    :return: Table
+    """
+    return Table(
+        name,
+        summary_metadata,
+        key,
+        Column("txn_day", Date, primary_key=True),
+        Column("credit_total", Double, nullable=False),
+        Column("debit_total", Double, nullable=False),
+        Column("credit_count", Integer, nullable=False),
+        Column("debit_count", Integer, nullable=False),
+        Column("txn_count", Integer, nullable=False),
+        Column(LAST_ACTIVITY, DateTime, nullable=False),
+    )
+
+
+@dataclass(frozen=True)
+class Summary:
+    """A materialized summary and the transaction column it groups by"""
+
+    table: Table
+    """Summary table"""
+
+    key: ColumnElement
+    """Grouping expression of the transactions, joined to their account"""
+
+    @property
+    def name(self) -> str:
+        """Name of the summary, its table name"""
+        return self.table.name
+
+    @property
+    def key_name(self) -> str:
+        """Name of the key column of the summary table"""
+        return self.table.primary_key.columns.values()[0].name
+
+
+SUMMARIES: Final[Tuple[Summary, ...]] = (
+    Summary(
+        _summary_table(
+            "account_daily_summary", Column("account_id", Integer, primary_key=True)
+        ),
+        Transaction.account_id,
+    ),
+    Summary(
+        _summary_table(
+            "branch_daily_summary", Column("branch_id", Integer, primary_key=True)
+        ),
+        Transaction.execution_branch_id,
+    ),
+    Summary(
+        _summary_table(
+            "product_daily_summary", Column("product_cd", String(10), primary_key=True)
+        ),
+        Account.product_cd,
+    ),
+)
+"""All summaries, refreshed together"""
+
+
+@dataclass(frozen=True)
+class SummaryMismatch:
+    """A materialized value that differs from the full recompute"""
+
+    summary: str
+    """Name of the summary"""
+
+    key: tuple
+    """Key and day of the summary row"""
+
+    column: str
+    """Differing column, "row" if the row is missing on one side"""
+
+    materialized: Any
+    """Value in the summary table, None if the row is missing"""
+
+    recomputed: Any
+    """Value of the full recompute, None if the row should not exist"""
+
+
+def _aggregate(summary: Summary, low: int, high: Optional[int]) -> SQLSelect:
+    """Daily aggregates of the transactions with low < txn_id <= high
+
+    :param summary: Summary to aggregate for
+    :param low: Exclusive lower bound of txn_id
+    :param high: Inclusive upper bound of txn_id, unbounded if None
+    :return: Select of the summary columns
+    """
+    credit = Transaction.txn_type_cd == TransactionTypeEnum.CDT
+    debit = Transaction.txn_type_cd == TransactionTypeEnum.DBT
+    day = func.date(Transaction.txn_date, type_=Date)
+    statement = (
+        select(
+            summary.key.label(summary.key_name),
+            day.label("txn_day"),
+            func.sum(case((credit, Transaction.amount), else_=0.0)).label(
+                "credit_total"
+            ),
+            func.sum(case((debit, Transaction.amount), else_=0.0)).label("debit_total"),
+            func.sum(case((credit, 1), else_=0)).label("credit_count"),
+            func.sum(case((debit, 1), else_=0)).label("debit_count"),
+            func.count().label("txn_count"),
+            func.max(Transaction.txn_date).label(LAST_ACTIVITY),
+        )
+        .join(Account, Transaction.account_id == Account.account_id)
+        .where(Transaction.txn_id > low, summary.key.is_not(None))
+        .group_by(summary.key, day)
+    )
+    return statement if high is None else statement.where(Transaction.txn_id <= high)
+
+
+def _watermark(connection: Connection, summary: Summary) -> int:
+    """High-water mark of a summary, 0 before its first refresh"""
+    mark = connection.execute(
+        select(summary_watermark.c.txn_id).where(
+            summary_watermark.c.summary == summary.name
+        )
+    ).scalar_one_or_none()
+    return 0 if mark is None else mark
+
+
+def _set_watermark(connection: Connection, summary: Summary, txn_id: int) -> None:
+    """Store the high-water mark of a summary"""
+    updated = connection.execute(
+        update(summary_watermark)
+        .where(summary_watermark.c.summary == summary.name)
+        .values(txn_id=txn_id)
+    )
+    if updated.rowcount == 0:
+        connection.execute(
+            insert(summary_watermark).values(summary=summary.name, txn_id=txn_id)
+        )
+
+
+def _merge(connection: Connection, table: Table, rows: List[Dict[str, Any]]) -> None:
+    """Add aggregated rows into a summary table
+
+    SQLite, PostgreSQL and MySQL merge with a single upsert statement, other
+    databases update each row and insert the rows that were not there.
+
+    :param connection: Connection, in the transaction of the caller
+    :param table: Summary table
+    :param rows: Aggregated rows, keyed by column name
+    :return: None
+    """
+    dialect_name = connection.dialect.name
+    if dialect_name in ("sqlite", "postgresql"):
+        if dialect_name == "sqlite":
+            from sqlalchemy.dialects.sqlite import insert as upsert
+        else:
+            from sqlalchemy.dialects.postgresql import insert as upsert
+        statement = upsert(table)
+        incoming = statement.excluded
+        connection.execute(
+            statement.on_conflict_do_update(
+                index_elements=list(table.primary_key.columns),
+                set_=_merged_values(table, incoming),
+            ),
+            rows,
+        )
+    elif dialect_name in ("mysql", "mariadb"):
+        from sqlalchemy.dialects.mysql import insert as upsert
+
+        statement = upsert(table)
+        connection.execute(
+            statement.on_duplicate_key_update(
+                _merged_values(table, statement.inserted)
+            ),
+            rows,
+        )
+    else:
+        for row in rows:
+            incoming = {
+                name: literal(value, table.c[name].type) for name, value in row.items()
+            }
+            updated = connection.execute(
+                update(table)
+                .where(
+                    *(column == incoming[column.name] for column in table.primary_key)
+                )
+                .values(_merged_values(table, incoming))
+            )
+            if updated.rowcount == 0:
+                connection.execute(insert(table).values(row))
+
+
+def _merged_values(table: Table, incoming) -> Dict[str, ColumnElement]:
+    """Upsert values adding the incoming row into the existing one
+
+    :param table: Summary table
+    :param incoming: Columns of the incoming row, e.g. excluded or inserted
+    :return: Values of the update clause
+    """
+    return {
+        **{name: table.c[name] + incoming[name] for name in MEASURES},
+        LAST_ACTIVITY: case(
+            (table.c[LAST_ACTIVITY] < incoming[LAST_ACTIVITY], incoming[LAST_ACTIVITY]),
+            else_=table.c[LAST_ACTIVITY],
+        ),
+    }
+
+
+def create_summaries(engine: Engine) -> None:
+    """Create the summary tables if needed
+
+    :param engine: Database engine
+    :return: None
+    """
+    summary_metadata.create_all(engine)
+
+
+def refresh_summaries(engine: Engine) -> Dict[str, int]:
+    """Merge the transactions above the high-water marks into the summaries
+
+    All summaries are refreshed in a single transaction.
+
+    :param engine: Database engine
+    :return: Number of summary rows merged, keyed by summary name
+    """
+    merged: Dict[str, int] = {}
+    with engine.begin() as connection:
+        high = connection.execute(select(func.max(Transaction.txn_id))).scalar()
+        for summary in SUMMARIES:
+            low = _watermark(connection, summary)
+            if high is None or high <= low:
+                merged[summary.name] = 0
+                continue
+            rows = [
+                row._asdict()
+                for row in connection.execute(_aggregate(summary, low, high))
+            ]
+            if rows:
+                _merge(connection, summary.table, rows)
+            _set_watermark(connection, summary, high)
+            merged[summary.name] = len(rows)
+    return merged
+
+
+def rebuild_summaries(engine: Engine) -> Dict[str, int]:
+    """Empty the summaries and recompute them from every transaction
+
+    :param engine: Database engine
+    :return: Number of summary rows, keyed by summary name
+    """
+    with engine.begin() as connection:
+        for summary in SUMMARIES:
+            connection.execute(delete(summary.table))
+        connection.execute(delete(summary_watermark))
+    return refresh_summaries(engine)
+
+
+def _close(materialized: Any, recomputed: Any) -> bool:
+    """Whether two summary values match, floats up to rounding"""
+    if isinstance(materialized, float) or isinstance(recomputed, float):
+        return math.isclose(materialized, recomputed, rel_tol=1e-9, abs_tol=1e-6)
+    return materialized == recomputed
+
+
+def verify_summaries(engine: Engine) -> List[SummaryMismatch]:
+    """Compare the summaries with a full recompute up to their high-water marks
+
+    :param engine: Database engine
+    :return: Every mismatch, empty if the summaries are correct
+    """
+    mismatches: List[SummaryMismatch] = []
+    with engine.connect() as connection:
+        for summary in SUMMARIES:
+            high = _watermark(connection, summary)
+            width = len(summary.table.primary_key.columns)
+            expected = {
+                tuple(row[:width]): row
+                for row in connection.execute(_aggregate(summary, 0, high))
+            }
+            actual = {
+                tuple(row[:width]): row
+                for row in connection.execute(select(summary.table))
+            }
+            for key in expected.keys() | actual.keys():
+                if key not in actual or key not in expected:
+                    mismatches.append(
+                        SummaryMismatch(
+                            summary.name,
+                            key,
+                            "row",
+                            actual.get(key),
+                            expected.get(key),
+                        )
+                    )
+                    continue
+                for name in (*MEASURES, LAST_ACTIVITY):
+                    materialized = getattr(actual[key], name)
+                    recomputed = getattr(expected[key], name)
+                    if not _close(materialized, recomputed):
+                        mismatches.append(
+                            SummaryMismatch(
+                                summary.name, key, name, materialized, recomputed
+                            )
+                        )
+    return mismatches
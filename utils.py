@@ -1,5 +1,8 @@
+import enum
 
+from sqlalchemy import Date, DateTime, Enum, Float, Integer, Table
 from sqlalchemy.sql.selectable import Select as SQLSelect
+from sqlalchemy.types import TypeEngine
 
 
 def print_sql_statement(sql_select_statement: SQLSelect) -> None:
@@ -9,3 +12,76 @@ def print_sql_statement(sql_select_statement: SQLSelect) -> None:
     :return: None
     """
     print('"""' + str(sql_select_statement) + '"""')
+
+
+def plain_value(value: object) -> object:
+    """Convert an enumerated value to its database value, e.g. for files
+
+    :param value: Column value
+    :return: Value of an enumeration member, else the value itself
+    """
+    return value.value if isinstance(value, enum.Enum) else value
+
+
+def arrow_type(column_type: TypeEngine):
+    """Arrow type of a column type
+
+    Enumerated columns are stored as their string values. Requires pyarrow.
+
+    :param column_type: SQLAlchemy type of the column
+    :return: pyarrow.DataType
+    """
+    import pyarrow as pa
+
+    if isinstance(column_type, Enum):
+        return pa.string()
+    if isinstance(column_type, DateTime):
+        return pa.timestamp("us")
+    if isinstance(column_type, Date):
+        return pa.date32()
+    if isinstance(column_type, Float):
+        return pa.float64()
+    if isinstance(column_type, Integer):
+        return pa.int64()
+    return pa.string()
+
+
+def arrow_schema(table: Table):
+    """Build the Arrow schema of a table from its column types
+
+    Enumerated columns are stored as their string values. Requires pyarrow.
+
+    :param table: Table of the model
+    :return: pyarrow.Schema with one field per column
+    """
+    import pyarrow as pa
+
+    return pa.schema(
+        [
+            pa.field(column.name, arrow_type(column.type), nullable=column.nullable)
+            for column in table.columns
+        ]
+    )
+
+
+def arrow_select_schema(statement: SQLSelect):
+    """Build the Arrow schema of the columns of a select from their types
+
+    Enumerated columns are stored as their string values, expressions without
+    a nullable flag are nullable. Requires pyarrow.
+
+    :param statement: Select statement
+    :return: pyarrow.Schema with one field per selected column
+    """
+    import pyarrow as pa
+
+    return pa.schema(
+        [
+            pa.field(
+                column.name,
+                arrow_type(column.type),
+                nullable=getattr(column, "nullable", True),
+            )
+            for column in statement.selected_columns
+        ]
+    )